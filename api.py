@@ -0,0 +1,149 @@
+"""
+Versioned JSON API (/api/v1/<entity>) for integrations.
+
+One keyset-paginated listing per entity, with the scoping of the HTML listings: a
+superadmin sees every row, department admins and users their department's. `fields=`
+picks the fields to return, and only those columns are selected; the key fields are always
+included, since they make up the page cursors. Responses go through the page cache, so an
+unchanged listing answers a conditional GET (If-None-Match / If-Modified-Since) with a 304
+and no query, and bodies of API_CONFIG["compress_min_bytes"] or more are compressed with
+brotli (when the brotli package is installed) or gzip.
+
+The routes themselves are in app.py and asgi_app.py.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+# entity -> table, API field -> column, key fields (the sort order), tables the rows depend on
+# (page cache invalidation), and the scoping of department admins and users
+API_ENTITIES = {
+    "employees": {
+        "table": "Employee",
+        "fields": {"ssn": "Ssn", "fname": "Fname", "minit": "Minit", "lname": "Lname", "address": "Address",
+                   "sex": "Sex", "salary": "Salary", "super_ssn": "Super_ssn", "dno": "Dno", "bdate": "Bdate",
+                   "empdate": "EmpDate"},
+        "key": ["ssn"],
+        "tables": ("employee",),
+        "scope": "Dno = %s",
+    },
+    "departments": {
+        "table": "Department",
+        "fields": {"dnumber": "Dnumber", "dname": "Dname", "mgr_ssn": "Mgr_ssn"},
+        "key": ["dnumber"],
+        "tables": ("department",),
+        "scope": "Dnumber = %s",
+    },
+    "projects": {
+        "table": "Project",
+        "fields": {"pnumber": "Pnumber", "pname": "Pname", "plocation": "Plocation", "dnum": "Dnum"},
+        "key": ["pnumber"],
+        "tables": ("project",),
+        "scope": "Dnum = %s",
+    },
+    "works_on": {
+        "table": "Works_On",
+        "fields": {"essn": "Essn", "pno": "Pno", "hours": "Hours"},
+        "key": ["essn", "pno"],
+        "tables": ("works_on", "project"),
+        "scope": "Pno IN (SELECT Pnumber FROM Project WHERE Dnum = %s)",
+    },
+    "dependents": {
+        "table": "Dependent",
+        "fields": {"essn": "Essn", "dependent_name": "Dependent_name", "sex": "Sex", "bdate": "Bdate",
+                   "relationship": "Relationship"},
+        "key": ["essn", "dependent_name"],
+        "tables": ("dependent", "employee"),
+        "scope": "Essn IN (SELECT Ssn FROM Employee WHERE Dno = %s)",
+    },
+    "locations": {
+        "table": "Dept_location",
+        "fields": {"dnumber": "Dnumber", "dlocation": "Dlocation"},
+        "key": ["dnumber", "dlocation"],
+        "tables": ("dept_location",),
+        "scope": "Dnumber = %s",
+    },
+}
+
+
+def api_fields(entity, value):
+    """
+    The fields to return for a ?fields= value ("ssn,fname"; empty for all), key fields
+    first. Raises ValueError on an unknown field.
+    """
+    spec = API_ENTITIES[entity]
+    if not value:
+        requested = list(spec["fields"])
+    else:
+        requested = [name.strip().lower() for name in value.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in spec["fields"]]
+    if unknown:
+        raise ValueError(f"Unknown field(s) for {entity}: {', '.join(unknown)}. "
+                         f"Available: {', '.join(spec['fields'])}.")
+    return spec["key"] + [name for name in dict.fromkeys(requested) if name not in spec["key"]]
+
+
+def api_listing_query(entity, fields, role_id, department_id):
+    """
+    (select_sql, key_columns, key_indexes, where, params) for fetch_page over the entity's
+    rows the role may see, selecting `fields` (from api_fields, keys first), or None when
+    the role may not list them.
+    """
+    spec = API_ENTITIES[entity]
+    if role_id == 1:
+        where, params = [], []
+    elif role_id in [2, 3]:
+        where, params = [spec["scope"]], [department_id]
+    else:
+        return None
+    columns = [spec["fields"][name] for name in fields]
+    select_sql = f"SELECT {', '.join(columns)} FROM {spec['table']}"
+    key_columns = [(spec["fields"][name], "ASC") for name in spec["key"]]
+    return select_sql, key_columns, list(range(len(key_columns))), where, params
+
+
+def _accepted(accept_encoding):
+    """
+    Codings the client accepts ({"gzip": q, ...}) from an Accept-Encoding header.
+    """
+    codings = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            codings[coding.strip().lower()] = q
+    return codings
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    "br", "gzip" or None for a response to a client sending `accept_encoding`.
+    """
+    codings = _accepted(accept_encoding)
+    if brotli is not None and codings.get('br', 0) > 0:
+        return 'br'
+    if codings.get('gzip', codings.get('*', 0)) > 0:
+        return 'gzip'
+    return None
+
+
+def compress_body(body, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(body, quality=config.get('brotli_quality', 5))
+    return gzip.compress(body, compresslevel=config.get('gzip_level', 6))
+
+
+def compressible(status_code, headers, length, config):
+    """
+    True for a 200 response of `length` bytes worth compressing that is not encoded already.
+    """
+    return (status_code == 200 and 'Content-Encoding' not in headers
+            and (length or 0) >= config.get('compress_min_bytes', 1024))
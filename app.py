@@ -1,23 +1,107 @@
-from flask import Flask, request, session, redirect, url_for, render_template, flash, jsonify
+from flask import Flask, Response, g, make_response, request, session, redirect, url_for, render_template, flash, jsonify
 from functools import wraps
+import math
+import os
 import psycopg2
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.http import http_date
+
+from api import API_ENTITIES, api_fields, api_listing_query, compress_body, compressible, negotiate_encoding
+from bulk_import import IMPORT_FORMATS, IMPORT_SPECS, run_import
+from dal import (dependent_delete, dependent_insert, dependent_select, dependent_update, execute, location_delete,
+                 location_insert, location_update, project_delete, project_insert, project_update, works_on_delete,
+                 works_on_insert, works_on_update)
+from db import get_db_connection, get_pool, get_router, release_db_connection
+from export import EXPORT_FORMATS, export_response
+from instrumentation import (begin_request, configure_logging, current_stats, end_request, log_request,
+                             server_timing)
+from metrics import (cache_samples, collect, maybe_write_snapshot, observe_request, password_samples, pool_samples,
+                     register_collector, render)
+from page_cache import (cached_page, configure_page_cache, invalidate_pages, not_modified, page_cache_enabled,
+                        page_generation, page_key, remember_page)
+from pagination import fetch_page, page_url
+from passwords import (HashingBusy, configure_passwords, hash_password, login_retry_after, password_stats,
+                       verify_password)
+from prepared import configure_prepared, execute_prepared
+from queries import (DEPENDENT_DETAIL_COLUMNS, EMPLOYEE_COLUMNS, WORKS_ON_DETAIL_COLUMNS, dependent_scope,
+                     employee_filter_args, employee_filters, employee_listing_query, employee_scope, employee_search_query,
+                     employee_search_results, employee_sort, grid_items, hours_batch_update, hours_changes, import_format,
+                     json_changes, listing_json, prefetch_queries, prefetch_result, prefetch_ssns, works_on_scope)
+from reference import invalidate_reference, reference_list
+from roles import LOGIN_SQL, ROLE_SQL, resolve_role, role_fields, user_changed
+from sessions import ServerSessionInterface, configure_sessions, secret_key
+from summary import SUMMARY_COLUMNS, start_refresher
 
 app = Flask(__name__)
-app.secret_key = 'my_random_key'
 app.config.from_pyfile('config.py')
+app.secret_key = secret_key(app.config)
+configure_sessions(app.config.get('SESSION_CONFIG'))
+app.session_interface = ServerSessionInterface()
+
+# One pooled connection per request, handed back when the request ends (even on errors)
+app.teardown_appcontext(release_db_connection)
+app.add_template_global(page_url)
+configure_page_cache(app.config.get('PAGE_CACHE_CONFIG'))
+configure_passwords(app.config.get('PASSWORD_HASHING_CONFIG'), app.config.get('LOGIN_RATE_LIMITS'))
+configure_prepared(app.config.get('PREPARED_STATEMENTS_CONFIG'))
+
+
+# Per-request SQL stats: Server-Timing header, slow-query log and one JSON log line per request
+@app.before_request
+def start_request_stats():
+    config = app.config.get('SQL_INSTRUMENTATION', {})
+    begin_request(request.endpoint, config.get('slow_query_ms'))
+
+
+@app.after_request
+def emit_request_stats(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    if app.config.get('SQL_INSTRUMENTATION', {}).get('server_timing', True):
+        response.headers['Server-Timing'] = server_timing(stats)
+
+    method, status = request.method, response.status_code
+    if response.is_streamed:
+        # Streamed exports keep querying after this point; log once the body has been sent
+        response.call_on_close(lambda: finish_request_stats(end_request() or stats, method, status))
+    else:
+        finish_request_stats(end_request(), method, status)
+    return response
+
+
+def finish_request_stats(stats, method, status):
+    log_request(stats, method, status)
+    observe_request(stats, method, status)
+    maybe_write_snapshot(metrics_dir(), app.config.get('METRICS_CONFIG', {}).get('snapshot_interval', 5.0))
 
 
-def get_db_connection():
-    conn = psycopg2.connect(**app.config['DATABASE_CONFIG'])
-    return conn
+def metrics_dir():
+    """
+    Where worker processes share their metrics snapshots, or None when serving from one process.
+    """
+    return os.environ.get('METRICS_MULTIPROC_DIR') or app.config.get('METRICS_CONFIG', {}).get('multiprocess_dir')
+
+
+configure_logging(app.config.get('SQL_INSTRUMENTATION', {}).get('log_requests', False))
+register_collector(lambda: pool_samples(get_pool(create=False) and get_pool(create=False).stats()))
+register_collector(cache_samples)
+register_collector(password_samples)
 
 
 # Middleware
+def current_role():
+    """
+    The logged-in user's role, from their server-side session without a query (re-read from
+    Users once ROLE_CACHE_TTL seconds old). Returns None (and clears the session) if the
+    user has been deleted.
+    """
+    return resolve_role(session, app.config.get('ROLE_CACHE_TTL', 60))
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if 'user_id' not in session or current_role() is None:
             return redirect(url_for("login"))
         return f(*args, **kwargs)
 
@@ -31,14 +115,12 @@ def admin_required(f):
             flash("Please log in to access this page.", "login_erro")
             return redirect(url_for("login"))
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT role_id FROM Users WHERE id = %s", (session['user_id'],))
-        role = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        role = current_role()
+        if role is None:
+            flash("Please log in to access this page.", "login_erro")
+            return redirect(url_for("login"))
 
-        if role and role[0] != 2:
+        if role != 2:
             flash("Access restricted to department admins.", "privilege2_error")
             return redirect(url_for("index"))
         return f(*args, **kwargs)
@@ -53,15 +135,12 @@ def superadmin_or_admin_required(f):
             flash("Please log in to access this page.", "error")
             return redirect(url_for("login"))
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        print(session['user_id'])
-        cursor.execute("SELECT role_id FROM Users WHERE id = %s", (session['user_id'],))
-        role = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        role = current_role()
+        if role is None:
+            flash("Please log in to access this page.", "error")
+            return redirect(url_for("login"))
 
-        if role and (role[0] != 1 and role[0] != 2):
+        if role != 1 and role != 2:
             flash("Access restricted to admins or superadmins.", "error")
             return redirect(url_for("index"))
         return f(*args, **kwargs)
@@ -76,14 +155,12 @@ def superadmin_required(f):
             flash("Please log in to access this page.", "login_erro")
             return redirect(url_for("login"))
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT role_id FROM Users WHERE id = %s", (session['user_id'],))
-        role = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        role = current_role()
+        if role is None:
+            flash("Please log in to access this page.", "login_erro")
+            return redirect(url_for("login"))
 
-        if role and role[0] != 1:
+        if role != 1:
             flash("Access restricted to superadmins.", "privilege1_error")
             return redirect(url_for("index"))
         return f(*args, **kwargs)
@@ -91,7 +168,81 @@ def superadmin_required(f):
     return decorated_function
 
 
+def page_cached(*tables, flashes=True):
+    """
+    Serve a listing page from the page cache (see page_cache.py), keyed on the route, the
+    user's role and department and the query string. `tables` are the tables the page shows;
+    writes to them invalidate it. Pages with pending flash messages are never cached, unless
+    `flashes` is False: the view never shows them (the JSON API).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not page_cache_enabled() or request.method != 'GET' or (flashes and session.get('_flashes')):
+                return f(*args, **kwargs)
+
+            department_id = session.get('department_id')
+            key = page_key(request.endpoint, session.get('role_id'), department_id, request.args.items(multi=True))
+            entry = cached_page(key)
+            status = 'hit'
+            if entry is None:
+                status = 'miss'
+                generation = page_generation()
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed or (flashes and session.get('_flashes')):
+                    return response
+                entry = remember_page(key, response.get_data(), response.mimetype, department_id, tables, generation)
+
+            if not_modified(entry, request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+                response = Response(status=304)
+            else:
+                response = Response(entry['body'], mimetype=entry['mimetype'])
+            response.headers['ETag'] = entry['etag']
+            if entry.get('modified'):
+                response.headers['Last-Modified'] = http_date(entry['modified'])
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.headers['Vary'] = 'Cookie'
+            response.headers['X-Page-Cache'] = status
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+def read_only(f):
+    """
+    Mark a handler that never writes: its queries, including the role checks of the
+    decorators below it, go to a read replica when one is current enough (REPLICA_CONFIG,
+    see replicas.py), and to the primary otherwise.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 #####################################################################################################################################
+@app.route('/metrics/pool')
+def pool_metrics():
+    """
+    Connection pool wait time and saturation, and the read replicas' lag, for monitoring.
+    """
+    router = get_router()
+    return jsonify({**get_pool().stats(), **({"replicas": router.status()} if router else {})})
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Request counts and latencies per route, SQL time, pool usage and cache hit rates, in the
+    Prometheus text format (summed over all worker processes, see METRICS_CONFIG).
+    """
+    return Response(render(collect(metrics_dir())), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/')
 def index():
     session.pop('_flashes', None)
@@ -104,25 +255,41 @@ def login():
         username = request.form['username']
         password = request.form['password']
 
+        # Charged before any hashing, so credential stuffing costs no CPU once limited
+        retry_after = login_retry_after(username, request.remote_addr)
+        if retry_after:
+            return login_refused('Too many sign-in attempts. Please wait a moment and try again.', 429, retry_after)
+
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT u.id, u.password_hash, u.role_id, u.department_id,
-                   COALESCE(d.dname, 'All Departments') AS dname
-            FROM Users u
-            LEFT JOIN Department d ON u.department_id = d.dnumber
-            WHERE u.username = %s
-        """, (username,))
+        execute_prepared(cursor, LOGIN_SQL, (username,))
         user = cursor.fetchone()
         cursor.close()
-        conn.close()
+        # Hand the connection back while the hash is checked, so a sign-in storm cannot
+        # drain the pool the other routes need
+        release_db_connection()
+
+        try:
+            matches, new_hash = verify_password(user[1], password) if user else (False, None)
+        except HashingBusy:
+            return login_refused('The server is busy signing other users in. Please try again in a moment.', 503, 1)
+
+        if matches and new_hash:
+            # Hash parameters have changed since this password was set; store it rehashed
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            cursor.execute("UPDATE Users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                           (new_hash, user[0], user[1]))
+            conn.commit()
+            cursor.close()
+            password_stats["rehashed"] += 1
 
-        if user and check_password_hash(user[1], password):
+        if matches:
+            # A fresh session id at login, so an id planted beforehand is worthless
+            session.regenerate()
             session['user_id'] = user[0]
             session['username'] = username
-            session['role_id'] = user[2]
-            session['department_id'] = user[3]
-            session['department_name'] = user[4]
+            session.update(role_fields(user[2:]))
             flash('Login successful!', 'login_success')
             return redirect(url_for('base'))
         else:
@@ -131,9 +298,20 @@ def login():
     return render_template('login.html')
 
 
+def login_refused(message, status, retry_after):
+    """
+    The login form again, with `message`, a 429/503 status and a Retry-After header.
+    """
+    flash(message, 'error')
+    response = make_response(render_template('login.html'), status)
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
 @app.route('/logout')
 def logout():
     session.clear()
+    session.regenerate()
     flash('You have been logged out.', 'logout')
     return redirect(url_for('login'))
 
@@ -147,6 +325,7 @@ def base():
 
 # user access below
 @app.route('/view_users')
+@read_only
 @superadmin_required
 def view_users():
     """
@@ -156,12 +335,12 @@ def view_users():
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT id, username, role_id, department_id FROM users ORDER BY id ASC")
-        users = cursor.fetchall()
+        page = fetch_page(cursor, "SELECT id, username, role_id, department_id FROM users",
+                          [("id", "ASC")], [0])
         cursor.close()
         conn.close()
 
-        return render_template('view_users.html', users=users)
+        return render_template('view_users.html', users=page['rows'], page=page)
     except Exception as e:
         flash(f"Error fetching users: {e}", "view_users_error")
         return redirect(url_for('view_users'))
@@ -176,9 +355,8 @@ def update_user(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Fetch all department IDs to populate the dropdown
-    cursor.execute("SELECT dnumber FROM Department")
-    all_dnumbers = [row[0] for row in cursor.fetchall()]
+    # Department IDs for the dropdown, from the reference cache
+    all_dnumbers = reference_list('department_numbers')
 
     if request.method == 'POST':
         # Fetch form data
@@ -196,6 +374,10 @@ def update_user(user_id):
             WHERE id = %s
         """, (role_id, department_id, user_id))
         conn.commit()
+
+        # Every session of the user, in any worker, gets the new role right away
+        cursor.execute(ROLE_SQL, (user_id,))
+        user_changed(user_id, cursor.fetchone(), session)
         cursor.close()
         conn.close()
 
@@ -228,6 +410,7 @@ def delete_user(user_id):
         # Execute the delete query
         cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
         conn.commit()
+        user_changed(user_id, None, session)
         flash("User deleted successfully!", "user_delete_success")
     except Exception as e:
         flash(f"An error occurred while deleting the user: {e}", "user_delete_error")
@@ -244,14 +427,17 @@ def register():
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Fetch all department IDs to populate the dropdown
-    cursor.execute("SELECT dnumber FROM Department")
-    all_dnumbers = [row[0] for row in cursor.fetchall()]  # Convert to a list
+    # Department IDs for the dropdown, from the reference cache
+    all_dnumbers = reference_list('department_numbers')
 
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = hash_password(password)
+        except HashingBusy:
+            flash('The server is busy hashing passwords. Please try again in a moment.', 'error')
+            return redirect(url_for('register'))
         role_id = request.form['roleid']
         department_id = request.form.get('departmentid')  # Optional
 
@@ -283,7 +469,9 @@ def register():
 
 # department below
 @app.route('/view_departments', methods=['GET'])
+@read_only
 @login_required
+@page_cached('department')
 def view_departments():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -292,10 +480,11 @@ def view_departments():
     role_id = session.get('role_id')
     department_id = session.get('department_id')
 
+    select_sql = "SELECT Dnumber, Dname, Mgr_ssn FROM Department"
     if role_id == 1:  # Super Admin
-        cursor.execute("SELECT Dnumber, Dname, Mgr_ssn FROM Department")
+        page = fetch_page(cursor, select_sql, [("Dnumber", "ASC")], [0])
     elif role_id in [2, 3]:  # Department Admin
-        cursor.execute("SELECT Dnumber, Dname, Mgr_ssn FROM Department WHERE Dnumber = %s", (department_id,))
+        page = fetch_page(cursor, select_sql, [("Dnumber", "ASC")], [0], ["Dnumber = %s"], [department_id])
     else:
         # Normal users cannot access departments
         flash("Access denied. You do not have permission to view departments.", "view_department_error")
@@ -303,11 +492,40 @@ def view_departments():
         conn.close()
         return redirect(url_for('base'))
 
-    departments = cursor.fetchall()
     cursor.close()
     conn.close()
 
-    return render_template('view_departments.html', departments=departments)
+    return render_template('view_departments.html', departments=page['rows'], page=page)
+
+
+@app.route('/dashboard', methods=['GET'])
+@read_only
+@login_required
+def dashboard():
+    """
+    Per-department headcount, payroll, projects, hours and dependents, read from the
+    department_summary materialized view (refreshed in the background, see summary.py).
+    Admins and users see their own department only.
+    """
+    config = app.config.get('DASHBOARD_CONFIG', {})
+    if config.get('refresh_in_app', True):
+        start_refresher(app.config['DATABASE_CONFIG'], config.get('refresh_interval', 300))
+
+    role_id = session.get('role_id')
+    department_id = session.get('department_id')
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    select_sql = f"SELECT {', '.join(SUMMARY_COLUMNS)}, refreshed_at FROM department_summary"
+    if role_id == 1:
+        page = fetch_page(cursor, select_sql, [("Dnumber", "ASC")], [0])
+    else:
+        page = fetch_page(cursor, select_sql, [("Dnumber", "ASC")], [0], ["Dnumber = %s"], [department_id])
+    cursor.close()
+    conn.close()
+
+    refreshed_at = max((row[-1] for row in page['rows']), default=None)
+    return render_template('dashboard.html', summaries=page['rows'], page=page, refreshed_at=refreshed_at)
 
 
 @app.route('/departments/add', methods=('GET', 'POST'))
@@ -316,10 +534,6 @@ def add_department():
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Fetch all SSNs from Employee table
-    cursor.execute("SELECT SSN FROM Employee")
-    employee_ssns = [row[0] for row in cursor.fetchall()]  # Convert to a list of SSNs
-
     if request.method == 'POST':
         dname = request.form['dname']
         dnumber = request.form['dnumber']
@@ -331,6 +545,8 @@ def add_department():
                 (dname, dnumber, mgr_ssn)
             )
             conn.commit()
+            invalidate_reference('department')
+            invalidate_pages('department', dnumber)
             flash("Department added successfully!", "success")
         except psycopg2.IntegrityError:
             conn.rollback()
@@ -344,7 +560,7 @@ def add_department():
 
     cursor.close()
     conn.close()
-    return render_template('add_department.html', employee_ssns=employee_ssns)
+    return render_template('add_department.html')
 
 
 @app.route('/departments/update/<int:dnumber>', methods=('GET', 'POST'))
@@ -356,10 +572,6 @@ def update_department(dnumber):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Fetch all SSNs from Employee table
-    cursor.execute("SELECT SSN FROM Employee")
-    employee_ssns = [row[0] for row in cursor.fetchall()]  # Convert to a list of SSNs
-
     if request.method == 'POST':
         new_dnumber = request.form['dnumber']
         dname = request.form['dname']
@@ -372,6 +584,8 @@ def update_department(dnumber):
                 WHERE Dnumber = %s
             """, (new_dnumber, dname, mgr_ssn, dnumber))
             conn.commit()
+            invalidate_reference('department')
+            invalidate_pages('department', dnumber, new_dnumber)
             flash("Department updated successfully!", "department_update_success")
         except psycopg2.IntegrityError:
             conn.rollback()
@@ -393,7 +607,7 @@ def update_department(dnumber):
     cursor.close()
     conn.close()
 
-    return render_template('update_department.html', department=department, employee_ssns=employee_ssns)
+    return render_template('update_department.html', department=department)
 
 
 @app.route('/departments/delete/<int:dnumber>', methods=('POST',))
@@ -403,17 +617,28 @@ def delete_department(dnumber):
     cursor = conn.cursor()
     cursor.execute("DELETE FROM Department WHERE Dnumber = %s", (dnumber,))
     conn.commit()
+    invalidate_reference('department')
+    invalidate_pages('department', dnumber)
     cursor.close()
     conn.close()
     return redirect(url_for('view_departments'))
 
 
 # Employee below
+
+
+def wants_json():
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
 @app.route('/view_employees', methods=['GET'])
+@read_only
 @login_required
 def view_employees():
     """
     View employees. Normal users can only view data, while admins and superadmins can perform actions.
+    Filtered by the EMPLOYEE_FILTERS parameters, searched with ?q=, sorted with ?sort=, and
+    returned as JSON with an Accept: application/json header.
     """
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -421,28 +646,117 @@ def view_employees():
     role_id = session.get('role_id')
     department_id = session.get('department_id')
 
+    scope = employee_scope(role_id, department_id)
+    if scope is None:
+        flash("Access denied. You do not have permission to view employees.", "view_employee_error")
+        return redirect(url_for('base'))
+
     try:
-        if role_id == 1:  # Super Admin
-            cursor.execute(
-                "SELECT Fname, Minit, Lname, SSN, Address, Sex, Salary, Super_ssn, Dno, Bdate, Empdate FROM Employee")
-        elif role_id in [2, 3]:  # Department Admin&user
-            cursor.execute(
-                "SELECT Fname, Minit, Lname, SSN, Address, Sex, Salary, Super_ssn, Dno, Bdate, Empdate FROM Employee WHERE Dno = %s",
-                (department_id,))
-        else:
-            flash("Access denied. You do not have permission to view employees.", "view_employee_error")
-            return redirect(url_for('base'))
+        key_columns, key_indexes = employee_sort(request.args.get('sort'))
+        select_sql, where, params = employee_listing_query(scope, request.args)
+    except ValueError as e:
+        cursor.close()
+        if wants_json():
+            return jsonify(error=str(e)), 400
+        flash(str(e), "view_employee_filter_error")
+        return redirect(url_for('view_employees'))
 
-        employees = cursor.fetchall()
+    try:
+        # Only the default listing is prepared; each filter, search and sort is a statement of its own
+        page = fetch_page(cursor, select_sql, key_columns, key_indexes, where, params,
+                          prepare=not employee_filter_args(request.args) and not request.args.get('sort'))
 
     except psycopg2.Error as e:
         flash(f"An error occurred while fetching employees: {e}", "view_employee_fetch_error")
-        employees = []
+        page = {"rows": [], "next": None, "prev": None, "limit": None}
     finally:
         cursor.close()
         conn.close()
 
-    return render_template('view_employees.html', employees=employees, role_id=role_id)
+    if wants_json():
+        return jsonify(listing_json(EMPLOYEE_COLUMNS, page))
+    return render_template('view_employees.html', employees=page['rows'], page=page, role_id=role_id,
+                           sort=request.args.get('sort', ''), filters=employee_filter_args(request.args))
+
+
+@app.route('/employees/search', methods=['GET'])
+@read_only
+@login_required
+def search_employees():
+    """
+    Type-ahead search over the employees the user may view (?q=SSN or name prefix), as JSON.
+    """
+    scope = employee_scope(session.get('role_id'), session.get('department_id'))
+    if scope is None:
+        return jsonify(error="Access denied. You do not have permission to view employees."), 403
+
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify(results=[])
+
+    limit = app.config.get('EMPLOYEE_SEARCH_LIMIT', 10)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(*employee_search_query(q, *scope, limit))
+    rows = cursor.fetchall()
+    cursor.close()
+    return jsonify(results=employee_search_results(rows, limit))
+
+
+@app.route('/employees/prefetch', methods=['GET'])
+@read_only
+@login_required
+def prefetch_employees():
+    """
+    Employees by SSN (?ssn=a,b,c) with their Works_On assignments (with project names) and
+    dependents, as JSON: three queries however many employees are asked for, instead of a
+    lookup per row.
+    """
+    scope = employee_scope(session.get('role_id'), session.get('department_id'))
+    if scope is None:
+        return jsonify(error="Access denied. You do not have permission to view employees."), 403
+    ssns = prefetch_ssns(request.args)
+    limit = app.config.get('PREFETCH_LIMIT', 500)
+    if len(ssns) > limit:
+        return jsonify(error=f"At most {limit} employees per request."), 400
+    if not ssns:
+        return jsonify(employees=[], missing=[])
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    results = []
+    for sql, params in prefetch_queries(ssns, session.get('role_id'), session.get('department_id')):
+        cursor.execute(sql, params)
+        results.append(cursor.fetchall())
+    cursor.close()
+    return jsonify(prefetch_result(ssns, *results))
+
+
+@app.route('/employees/export', methods=['GET'])
+@read_only
+@login_required
+def export_employees():
+    """
+    Stream the employees the user may view as CSV or NDJSON (?format=csv|ndjson).
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"Unsupported format: {fmt}"), 400
+
+    scope = employee_scope(session.get('role_id'), session.get('department_id'))
+    if scope is None:
+        flash("Access denied. You do not have permission to view employees.", "view_employee_error")
+        return redirect(url_for('base'))
+
+    try:
+        where, params = employee_filters(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    where, params = scope[0] + where, scope[1] + params
+    sql = f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM Employee"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return export_response(get_db_connection(), sql, params, EMPLOYEE_COLUMNS, fmt, "employees")
 
 
 @app.route('/employees/add', methods=['GET', 'POST'])
@@ -457,8 +771,7 @@ def add_employee():
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute("""SELECT dnumber FROM Department""")
-    all_dnumbers = [row[0] for row in cursor.fetchall()]
+    all_dnumbers = reference_list('department_numbers')
 
     if role_id not in [1, 2]:
         flash("Access denied. Only Admins and Super Admins can add employees.", "add_employee_error")
@@ -485,6 +798,7 @@ def add_employee():
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (fname, minit, lname, ssn, address, sex, salary, super_ssn, dno))
             conn.commit()
+            invalidate_pages('employee')
             flash("Employee added successfully!", "add_employee_success")
         except psycopg2.IntegrityError:
             conn.rollback()
@@ -515,8 +829,7 @@ def update_employee(ssn):
 
     employee = cursor.fetchone()
 
-    cursor.execute("""SELECT dnumber FROM Department""")
-    all_dnumbers = [row[0] for row in cursor.fetchall()]
+    all_dnumbers = reference_list('department_numbers')
 
     if request.method == 'POST':
         # Fetch data from the form
@@ -536,6 +849,7 @@ def update_employee(ssn):
             WHERE SSN = %s
         """, (fname, minit, lname, address, sex, salary, super_ssn, dno, ssn))
         conn.commit()
+        invalidate_pages('employee')
 
         flash("Employee updated successfully!", "update_employee_success")
         return redirect(url_for('view_employees'))
@@ -561,6 +875,7 @@ def delete_employee(ssn):
         # Ensure SSN is treated as a string
         cursor.execute("DELETE FROM Employee WHERE SSN = %s", (str(ssn),))
         conn.commit()
+        invalidate_pages('employee')
         flash(f"Employee {ssn} deleted successfully!", "delete_employee_success")
     except psycopg2.Error as e:
         conn.rollback()
@@ -572,27 +887,73 @@ def delete_employee(ssn):
     return redirect(url_for('view_employees'))
 
 
+# Bulk import
+
+
+@app.route('/import', methods=['GET', 'POST'])
+@superadmin_or_admin_required
+def import_data():
+    """
+    Bulk-load employees, projects or Works_On rows from a CSV or NDJSON upload. Admins can
+    only import into their own department. Responds with a per-line report, as JSON when
+    the client asks for it.
+    """
+    if request.method == 'GET':
+        return render_template('import.html', import_specs=IMPORT_SPECS, report=None)
+
+    json_response = wants_json()
+    kind = request.form.get('kind')
+    upload = request.files.get('file')
+    fmt = import_format(upload, request.form.get('format'))
+    if kind not in IMPORT_SPECS or not upload or fmt not in IMPORT_FORMATS:
+        message = "Choose what to import and upload a .csv or .ndjson file."
+        if json_response:
+            return jsonify(error=message), 400
+        flash(message, "import_error")
+        return redirect(url_for('import_data'))
+
+    try:
+        report = run_import(get_db_connection(), kind, upload.stream, fmt, session.get('role_id'),
+                            session.get('department_id'), app.config.get('IMPORT_BATCH_SIZE', 1000))
+    except psycopg2.Error as e:
+        if json_response:
+            return jsonify(error=f"Import failed, nothing was loaded: {e}"), 500
+        flash(f"Import failed, nothing was loaded: {e}", "import_error")
+        return redirect(url_for('import_data'))
+
+    if kind == 'employees' and report['inserted']:
+        invalidate_pages('employee')
+    if kind == 'projects' and report['inserted']:
+        invalidate_pages('project')
+    if kind == 'works_on' and report['inserted']:
+        invalidate_pages('works_on')
+    if json_response:
+        return jsonify(report)
+    return render_template('import.html', import_specs=IMPORT_SPECS, report=report)
+
+
 ###############################################changes above###########################################################
 
 # Route to view all projects
 @app.route('/projects')
+@read_only
 @login_required
+@page_cached('project')
 def view_projects():
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    select_sql = "SELECT Pnumber, Pname, Plocation, Dnum FROM Project"
     if session['department_id'] != None:
         dnum = session['department_id']
-        cursor.execute("SELECT Pnumber, Pname, Plocation, Dnum FROM Project WHERE Dnum=%s", (dnum, ))
-        projects = cursor.fetchall()
+        page = fetch_page(cursor, select_sql, [("Pnumber", "ASC")], [0], ["Dnum=%s"], [dnum])
 
     else: 
-        cursor.execute("SELECT Pnumber, Pname, Plocation, Dnum FROM Project")
-        projects = cursor.fetchall()
+        page = fetch_page(cursor, select_sql, [("Pnumber", "ASC")], [0])
 
     cursor.close()
     conn.close()
-    return render_template('view_projects.html', projects=projects)
+    return render_template('view_projects.html', projects=page['rows'], page=page)
 
 
 # Route to add a new project
@@ -600,31 +961,17 @@ def view_projects():
 @superadmin_or_admin_required
 def add_project():
     if request.method == 'POST':
-        pname = request.form['pname']
-        pnumber = request.form['pnum']
-        plocation = request.form['plocation']
         dnum = request.form['dnum']
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # if the user isn't a superadmin - they are restricted to only adding projects to their own department
-        if session['department_id'] == None:
-            cursor.execute("INSERT INTO Project (Pname, Pnumber, Plocation, Dnum) VALUES (%s, %s, %s, %s)", (
-                pname, pnumber, plocation, dnum))
-            conn.commit()
-        else:     
-            #if the project has the same dept as the user, allow the user to add it
-            if dnum == session['department_id']:
-                cursor.execute("UPDATE Project SET Pname = %s, Plocation = %s, Dnum = %s WHERE Pnumber = %s",
-                       (pname, plocation, dnum, pnumber))
-                conn.commit()
+        # Department admins can only add projects to their own department
+        try:
+            if execute(*project_insert(request.form['pname'], request.form['pnum'], request.form['plocation'], dnum,
+                                       session['department_id'])):
+                invalidate_pages('project', dnum)
             else:
-                conn.rollback()
-                flash("Failed to update project - the project is not in the correct department.", "update_project_error")
-
-        cursor.close()
-        conn.close()
+                flash("Failed to add project - the project is not in the correct department.", "update_project_error")
+        except psycopg2.IntegrityError:
+            flash("Failed to add project. Ensure the Project Number is unique and the Department Number is valid.",
+                  "update_project_error")
         return redirect(url_for('view_projects'))
 
     return render_template('add_project.html')
@@ -634,36 +981,21 @@ def add_project():
 @app.route('/projects/update/<int:pnumber>', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def update_project(pnumber):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     if request.method == 'POST':
-        pname = request.form['pname']
-        plocation = request.form['plocation']
         dnum = request.form['dnum']
-
-        if session['department_id'] == None:
-            cursor.execute("UPDATE Project SET Pname = %s, Plocation = %s, Dnum = %s WHERE Pnumber = %s",
-                       (pname, plocation, dnum, pnumber))
-            conn.commit()
-        else:
-            cursor.execute("SELECT FROM Project, Department WHERE Pnumber = %s AND Dnumber = %s AND Dnum = Dnumber", 
-                       (pnumber, session['department_id']))
-            project = cursor.fetchall()
-
-            #if the project has the same dept, allow the user to update it
-            if project:
-                cursor.execute("UPDATE Project SET Pname = %s, Plocation = %s, Dnum = %s WHERE Pnumber = %s",
-                       (pname, plocation, dnum, pnumber))
-                conn.commit()
-            else:
-                conn.rollback()
-                flash("Failed to update project - the project is not in the correct department.", "update_project_error")
-        
-        cursor.close()
-        conn.close()
+        updated = execute(*project_update(pnumber, request.form['pname'], request.form['plocation'], dnum,
+                                          session['department_id']))
+        # A superadmin may have moved the project out of any department
+        if updated and session['department_id'] == None:
+            invalidate_pages('project')
+        elif updated:
+            invalidate_pages('project', session['department_id'], dnum)
+        elif session['department_id'] != None:
+            flash("Failed to update project - the project is not in the correct department.", "update_project_error")
         return redirect(url_for('view_projects'))
 
+    conn = get_db_connection()
+    cursor = conn.cursor()
     cursor.execute(
         "SELECT Pnumber, Pname, Plocation, Dnum FROM Project WHERE Pnumber = %s", (pnumber,))
     project = cursor.fetchone()
@@ -676,72 +1008,129 @@ def update_project(pnumber):
 @app.route('/projects/delete/<int:pnumber>', methods=('POST',))
 @superadmin_or_admin_required
 def delete_project(pnumber):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    if session['department_id'] == None:
-        cursor.execute("DELETE FROM Project WHERE Pnumber = %s", (pnumber,))
-        conn.commit()
-    else: 
-        cursor.execute("SELECT FROM Project, Department WHERE Pnumber = %s AND Dnumber = %s AND Dnum = Dnumber", 
-                       (pnumber, session['department_id']))
-        project = cursor.fetchall()
-        if project:
-            cursor.execute("DELETE FROM Project WHERE Pnumber = %s", (pnumber,))
-            conn.commit()
-        else: 
-            conn.rollback()
-            flash("Failed to delete project - the project is not in the correct department.", "delete_project_error")
-
-    cursor.close()
-    conn.close()
+    deleted = execute(*project_delete(pnumber, session['department_id']))
+    if deleted and session['department_id'] == None:
+        invalidate_pages('project')
+    elif deleted:
+        invalidate_pages('project', session['department_id'])
+    elif session['department_id'] != None:
+        flash("Failed to delete project - the project is not in the correct department.", "delete_project_error")
     return redirect(url_for('view_projects'))
 
 # View works On
 ###
 ### **** SHOULD WORKSON VIEW BE DEPENDENT ON DEPARTMENT OF EMPLOYEE OR DEPARTMENT OF PROJECT *****
 ###
+
+
 @app.route('/worksOn')
+@read_only
 @login_required
 def view_worksOn():
+    """
+    Works_On listing; ?details=1 adds employee and project names (as JSON with an
+    Accept: application/json header).
+    """
+    details = request.args.get('details') == '1' or wants_json()
     conn = get_db_connection()
     cursor = conn.cursor()
-    if session['department_id'] != None:
-        dnum = session['department_id']
-        cursor.execute("SELECT Essn, Pno, Hours FROM Works_On, Project WHERE Pno=Pnumber And Dnum = %s",(dnum,))
-        worksOn = cursor.fetchall()
-    else:
-        cursor.execute("SELECT Essn, Pno, Hours FROM Works_On")
-        worksOn = cursor.fetchall()
+    select_sql, where, params = works_on_scope(session['department_id'], details)
+    page = fetch_page(cursor, select_sql, [("Essn", "ASC"), ("Pno", "ASC")], [0, 1], where, params)
     cursor.close()
     conn.close()
-    return render_template('view_worksOn.html', worksOn=worksOn)
+    if wants_json():
+        return jsonify(listing_json(WORKS_ON_DETAIL_COLUMNS, page))
+    return render_template('view_worksOn.html', worksOn=page['rows'], page=page, details=details)
     
+# Export works On
+@app.route('/worksOn/export')
+@read_only
+@login_required
+def export_worksOn():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"Unsupported format: {fmt}"), 400
+
+    sql, where, params = works_on_scope(session['department_id'])
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return export_response(get_db_connection(), sql, params, ["Essn", "Pno", "Hours"], fmt, "works_on")
+
+
+@app.route('/worksOn/batch', methods=['POST'])
+@superadmin_or_admin_required
+def update_worksOn_batch():
+    """
+    Set the Hours of many assignments at once, from the editable grid on view_worksOn or as
+    JSON {"changes": [{"essn", "pno", "hours"}, ...]}. An admin's batch is rejected unless
+    every project belongs to their department, checked with one query; the changes are then
+    applied by one UPDATE in one transaction.
+    """
+    json_response = request.is_json
+    back = url_for('view_worksOn', **request.args)
+
+    def reject(message, status, errors=()):
+        if json_response:
+            return jsonify(error=message, errors=list(errors)), status
+        flash(message, "update_worksOn_error")
+        return redirect(back)
+
+    items = json_changes(request.get_json(silent=True)) if json_response else grid_items(request.form)
+    if items is None:
+        return reject('Expected a JSON object with a "changes" list.', 400)
+    changes, errors = hours_changes(items)
+    limit = app.config.get('WORKS_ON_BATCH_LIMIT', 1000)
+    if errors:
+        return reject("Invalid changes, nothing was updated.", 400, errors)
+    if not changes:
+        return reject("No changes to save.", 400)
+    if len(changes) > limit:
+        return reject(f"At most {limit} assignments can be changed at once.", 400)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        department_id = session['department_id']
+        if department_id is not None:
+            pnos = sorted({pno for _, pno in changes})
+            cursor.execute("SELECT Pnumber FROM Project WHERE Pnumber = ANY(%s) AND Dnum = %s", (pnos, department_id))
+            forbidden = sorted(set(pnos) - {row[0] for row in cursor.fetchall()})
+            if forbidden:
+                conn.rollback()
+                return reject(f"You can only update work on projects within your department (not {forbidden}).", 403)
+
+        cursor.execute(*hours_batch_update(changes))
+        updated = {(essn.rstrip(), pno) for essn, pno in cursor.fetchall()}
+        conn.commit()
+        invalidate_pages('works_on')
+    except psycopg2.Error as e:
+        conn.rollback()
+        return reject(f"Failed to update hours, nothing was changed: {e}", 500)
+    finally:
+        cursor.close()
+
+    missing = [{"essn": essn, "pno": pno} for essn, pno in changes if (essn, pno) not in updated]
+    if json_response:
+        return jsonify(updated=len(updated), missing=missing)
+    flash(f"Updated hours for {len(updated)} assignment(s).", "update_worksOn_success")
+    if missing:
+        flash(f"{len(missing)} assignment(s) no longer exist and were skipped.", "update_worksOn_error")
+    return redirect(back)
+
+
 # Add works On    
 @app.route('/worksOn/add', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def add_worksOn():
     if request.method == 'POST':
-        Essn = request.form['essn']
-        Pno = request.form['pnum']
-        Hours = request.form['Hours']
-        
-        if session['department_id'] != None:
-            conn=get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT Dnum FROM Project WHERE Pnumber=%s",(Pno,))
-            Dno = cursor.fetchone()
-            if(Dno[0] != session['department_id']):
+        try:
+            if execute(*works_on_insert(request.form['essn'], request.form['pnum'], request.form['Hours'],
+                                        session['department_id'])):
+                invalidate_pages('works_on')
+            else:
                 flash("You can only assign work to employees within your own department.")
-                return redirect(url_for('view_worksOn'))
-            cursor.close()
-            conn.close()
-        conn=get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO Works_On (Essn, Pno, Hours) VALUES (%s, %s, %s)", (Essn, Pno, Hours,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        except psycopg2.IntegrityError:
+            flash("Failed to add work. Ensure the Employee SSN and Project Number are valid and not already assigned.")
         return redirect(url_for('view_worksOn'))
     return render_template('add_worksOn.html')
        
@@ -750,21 +1139,14 @@ def add_worksOn():
 @app.route('/worksOn/update/<string:ssn>/<int:pnumber>', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def update_worksOn(ssn, pnumber):
-    conn = get_db_connection()
-    cursor = conn.cursor() 
     if request.method == 'POST':
-        Hours = request.form['Hours']
-        if session['department_id'] != None:
-            cursor.execute("SELECT Dnum FROM Project WHERE Pnumber=%s",(pnumber,))
-            Dno = cursor.fetchone()
-            if(Dno[0] != session['department_id']):
-                flash("You can only update work to projects within your department.")
-                return redirect(url_for('view_worksOn'))
-        cursor.execute("UPDATE Works_On SET Hours = %s WHERE Pno=%s And Essn=%s", (Hours,pnumber,ssn))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        if execute(*works_on_update(ssn, pnumber, request.form['Hours'], session['department_id'])):
+            invalidate_pages('works_on')
+        elif session['department_id'] != None:
+            flash("You can only update work to projects within your department.")
         return redirect(url_for('view_worksOn'))
+    conn = get_db_connection()
+    cursor = conn.cursor()
     cursor.execute("SELECT Essn, Pno, Hours FROM Works_On WHERE Essn = %s and Pno = %s",(ssn,pnumber,))
     worksOn = cursor.fetchone()
     cursor.close()
@@ -775,114 +1157,77 @@ def update_worksOn(ssn, pnumber):
 @app.route('/worksOn/delete/<string:ssn>/<int:pnumber>', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def delete_worksOn(ssn, pnumber):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if session['department_id'] == None:
-        cursor.execute("DELETE FROM Works_On WHERE Pno=%s And Essn=%s", (pnumber, ssn,))
-    else:
-        cursor.execute("SELECT FROM Works_On, Project WHERE Pno=%s And Essn=%s And Essn=SSN And Dno=%s",(pnumber,ssn,session['department_id']))
-        worksOn = cursor.fetchall()
-        if worksOn:
-            cursor.execute("DELETE FROM Works_On WHERE Pno=%s And Essn=%s", (pnumber,ssn))
-        else:
-            conn.rollback()
-            flash("Failed to delete works on - incorrect department")
-    conn.commit()
-    cursor.close()
-    conn.close()
+    if execute(*works_on_delete(ssn, pnumber, session['department_id'])):
+        invalidate_pages('works_on')
+    elif session['department_id'] != None:
+        flash("Failed to delete works on - incorrect department")
     return redirect(url_for('view_worksOn'))
 
 #Dependents
 
+
 @app.route('/dependents')
+@read_only
 @login_required
 def view_dependents():
+    """
+    Dependent listing; ?details=1 adds the employee's name and department (as JSON with an
+    Accept: application/json header).
+    """
+    details = request.args.get('details') == '1' or wants_json()
     conn = get_db_connection()
     cursor = conn.cursor()
-    if session['department_id'] != None:
-        dnum = session['department_id']
-        cursor.execute("SELECT Essn, Dependent_name, d.Sex, d.Bdate, Relationship FROM Dependent d, Employee E WHERE Essn=SSN and Dno=%s",(dnum,))
-        dependents = cursor.fetchall()
-    else:
-        cursor.execute("SELECT Essn, Dependent_name, Sex, Bdate, Relationship FROM Dependent")
-        dependents = cursor.fetchall()
+    select_sql, where, params = dependent_scope(session['department_id'], details)
+    page = fetch_page(cursor, select_sql, [("d.Essn", "ASC"), ("d.Dependent_name", "ASC")], [0, 1], where, params)
     cursor.close()
     conn.close()
-    return render_template('view_dependents.html', dependents=dependents)
+    if wants_json():
+        return jsonify(listing_json(DEPENDENT_DETAIL_COLUMNS, page))
+    return render_template('view_dependents.html', dependents=page['rows'], page=page, details=details)
 
 @app.route('/dependents/add', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def add_dependent():
     if request.method == 'POST':
-        Essn = request.form['SSN']
-        Dependent_name = request.form['Dependent_Name']
-        Sex = request.form['Sex']
-        Bdate = request.form['Birthday']
-        Relationship = request.form['Relationship']
-        if session['department_id'] != None:
-            conn=get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT Dno FROM Employee WHERE SSN=%s",(Essn,))
-            Dno = cursor.fetchone()
-            if(Dno[0] != session['department_id']):
+        try:
+            if execute(*dependent_insert(request.form['SSN'], request.form['Dependent_Name'], request.form['Sex'],
+                                         request.form['Birthday'], request.form['Relationship'],
+                                         session['department_id'])):
+                invalidate_pages('dependent')
+            else:
                 flash("You can only add dependents for your own department.")
-                return redirect(url_for('view_dependents'))
-            cursor.close()
-            conn.close()
-        conn=get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO Dependent VALUES (%s, %s, %s, %s, %s)",(Essn, Dependent_name, Sex, Bdate, Relationship))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        except psycopg2.IntegrityError:
+            flash("Failed to add dependent. Ensure the Employee SSN is valid and the dependent is not already "
+                  "recorded.")
         return redirect(url_for('view_dependents'))
     return render_template('add_dependent.html')
 
 @app.route('/dependents/update/<string:ssn>/<string:depName>', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def update_dependents(ssn,depName):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    if session['department_id'] != None:
-            cursor.execute("SELECT Dno FROM Employee WHERE SSN=%s",(ssn,))
-            Dno = cursor.fetchone()
-            if(Dno[0] != session['department_id']):
-                return redirect(url_for('view_dependents'))
     if request.method == 'POST':
-        Sex= request.form['Sex']
-        Bdate = request.form['Birthday']
-        Relationship = request.form['Relationship']
-        cursor.execute("UPDATE Dependent SET Sex = %s, Bdate = %s, Relationship = %s WHERE Essn = %s and Dependent_name = %s", (Sex,Bdate,Relationship,ssn,depName))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        if execute(*dependent_update(ssn, depName, request.form['Sex'], request.form['Birthday'],
+                                     request.form['Relationship'], session['department_id'])):
+            invalidate_pages('dependent')
         return redirect(url_for('view_dependents'))
-    cursor.execute("SELECT Essn, Dependent_name, Sex, Bdate, Relationship FROM Dependent WHERE Essn = %s and Dependent_name = %s",(ssn,depName,))
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(*dependent_select(ssn, depName, session['department_id']))
     dependent = cursor.fetchone()
     cursor.close()
     conn.close()
+    # Outside an admin's department there is no row
+    if dependent is None and session['department_id'] != None:
+        return redirect(url_for('view_dependents'))
     return render_template('update_dependents.html',dependent=dependent)
 
 @app.route('/dependents/delete/<string:ssn>/<string:depName>', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def delete_dependents(ssn, depName):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if session['department_id'] == None:
-        cursor.execute("DELETE FROM Dependent WHERE Dependent_name=%s And Essn=%s", (depName, ssn,))
-    else:
-        cursor.execute("SELECT FROM Employee WHERE Essn=%s And Dno=%s",ssn,session['department_id'])
-        department = cursor.fetchall()
-        if department:
-            cursor.execute("DELETE FROM Dependent WHERE Dependent_name=%s And Essn=%s", (depName,ssn))
-        else:
-            conn.rollback()
-            flash("Failed to delete works on - incorrect department")
-    conn.commit()
-    cursor.close()
-    conn.close()
+    if execute(*dependent_delete(ssn, depName, session['department_id'])):
+        invalidate_pages('dependent')
+    elif session['department_id'] != None:
+        flash("Failed to delete works on - incorrect department")
     return redirect(url_for('view_dependents'))
 
 
@@ -890,32 +1235,27 @@ def delete_dependents(ssn, depName):
 
 # Route to view all locations
 @app.route('/locations')
+@read_only
 @login_required
+@page_cached('dept_location')
 def view_locations():
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    # Department users get a plain parameterized read: no DDL, no shared view, no locks
+    # beyond those of a SELECT, so concurrent users of different departments never interfere.
+    select_sql = "SELECT Dnumber, Dlocation FROM Dept_location"
+    key_columns = [("Dnumber", "ASC"), ("Dlocation", "ASC")]
     if session['department_id'] != None:
         dnumber = session['department_id']
-        try:
-            cursor.execute("CREATE VIEW LocationsByDept AS SELECT Dnumber, Dlocation FROM Dept_location WHERE Dnumber=%s", (dnumber,))
-            conn.commit()
-        except psycopg2.errors.DuplicateTable:
-            conn.rollback()
-            cursor.execute("DROP VIEW LocationsByDept")
-            cursor.execute("CREATE VIEW LocationsByDept AS SELECT Dnumber, Dlocation FROM Dept_location WHERE Dnumber=%s", (dnumber,))
-            conn.commit()
-
-        cursor.execute("SELECT * FROM LocationsByDept")
-        locations = cursor.fetchall()
+        page = fetch_page(cursor, select_sql, key_columns, [0, 1], ["Dnumber = %s"], [dnumber])
 
     else: 
-        cursor.execute("SELECT Dnumber, Dlocation FROM Dept_location")
-        locations = cursor.fetchall()
+        page = fetch_page(cursor, select_sql, key_columns, [0, 1])
 
     cursor.close()
     conn.close()
-    return render_template('view_locations.html', locations=locations)
+    return render_template('view_locations.html', locations=page['rows'], page=page)
 
 
 # Route to add a new department location
@@ -924,27 +1264,15 @@ def view_locations():
 def add_location():
     if request.method == 'POST':
         dnumber = request.form['dnumber']
-        dlocation = request.form['dlocation']
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        if session['department id'] == None:
-            cursor.execute("INSERT INTO Dept_location (Dnumber, Dlocation) VALUES (%s, %s)", (dnumber, dlocation))
-            conn.commit()
-        else:
-            cursor.execute("SELECT FROM Dept_location AS DL, Department AS D WHERE DL.Dnumber = %s AND D.Dnumber = %s AND DL.Dnumber = D.Dnumber", 
-                       (dnumber, session['department_id']))
-            location = cursor.fetchall()
-            if location:
-                cursor.execute("INSERT INTO Dept_location (Dnumber, Dlocation) VALUES (%s, %s)", (dnumber, dlocation))
-                conn.commit()
+        try:
+            if execute(*location_insert(dnumber, request.form['dlocation'], session['department_id'])):
+                invalidate_pages('dept_location', dnumber)
             else:
-                conn.rollback()
-                flash("Failed to insert - the department location is not in the correct department.", "add_location_error")
-
-        cursor.close()
-        conn.close()
+                flash("Failed to insert - the department location is not in the correct department.",
+                      "add_location_error")
+        except psycopg2.IntegrityError:
+            flash("Failed to add location. Ensure the Department Number is valid and the location is not already "
+                  "recorded.", "add_location_error")
         return redirect(url_for('view_locations'))
 
     return render_template('add_location.html')
@@ -954,35 +1282,16 @@ def add_location():
 @app.route('/location/update/<int:dnumber>/<dlocation>', methods=('GET', 'POST'))
 @superadmin_or_admin_required
 def update_location(dnumber, dlocation):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
     if request.method == 'POST':
         dnumbernew = request.form['dnumber']
-        dlocationnew = request.form['dlocation']
-
-        if session['department_id'] == None:
-            cursor.execute("UPDATE Dept_location SET Dlocation = %s, Dnumber = %s WHERE Dnumber = %s AND Dlocation = %s",
-                       (dlocationnew, dnumbernew, dnumber, dlocation))
-            conn.commit()
-        else:
-            cursor.execute("SELECT FROM Dept_location AS DL, Department AS D WHERE DL.Dnumber = %s AND D.Dnumber = %s AND DL.Dnumber = D.Dnumber", 
-                       (dnumber, session['department_id']))
-            location = cursor.fetchall()
-
-            #if the location has the same dept, allow the user to update it
-            if location:
-                cursor.execute("UPDATE Dept_location SET Dlocation = %s AND Dnumber = %s WHERE Dnumber = %s AND Dlocation = %s",
-                       (dlocation, dnumber, dnumber, dlocation))
-                conn.commit()
-            else:
-                conn.rollback()
-                flash("Failed to update - the department location is not in the correct department.", "update_location_error")
-        
-        cursor.close()
-        conn.close()
+        if execute(*location_update(dnumber, dlocation, dnumbernew, request.form['dlocation'], session['department_id'])):
+            invalidate_pages('dept_location', dnumber, dnumbernew)
+        elif session['department_id'] != None:
+            flash("Failed to update - the department location is not in the correct department.", "update_location_error")
         return redirect(url_for('view_locations'))
 
+    conn = get_db_connection()
+    cursor = conn.cursor()
     cursor.execute(
         "SELECT Dnumber, Dlocation FROM Dept_location WHERE Dnumber = %s AND Dlocation = %s", (dnumber, dlocation))
     location = cursor.fetchone()
@@ -995,26 +1304,78 @@ def update_location(dnumber, dlocation):
 @app.route('/locations/delete/<int:dnumber>/<dlocation>', methods=('POST',))
 @superadmin_or_admin_required
 def delete_location(dnumber, dlocation):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if execute(*location_delete(dnumber, dlocation, session['department_id'])):
+        invalidate_pages('dept_location', dnumber)
+    elif session['department_id'] != None:
+        flash("Failed to delete - the department location is not in the correct department.", "delete_location_error")
+    return redirect(url_for('view_locations'))
 
-    if session['department_id'] == None:
-        cursor.execute("DELETE FROM Dept_location WHERE Dnumber = %s AND Dlocation = %s", (dnumber, dlocation))
-        conn.commit()
-    else: 
-        cursor.execute("SELECT FROM Dept_location AS DL, Department AS D WHERE DL.Dnumber = %s AND D.Dnumber = %s AND DL.Dnumber = D.Dnumber", 
-                       (dnumber, session['department_id']))
-        location = cursor.fetchall()
-        if location:
-            cursor.execute("DELETE FROM Dept_location WHERE Dnumber = %sAND Dlocation = %s", (dnumber, dlocation))
-            conn.commit()
-        else: 
-            conn.rollback()
-            flash("Failed to delete - the department location is not in the correct department.", "delete_location_error")
 
-    cursor.close()
-    conn.close()
-    return redirect(url_for('view_locations'))
+# JSON API (api.py): /api/v1/<entity> for every entity in API_ENTITIES
+def api_login_required(f):
+    """
+    login_required for the API: a 401 with a JSON error instead of the redirect to the login form.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session or current_role() is None:
+            return jsonify(error="Authentication required; log in at /login first."), 401
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def compressed(f):
+    """
+    Compress the handler's response with the best coding the client accepts (brotli, gzip).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        response.vary.add('Accept-Encoding')
+        config = app.config.get('API_CONFIG', {})
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if (encoding and not response.is_streamed
+                and compressible(response.status_code, response.headers, response.content_length, config)):
+            response.set_data(compress_body(response.get_data(), encoding, config))
+            response.headers['Content-Encoding'] = encoding
+            # The ETag names the uncompressed page; the compressed body only matches it weakly
+            if response.headers.get('ETag', '').startswith('"'):
+                response.headers['ETag'] = 'W/' + response.headers['ETag']
+        return response
+
+    return decorated_function
+
+
+def api_listing(entity):
+    """
+    View for /api/v1/<entity>: a keyset page of the entity's rows the user may see, with the
+    ?fields= selected, as {"rows", "next", "prev", "limit"}.
+    """
+    def view():
+        try:
+            fields = api_fields(entity, request.args.get('fields'))
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        query = api_listing_query(entity, fields, session.get('role_id'), session.get('department_id'))
+        if query is None:
+            return jsonify(error=f"Access denied. You do not have permission to view {entity}."), 403
+
+        select_sql, key_columns, key_indexes, where, params = query
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        page = fetch_page(cursor, select_sql, key_columns, key_indexes, where, params,
+                          prepare=not request.args.get('fields'))
+        cursor.close()
+        return jsonify(listing_json(fields, page))
+
+    view.__name__ = f"api_{entity}"
+    return view
+
+
+for _entity, _spec in API_ENTITIES.items():
+    app.add_url_rule(f'/api/v1/{_entity}', f'api_{_entity}',
+                     read_only(compressed(api_login_required(page_cached(*_spec['tables'], flashes=False)(api_listing(_entity))))))
 
 
 if __name__ == "__main__":
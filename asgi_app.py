@@ -0,0 +1,1353 @@
+"""
+Async serving mode: the same routes as app.py on Quart, with an async psycopg 3 pool.
+
+Each handler awaits the database instead of blocking a thread on it, so one worker keeps
+many users in flight while their queries run. Templates, SQL, session-based RBAC and the
+department filtering are shared with app.py. Run it under an ASGI server with several
+worker processes, e.g.
+
+    python asgi_app.py                                # uvicorn, ASGI_SERVER_CONFIG in config.py
+    uvicorn asgi_app:app --workers 4 --port 8000
+
+Requires: pip install quart "psycopg[binary]" psycopg-pool uvicorn
+"""
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from functools import wraps
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg.pq import TransactionStatus
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from quart import (Quart, Response, flash, g, jsonify, make_response, redirect, render_template, request, session,
+                   stream_with_context, url_for)
+from quart.sessions import SessionInterface
+from werkzeug.http import http_date
+
+from api import API_ENTITIES, api_fields, api_listing_query, compress_body, compressible, negotiate_encoding
+from bulk_import import (IMPORT_FORMATS, IMPORT_SPECS, check_works_on, import_report, insert_sql, read_records,
+                         returned_key, validate_records, works_on_lookups)
+from dal import (dependent_delete, dependent_insert, dependent_select, dependent_update, location_delete, location_insert,
+                 location_update, project_delete, project_insert, project_update, works_on_delete, works_on_insert,
+                 works_on_update)
+from export import EXPORT_FORMATS, _csv_chunk, _json_value
+from instrumentation import (begin_request, configure_logging, end_request, log_request, record_acquire,
+                             record_query, server_timing)
+from metrics import (cache_samples, clear_snapshots, collect, inc, maybe_write_snapshot, observe_request,
+                     password_samples, pool_samples, register_collector, render)
+from page_cache import (cached_page, configure_page_cache, invalidate_pages, not_modified, page_cache_enabled,
+                        page_generation, page_key, remember_page)
+from pagination import keyset_page, keyset_query, page_cursors, page_size
+from passwords import (HashingBusy, configure_passwords, hash_timeout, login_retry_after, password_stats,
+                       submit_hash, submit_verify)
+from prepared import configure_prepared, max_per_connection, note_prepared, prepared_enabled
+from queries import (DEPENDENT_DETAIL_COLUMNS, EMPLOYEE_COLUMNS, WORKS_ON_DETAIL_COLUMNS, dependent_scope,
+                     employee_filter_args, employee_filters, employee_listing_query, employee_scope, employee_search_query,
+                     employee_search_results, employee_sort, grid_items, hours_batch_update, hours_changes, import_format,
+                     json_changes, listing_json, prefetch_queries, prefetch_result, prefetch_ssns, works_on_scope)
+from reference import (REFERENCE_QUERIES, cached_reference, invalidate_reference, remember_reference,
+                       start_listener)
+from replicas import STATUS_SQL, WRITE_LSN_SQL, replica_router
+from roles import LOGIN_SQL, MISSING, ROLE_SQL, apply_role, role_fields, role_is_fresh, user_changed
+from sessions import configure_sessions, load_session, secret_key, write_session_cookie
+from summary import SUMMARY_COLUMNS, start_refresher
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Quart counterpart of sessions.ServerSessionInterface. Store access is a dict lookup or
+    a SQLite primary-key read, cheap enough to run on the event loop.
+    """
+
+    async def open_session(self, app, request):
+        return load_session(request.cookies.get(self.get_cookie_name(app)))
+
+    async def save_session(self, app, session, response):
+        if response is not None:
+            write_session_cookie(self, app, response, session)
+
+
+app = Quart(__name__)
+app.config.from_pyfile('config.py')
+app.secret_key = secret_key(app.config)
+configure_sessions(app.config.get('SESSION_CONFIG'))
+app.session_interface = ServerSessionInterface()
+configure_page_cache(app.config.get('PAGE_CACHE_CONFIG'))
+configure_passwords(app.config.get('PASSWORD_HASHING_CONFIG'), app.config.get('LOGIN_RATE_LIMITS'))
+configure_prepared(app.config.get('PREPARED_STATEMENTS_CONFIG'))
+
+pool = None
+router = None
+
+
+class InstrumentedAsyncCursor(psycopg.AsyncCursor):
+    """
+    Async counterpart of instrumentation.InstrumentedCursor: times every statement into the
+    current request's stats.
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            record_query(query if isinstance(query, (str, bytes)) else repr(query), time.perf_counter() - start)
+
+
+async def instrument_connection(conn):
+    conn.cursor_factory = InstrumentedAsyncCursor
+    # psycopg prepares the hot statements itself (prepare=True below); with them off, it
+    # prepares nothing at all
+    conn.prepared_max = max_per_connection()
+    if not prepared_enabled():
+        conn.prepare_threshold = None
+
+
+@app.before_serving
+async def open_pool():
+    # Runs in every worker process after it has started, so each worker owns its own pool
+    global pool
+    pool_config = app.config.get('DB_POOL_CONFIG', {})
+    pool = AsyncConnectionPool(
+        make_conninfo(**app.config['DATABASE_CONFIG']),
+        min_size=pool_config.get('minconn', 1),
+        max_size=pool_config.get('maxconn', 10),
+        timeout=pool_config.get('timeout', 5.0),
+        max_idle=pool_config.get('max_idle', 300.0),
+        check=AsyncConnectionPool.check_connection,
+        configure=instrument_connection,
+        open=False,
+    )
+    await pool.open()
+    global router
+    router = replica_router(app.config.get('REPLICA_CONFIG'))
+    for replica in (router.replicas if router else []):
+        # No connections up front, so a replica that is down does not hold up the worker
+        replica.pool = AsyncConnectionPool(
+            make_conninfo(**replica.dsn_kwargs),
+            min_size=0,
+            max_size=pool_config.get('maxconn', 10),
+            timeout=pool_config.get('timeout', 5.0),
+            max_idle=pool_config.get('max_idle', 300.0),
+            check=AsyncConnectionPool.check_connection,
+            configure=instrument_connection,
+            open=False,
+        )
+        await replica.pool.open()
+    if app.config.get('REFERENCE_CACHE_CONFIG', {}).get('listen'):
+        start_listener(app.config['DATABASE_CONFIG'])
+    dashboard_config = app.config.get('DASHBOARD_CONFIG', {})
+    if dashboard_config.get('refresh_in_app', True):
+        start_refresher(app.config['DATABASE_CONFIG'], dashboard_config.get('refresh_interval', 300))
+
+
+@app.after_serving
+async def close_pool():
+    await pool.close()
+    for replica in (router.replicas if router else []):
+        await replica.pool.close()
+
+
+async def get_db_connection():
+    """
+    Return the connection for the current request, checking one out of the pool on first use.
+    In a handler marked read-only, this is get_read_connection().
+    """
+    if g.get('read_only'):
+        return await get_read_connection()
+    if 'db_conn' not in g:
+        start = time.perf_counter()
+        g.db_conn = await pool.getconn()
+        record_acquire(time.perf_counter() - start)
+    return g.db_conn
+
+
+async def get_read_connection():
+    """
+    Async counterpart of db.get_read_connection(): a read replica current enough for this
+    user and process, or else the request's primary connection.
+    """
+    if 'read_conn' not in g:
+        conn = await replica_connection()
+        inc("db_reads_total", (("target", "primary" if conn is None else "replica"),))
+        if conn is None:
+            if 'db_conn' not in g:
+                start = time.perf_counter()
+                g.db_conn = await pool.getconn()
+                record_acquire(time.perf_counter() - start)
+            conn = g.db_conn
+        g.read_conn = conn
+    return g.read_conn
+
+
+async def replica_connection():
+    if router is None:
+        return None
+    min_lsn = router.min_lsn(session)
+    for replica in router.candidates(min_lsn):
+        start = time.perf_counter()
+        try:
+            conn = await replica.pool.getconn()
+        except (psycopg.Error, PoolTimeout) as e:
+            router.record_failure(replica, e)
+            continue
+        record_acquire(time.perf_counter() - start)
+        conn.replica_pool = replica.pool
+        if router.needs_check(replica):
+            try:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(STATUS_SQL)
+                    router.record_status(replica, await cursor.fetchone())
+            except psycopg.Error as e:
+                router.record_failure(replica, e)
+                await replica.pool.putconn(conn)
+                continue
+        if router.usable(replica, min_lsn):
+            return conn
+        await replica.pool.putconn(conn)
+    return None
+
+
+async def commit(conn):
+    """
+    Commit the request's transaction on the primary, noting its WAL position for the
+    replica routing (see replicas.py) when replicas are configured.
+    """
+    await conn.commit()
+    if router is not None:
+        async with conn.cursor() as cursor:
+            await cursor.execute(WRITE_LSN_SQL)
+            router.remember_write(session, (await cursor.fetchone())[0])
+
+
+async def checkout_connection(read_only=False):
+    """
+    (connection, pool to hand it back to) for work that outlives the request, like streaming
+    an export: not the request's connection, which goes back to the pool when the handler
+    returns. With `read_only`, a read replica when one is current enough.
+    """
+    conn = await replica_connection() if read_only else None
+    if read_only:
+        inc("db_reads_total", (("target", "primary" if conn is None else "replica"),))
+    if conn is not None:
+        return conn, conn.replica_pool
+    start = time.perf_counter()
+    conn = await pool.getconn()
+    record_acquire(time.perf_counter() - start)
+    return conn, pool
+
+
+async def return_connection(conn, conn_pool):
+    try:
+        # Read-only handlers leave their transaction open; end it before handing the connection on
+        if conn.info.transaction_status == TransactionStatus.INTRANS:
+            await conn.rollback()
+    finally:
+        await conn_pool.putconn(conn)
+
+
+@app.teardown_appcontext
+async def release_db_connection(exc=None):
+    conn = g.pop('db_conn', None)
+    read_conn = g.pop('read_conn', None)
+    returns = [(conn, pool)]
+    if read_conn is not conn:
+        returns.append((read_conn, getattr(read_conn, 'replica_pool', None)))
+    for conn, conn_pool in returns:
+        if conn is not None:
+            await return_connection(conn, conn_pool)
+
+
+def read_only(f):
+    """
+    Async counterpart of app.read_only: the handler's queries may go to a read replica.
+    """
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+
+@app.before_request
+async def start_request_stats():
+    begin_request(request.endpoint, app.config.get('SQL_INSTRUMENTATION', {}).get('slow_query_ms'))
+
+
+@app.after_request
+async def emit_request_stats(response):
+    stats = end_request()
+    if stats is not None:
+        if app.config.get('SQL_INSTRUMENTATION', {}).get('server_timing', True):
+            response.headers['Server-Timing'] = server_timing(stats)
+        log_request(stats, request.method, response.status_code)
+        observe_request(stats, request.method, response.status_code)
+        maybe_write_snapshot(metrics_dir(), app.config.get('METRICS_CONFIG', {}).get('snapshot_interval', 5.0))
+    return response
+
+
+def metrics_dir():
+    return os.environ.get('METRICS_MULTIPROC_DIR') or app.config.get('METRICS_CONFIG', {}).get('multiprocess_dir')
+
+
+def pool_metric_samples():
+    """
+    psycopg_pool's statistics under the names db.ConnectionPool.stats() uses.
+    """
+    if pool is None:
+        return []
+    stats = pool.get_stats()
+    return pool_samples({
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "idle": stats.get("pool_available", 0),
+        "size": stats.get("pool_max", 0),
+        "checkouts": stats.get("requests_num", 0),
+        "waits": stats.get("requests_queued", 0),
+        "timeouts": stats.get("requests_errors", 0),
+        "wait_seconds_total": stats.get("requests_wait_ms", 0) / 1000,
+        "opened": stats.get("connections_num", 0),
+    })
+
+
+configure_logging(app.config.get('SQL_INSTRUMENTATION', {}).get('log_requests', False))
+register_collector(pool_metric_samples)
+register_collector(cache_samples)
+register_collector(password_samples)
+
+
+async def run_statement(cursor, sql, params, prepare):
+    """
+    Execute on the cursor; `prepare` marks one of the hot statements, prepared on the
+    connection on first use (see prepared.py).
+    """
+    if prepare and prepared_enabled():
+        note_prepared(cursor.connection, sql)
+        await cursor.execute(sql, params, prepare=True)
+    else:
+        await cursor.execute(sql, params)
+
+
+async def fetchall(sql, params=(), prepare=False):
+    conn = await get_db_connection()
+    async with conn.cursor() as cursor:
+        await run_statement(cursor, sql, params, prepare)
+        return await cursor.fetchall()
+
+
+async def fetchone(sql, params=(), prepare=False):
+    conn = await get_db_connection()
+    async with conn.cursor() as cursor:
+        await run_statement(cursor, sql, params, prepare)
+        return await cursor.fetchone()
+
+
+async def execute(sql, params=()):
+    """
+    Run one write and commit it. Returns the number of rows affected; a failed write is
+    rolled back before its error is raised.
+    """
+    conn = await get_db_connection()
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute(sql, params)
+            rowcount = cursor.rowcount
+    except psycopg.Error:
+        await conn.rollback()
+        raise
+    await commit(conn)
+    return rowcount
+
+
+def wants_json():
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+
+async def fetch_page(select_sql, key_columns, key_indexes, where=(), params=(), prepare=True):
+    limit = page_size(request.args, app.config)
+    after, before = page_cursors(request.args, len(key_columns))
+    try:
+        rows = await fetchall(*keyset_query(select_sql, key_columns, where, params, after, before, limit), prepare)
+    except (psycopg.DataError, psycopg.errors.UndefinedFunction, psycopg.errors.DatatypeMismatch):
+        # A cursor whose values do not fit the key columns' types: start over, as pagination.fetch_page does
+        if after is None and before is None:
+            raise
+        await (await get_db_connection()).rollback()
+        after = before = None
+        rows = await fetchall(*keyset_query(select_sql, key_columns, where, params, after, before, limit), prepare)
+    return keyset_page(rows, key_indexes, limit, after, before)
+
+
+async def reference_list(name):
+    """
+    Async counterpart of reference.reference_list(), sharing its per-process cache.
+    """
+    values, generation = cached_reference(name)
+    if values is MISSING:
+        conn = await get_read_connection()
+        async with conn.cursor() as cursor:
+            await cursor.execute(REFERENCE_QUERIES[name][0])
+            values = [row[0] for row in await cursor.fetchall()]
+        config = app.config.get('REFERENCE_CACHE_CONFIG', {})
+        remember_reference(name, values, generation, ttl=config.get('ttl', 300), maxsize=config.get('maxsize', 128))
+    return values
+
+
+@app.template_global()
+def page_url(**params):
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update({k: v for k, v in params.items() if v is not None})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+# Middleware
+async def current_role():
+    """
+    Async counterpart of app.current_role(): the role from the session, re-read from Users
+    once ROLE_CACHE_TTL seconds old.
+    """
+    if role_is_fresh(session, app.config.get('ROLE_CACHE_TTL', 60)):
+        return session.get('role_id')
+    return apply_role(session, await fetchone(ROLE_SQL, (session['user_id'],), prepare=True))
+
+
+def role_required(allowed, message, category):
+    """
+    Decorator factory behind the async login/admin/superadmin checks. `allowed` is the set
+    of role ids that may pass, or None for any logged-in user.
+    """
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            if 'user_id' not in session or await current_role() is None:
+                if allowed is not None:
+                    await flash("Please log in to access this page.", category)
+                return redirect(url_for("login"))
+            if allowed is not None and session['role_id'] not in allowed:
+                await flash(message, category)
+                return redirect(url_for("index"))
+            return await f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+login_required = role_required(None, None, None)
+
+
+def page_cached(*tables, flashes=True):
+    """
+    Async counterpart of app.page_cached: serve a listing page from the page cache, with
+    ETag revalidation, and store it on a miss. The SQLite backend's calls block briefly.
+    """
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            if not page_cache_enabled() or request.method != 'GET' or (flashes and session.get('_flashes')):
+                return await f(*args, **kwargs)
+
+            department_id = session.get('department_id')
+            key = page_key(request.endpoint, session.get('role_id'), department_id, request.args.items(multi=True))
+            entry = cached_page(key)
+            status = 'hit'
+            if entry is None:
+                status = 'miss'
+                generation = page_generation()
+                response = await make_response(await f(*args, **kwargs))
+                if response.status_code != 200 or (flashes and session.get('_flashes')):
+                    return response
+                entry = remember_page(key, await response.get_data(), response.mimetype, department_id, tables,
+                                      generation)
+
+            if not_modified(entry, request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+                response = Response(b'', status=304)
+            else:
+                response = Response(entry['body'], mimetype=entry['mimetype'])
+            response.headers['ETag'] = entry['etag']
+            if entry.get('modified'):
+                response.headers['Last-Modified'] = http_date(entry['modified'])
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.headers['Vary'] = 'Cookie'
+            response.headers['X-Page-Cache'] = status
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+superadmin_required = role_required({1}, "Access restricted to superadmins.", "privilege1_error")
+superadmin_or_admin_required = role_required({1, 2}, "Access restricted to admins or superadmins.", "error")
+
+
+#####################################################################################################################################
+@app.route('/metrics/pool')
+async def pool_metrics():
+    return jsonify({**pool.get_stats(), **({"replicas": router.status()} if router else {})})
+
+
+@app.route('/metrics')
+async def prometheus_metrics():
+    return Response(render(collect(metrics_dir())), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/')
+async def index():
+    session.pop('_flashes', None)
+    return await render_template('login.html', username=session.get('username'))
+
+
+@app.route('/login', methods=['GET', 'POST'])
+async def login():
+    if request.method == 'POST':
+        form = await request.form
+        username = form['username']
+        password = form['password']
+
+        retry_after = login_retry_after(username, request.remote_addr)
+        if retry_after:
+            return await login_refused('Too many sign-in attempts. Please wait a moment and try again.', 429,
+                                       retry_after)
+
+        user = await fetchone(LOGIN_SQL, (username,), prepare=True)
+        await release_db_connection()
+
+        try:
+            matches, new_hash = await on_hashing_pool(submit_verify(user[1], password)) if user else (False, None)
+        except HashingBusy:
+            return await login_refused('The server is busy signing other users in. Please try again in a moment.',
+                                       503, 1)
+        if matches and new_hash:
+            await execute("UPDATE Users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                          (new_hash, user[0], user[1]))
+            password_stats["rehashed"] += 1
+
+        if matches:
+            session.regenerate()
+            session['user_id'] = user[0]
+            session['username'] = username
+            session.update(role_fields(user[2:]))
+            await flash('Login successful!', 'login_success')
+            return redirect(url_for('base'))
+        else:
+            await flash('Invalid username or password.', 'error')
+
+    return await render_template('login.html')
+
+
+async def on_hashing_pool(future):
+    """
+    Await a passwords.submit_*() future without blocking the event loop.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), hash_timeout())
+    except asyncio.TimeoutError:
+        password_stats["busy"] += 1
+        raise HashingBusy("password hashing timed out") from None
+    except BrokenProcessPool:
+        password_stats["busy"] += 1
+        raise HashingBusy("password hashing worker died") from None
+
+
+async def login_refused(message, status, retry_after):
+    await flash(message, 'error')
+    response = await make_response(await render_template('login.html'), status)
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+@app.route('/logout')
+async def logout():
+    session.clear()
+    session.regenerate()
+    await flash('You have been logged out.', 'logout')
+    return redirect(url_for('login'))
+
+
+@app.route('/base')
+@login_required
+async def base():
+    return await render_template('base.html', role_id=session['role_id'])
+
+
+# user access below
+@app.route('/view_users')
+@read_only
+@superadmin_required
+async def view_users():
+    page = await fetch_page("SELECT id, username, role_id, department_id FROM users", [("id", "ASC")], [0])
+    return await render_template('view_users.html', users=page['rows'], page=page)
+
+
+@app.route('/users/update/<int:user_id>', methods=('GET', 'POST'))
+@superadmin_required
+async def update_user(user_id):
+    if request.method == 'POST':
+        form = await request.form
+        department_id = form.get('department_id') or None
+        await execute("UPDATE users SET role_id = %s, department_id = %s WHERE id = %s",
+                      (form['role_id'], department_id, user_id))
+        user_changed(user_id, await fetchone(ROLE_SQL, (user_id,)), session)
+        await flash("User updated successfully!", "update_success")
+        return redirect(url_for('view_users'))
+
+    all_dnumbers = await reference_list('department_numbers')
+    user = await fetchone("SELECT id, username, role_id, department_id FROM users WHERE id = %s", (user_id,))
+    if not user:
+        await flash("User not found!", "user_not_found_error")
+        return redirect(url_for('view_users'))
+    return await render_template('update_user.html', user=user, all_dnumbers=all_dnumbers)
+
+
+@app.route('/users/delete/<int:user_id>', methods=['POST'])
+@superadmin_required
+async def delete_user(user_id):
+    try:
+        await execute("DELETE FROM users WHERE id = %s", (user_id,))
+        user_changed(user_id, None, session)
+        await flash("User deleted successfully!", "user_delete_success")
+    except psycopg.Error as e:
+        await flash(f"An error occurred while deleting the user: {e}", "user_delete_error")
+    return redirect(url_for('view_users'))
+
+
+@app.route('/register', methods=['GET', 'POST'])
+@superadmin_required
+async def register():
+    if request.method == 'POST':
+        form = await request.form
+        try:
+            hashed_password = await on_hashing_pool(submit_hash(form['password']))
+        except HashingBusy:
+            await flash('The server is busy hashing passwords. Please try again in a moment.', 'error')
+            return redirect(url_for('register'))
+        try:
+            await execute(
+                "INSERT INTO Users (username, password_hash, role_id, department_id) VALUES (%s, %s, %s, %s)",
+                (form['username'], hashed_password, form['roleid'], form.get('departmentid') or None))
+            await flash('User created successfully!', 'create')
+        except psycopg.Error as e:
+            await flash(f"Error creating user: {e}", 'error')
+        return redirect(url_for('view_users'))
+
+    all_dnumbers = await reference_list('department_numbers')
+    return await render_template('register.html', all_dnumbers=all_dnumbers)
+
+
+# department below
+@app.route('/view_departments', methods=['GET'])
+@read_only
+@login_required
+@page_cached('department')
+async def view_departments():
+    role_id = session.get('role_id')
+    select_sql = "SELECT Dnumber, Dname, Mgr_ssn FROM Department"
+    if role_id == 1:  # Super Admin
+        page = await fetch_page(select_sql, [("Dnumber", "ASC")], [0])
+    elif role_id in [2, 3]:  # Department Admin
+        page = await fetch_page(select_sql, [("Dnumber", "ASC")], [0], ["Dnumber = %s"], [session.get('department_id')])
+    else:
+        await flash("Access denied. You do not have permission to view departments.", "view_department_error")
+        return redirect(url_for('base'))
+    return await render_template('view_departments.html', departments=page['rows'], page=page)
+
+
+@app.route('/dashboard', methods=['GET'])
+@read_only
+@login_required
+async def dashboard():
+    select_sql = f"SELECT {', '.join(SUMMARY_COLUMNS)}, refreshed_at FROM department_summary"
+    if session.get('role_id') == 1:
+        page = await fetch_page(select_sql, [("Dnumber", "ASC")], [0])
+    else:
+        page = await fetch_page(select_sql, [("Dnumber", "ASC")], [0], ["Dnumber = %s"], [session.get('department_id')])
+    refreshed_at = max((row[-1] for row in page['rows']), default=None)
+    return await render_template('dashboard.html', summaries=page['rows'], page=page, refreshed_at=refreshed_at)
+
+
+@app.route('/departments/add', methods=('GET', 'POST'))
+@superadmin_required
+async def add_department():
+    if request.method == 'POST':
+        form = await request.form
+        try:
+            await execute("INSERT INTO Department (Dname, Dnumber, Mgr_ssn) VALUES (%s, %s, %s)",
+                          (form['dname'], form['dnumber'], form['mgr_ssn']))
+            invalidate_reference('department')
+            invalidate_pages('department', form['dnumber'])
+            await flash("Department added successfully!", "success")
+        except psycopg.IntegrityError:
+            await flash("Failed to add department. Ensure the Department Number and Manager SSN are valid and unique.",
+                        "error")
+        return redirect(url_for('view_departments'))
+
+    return await render_template('add_department.html')
+
+
+@app.route('/departments/update/<int:dnumber>', methods=('GET', 'POST'))
+@superadmin_required
+async def update_department(dnumber):
+    if request.method == 'POST':
+        form = await request.form
+        try:
+            await execute("UPDATE Department SET Dnumber = %s, Dname = %s, Mgr_ssn = %s WHERE Dnumber = %s",
+                          (form['dnumber'], form['dname'], form['mgr_ssn'], dnumber))
+            invalidate_reference('department')
+            invalidate_pages('department', dnumber, form['dnumber'])
+            await flash("Department updated successfully!", "department_update_success")
+        except psycopg.IntegrityError:
+            await flash("Failed to update department. The new Department ID might already exist.",
+                        "department_update_error")
+        return redirect(url_for('view_departments'))
+
+    department = await fetchone("SELECT Dnumber, Dname, Mgr_ssn FROM Department WHERE Dnumber = %s", (dnumber,))
+    if not department:
+        await flash("Department not found!", "error")
+        return redirect(url_for('view_departments'))
+    return await render_template('update_department.html', department=department)
+
+
+@app.route('/departments/delete/<int:dnumber>', methods=('POST',))
+@superadmin_required
+async def delete_department(dnumber):
+    await execute("DELETE FROM Department WHERE Dnumber = %s", (dnumber,))
+    invalidate_reference('department')
+    invalidate_pages('department', dnumber)
+    return redirect(url_for('view_departments'))
+
+
+# Employee below
+@app.route('/view_employees', methods=['GET'])
+@read_only
+@login_required
+async def view_employees():
+    role_id = session.get('role_id')
+    scope = employee_scope(role_id, session.get('department_id'))
+    if scope is None:
+        await flash("Access denied. You do not have permission to view employees.", "view_employee_error")
+        return redirect(url_for('base'))
+
+    try:
+        key_columns, key_indexes = employee_sort(request.args.get('sort'))
+        select_sql, where, params = employee_listing_query(scope, request.args)
+    except ValueError as e:
+        if wants_json():
+            return jsonify(error=str(e)), 400
+        await flash(str(e), "view_employee_filter_error")
+        return redirect(url_for('view_employees'))
+
+    try:
+        page = await fetch_page(select_sql, key_columns, key_indexes, where, params,
+                                prepare=not employee_filter_args(request.args) and not request.args.get('sort'))
+    except psycopg.Error as e:
+        await flash(f"An error occurred while fetching employees: {e}", "view_employee_fetch_error")
+        page = {"rows": [], "next": None, "prev": None, "limit": None}
+
+    if wants_json():
+        return jsonify(listing_json(EMPLOYEE_COLUMNS, page))
+    return await render_template('view_employees.html', employees=page['rows'], page=page, role_id=role_id,
+                                 sort=request.args.get('sort', ''), filters=employee_filter_args(request.args))
+
+
+async def export_response(sql, params, columns, fmt, filename):
+    """
+    Async counterpart of export.export_response: server-side cursor, one chunk per batch.
+    """
+    batch_size = app.config.get('EXPORT_BATCH_SIZE', 1000)
+    read_only = bool(g.get('read_only'))
+
+    @stream_with_context
+    async def generate():
+        # The body streams after the handler has returned and the request's connections have
+        # gone back to the pool, so the export checks out (and returns) a connection of its own
+        conn, conn_pool = await checkout_connection(read_only)
+        try:
+            async with conn.cursor(name=f"export_{uuid.uuid4().hex}") as cursor:
+                await cursor.execute(sql, params)
+                if fmt == "csv":
+                    yield _csv_chunk([columns])
+                while rows := await cursor.fetchmany(batch_size):
+                    if fmt == "csv":
+                        yield _csv_chunk(rows)
+                    else:
+                        yield "".join(json.dumps(dict(zip(columns, row)), default=_json_value) + "\n" for row in rows)
+        finally:
+            await return_connection(conn, conn_pool)
+
+    return Response(generate(), mimetype=EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"})
+
+
+@app.route('/employees/export', methods=['GET'])
+@read_only
+@login_required
+async def export_employees():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"Unsupported format: {fmt}"), 400
+    scope = employee_scope(session.get('role_id'), session.get('department_id'))
+    if scope is None:
+        await flash("Access denied. You do not have permission to view employees.", "view_employee_error")
+        return redirect(url_for('base'))
+
+    try:
+        where, params = employee_filters(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    where, params = scope[0] + where, scope[1] + params
+    sql = f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM Employee"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return await export_response(sql, params, EMPLOYEE_COLUMNS, fmt, "employees")
+
+
+@app.route('/employees/search', methods=['GET'])
+@read_only
+@login_required
+async def search_employees():
+    scope = employee_scope(session.get('role_id'), session.get('department_id'))
+    if scope is None:
+        return jsonify(error="Access denied. You do not have permission to view employees."), 403
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify(results=[])
+    limit = app.config.get('EMPLOYEE_SEARCH_LIMIT', 10)
+    rows = await fetchall(*employee_search_query(q, *scope, limit))
+    return jsonify(results=employee_search_results(rows, limit))
+
+
+@app.route('/employees/prefetch', methods=['GET'])
+@read_only
+@login_required
+async def prefetch_employees():
+    scope = employee_scope(session.get('role_id'), session.get('department_id'))
+    if scope is None:
+        return jsonify(error="Access denied. You do not have permission to view employees."), 403
+    ssns = prefetch_ssns(request.args)
+    limit = app.config.get('PREFETCH_LIMIT', 500)
+    if len(ssns) > limit:
+        return jsonify(error=f"At most {limit} employees per request."), 400
+    if not ssns:
+        return jsonify(employees=[], missing=[])
+    results = [await fetchall(sql, params)
+               for sql, params in prefetch_queries(ssns, session.get('role_id'), session.get('department_id'))]
+    return jsonify(prefetch_result(ssns, *results))
+
+
+@app.route('/employees/add', methods=['GET', 'POST'])
+@superadmin_or_admin_required
+async def add_employee():
+    role_id = session.get('role_id')
+    if request.method == 'POST':
+        form = await request.form
+        dno = form['dno']
+        if role_id == 2 and int(dno) != session.get('department_id'):
+            await flash("You can only add employees to your department.", "add_employee_2_error")
+            return redirect(url_for('view_employees'))
+        try:
+            await execute("""
+                INSERT INTO Employee (Fname, Minit, Lname, SSN, Address, Sex, Salary, Super_ssn, Dno)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (form['fname'], form.get('minit'), form['lname'], form['ssn'], form['address'], form.get('sex'),
+                  form['salary'], form.get('super_ssn'), dno))
+            invalidate_pages('employee')
+            await flash("Employee added successfully!", "add_employee_success")
+        except psycopg.IntegrityError:
+            await flash("Failed to add employee. Ensure the SSN and Department Number are valid and unique.",
+                        "add_employee_3_error")
+        return redirect(url_for('view_employees'))
+
+    all_dnumbers = await reference_list('department_numbers')
+    return await render_template('add_employee.html', all_dnumbers=all_dnumbers)
+
+
+@app.route('/employees/update/<ssn>', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def update_employee(ssn):
+    if request.method == 'POST':
+        form = await request.form
+        await execute("""
+            UPDATE Employee
+            SET Fname = %s, Minit = %s, Lname = %s, Address = %s, Sex = %s, Salary = %s, Super_ssn = %s, Dno = %s
+            WHERE SSN = %s
+        """, (form['fname'], form['minit'], form['lname'], form['address'], form['sex'], form['salary'],
+              form['super_ssn'], form['dno'], ssn))
+        invalidate_pages('employee')
+        await flash("Employee updated successfully!", "update_employee_success")
+        return redirect(url_for('view_employees'))
+
+    employee = await fetchone(f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM Employee WHERE SSN = %s", (ssn,))
+    if not employee:
+        await flash("Employee not found!", "update_employee_error")
+        return redirect(url_for('view_employees'))
+    all_dnumbers = await reference_list('department_numbers')
+    return await render_template('update_employee.html', employee=employee, all_dnumbers=all_dnumbers)
+
+
+@app.route('/employees/delete/<ssn>', methods=['POST'])
+@superadmin_or_admin_required
+async def delete_employee(ssn):
+    try:
+        await execute("DELETE FROM Employee WHERE SSN = %s", (ssn,))
+        invalidate_pages('employee')
+        await flash(f"Employee {ssn} deleted successfully!", "delete_employee_success")
+    except psycopg.Error:
+        await flash("Failed to delete employee. Please try again.", "delete_employee_error")
+    return redirect(url_for('view_employees'))
+
+
+# Bulk import
+async def run_import(kind, stream, fmt, role_id, department_id, batch_size):
+    """
+    Async counterpart of bulk_import.run_import(): same validation and report, multi-row
+    INSERTs of `batch_size` rows in one transaction.
+    """
+    started = time.perf_counter()
+    spec = IMPORT_SPECS[kind]
+    rows, errors, received = await asyncio.to_thread(
+        validate_records, spec, read_records(stream, fmt), role_id, department_id)
+
+    conn = await get_db_connection()
+    inserted = []
+    # One statement's parameters are capped at 65535
+    batch_size = min(batch_size, 65535 // len(spec["fields"]))
+    try:
+        async with conn.cursor() as cursor:
+            if kind == "works_on" and rows:
+                lookups = []
+                for sql, params in works_on_lookups(rows):
+                    await cursor.execute(sql, params)
+                    lookups.append(await cursor.fetchall())
+                rows, reference_errors = check_works_on(rows, *lookups, role_id, department_id)
+                errors += reference_errors
+
+            row_placeholder = "(" + ", ".join(["%s"] * len(spec["fields"])) + ")"
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                await cursor.execute(insert_sql(spec, ", ".join([row_placeholder] * len(batch))),
+                                     [value for _, values in batch for value in values])
+                inserted += await cursor.fetchall()
+        await commit(conn)
+    except psycopg.Error:
+        await conn.rollback()
+        raise
+
+    return import_report(kind, spec, rows, errors, received, {returned_key(row) for row in inserted}, started)
+
+
+@app.route('/import', methods=['GET', 'POST'])
+@superadmin_or_admin_required
+async def import_data():
+    if request.method == 'GET':
+        return await render_template('import.html', import_specs=IMPORT_SPECS, report=None)
+
+    json_response = wants_json()
+    form = await request.form
+    upload = (await request.files).get('file')
+    kind = form.get('kind')
+    fmt = import_format(upload, form.get('format'))
+    if kind not in IMPORT_SPECS or not upload or fmt not in IMPORT_FORMATS:
+        message = "Choose what to import and upload a .csv or .ndjson file."
+        if json_response:
+            return jsonify(error=message), 400
+        await flash(message, "import_error")
+        return redirect(url_for('import_data'))
+
+    try:
+        report = await run_import(kind, upload.stream, fmt, session.get('role_id'), session.get('department_id'),
+                                  app.config.get('IMPORT_BATCH_SIZE', 1000))
+    except psycopg.Error as e:
+        if json_response:
+            return jsonify(error=f"Import failed, nothing was loaded: {e}"), 500
+        await flash(f"Import failed, nothing was loaded: {e}", "import_error")
+        return redirect(url_for('import_data'))
+
+    if kind == 'employees' and report['inserted']:
+        invalidate_pages('employee')
+    if kind == 'projects' and report['inserted']:
+        invalidate_pages('project')
+    if kind == 'works_on' and report['inserted']:
+        invalidate_pages('works_on')
+    if json_response:
+        return jsonify(report)
+    return await render_template('import.html', import_specs=IMPORT_SPECS, report=report)
+
+
+# Projects
+@app.route('/projects')
+@read_only
+@login_required
+@page_cached('project')
+async def view_projects():
+    select_sql = "SELECT Pnumber, Pname, Plocation, Dnum FROM Project"
+    if session['department_id'] is not None:
+        page = await fetch_page(select_sql, [("Pnumber", "ASC")], [0], ["Dnum=%s"], [session['department_id']])
+    else:
+        page = await fetch_page(select_sql, [("Pnumber", "ASC")], [0])
+    return await render_template('view_projects.html', projects=page['rows'], page=page)
+
+
+@app.route('/projects/add', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def add_project():
+    if request.method == 'POST':
+        form = await request.form
+        dnum = form['dnum']
+        try:
+            if await execute(*project_insert(form['pname'], form['pnum'], form['plocation'], dnum,
+                                             session['department_id'])):
+                invalidate_pages('project', dnum)
+            else:
+                await flash("Failed to add project - the project is not in the correct department.",
+                            "update_project_error")
+        except psycopg.IntegrityError:
+            await flash("Failed to add project. Ensure the Project Number is unique and the Department Number is "
+                        "valid.", "update_project_error")
+        return redirect(url_for('view_projects'))
+
+    return await render_template('add_project.html')
+
+
+@app.route('/projects/update/<int:pnumber>', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def update_project(pnumber):
+    if request.method == 'POST':
+        form = await request.form
+        updated = await execute(*project_update(pnumber, form['pname'], form['plocation'], form['dnum'],
+                                                session['department_id']))
+        if updated and session['department_id'] is None:
+            invalidate_pages('project')
+        elif updated:
+            invalidate_pages('project', session['department_id'], form['dnum'])
+        elif session['department_id'] is not None:
+            await flash("Failed to update project - the project is not in the correct department.", "update_project_error")
+        return redirect(url_for('view_projects'))
+
+    project = await fetchone("SELECT Pnumber, Pname, Plocation, Dnum FROM Project WHERE Pnumber = %s", (pnumber,))
+    return await render_template('update_project.html', project=project)
+
+
+@app.route('/projects/delete/<int:pnumber>', methods=('POST',))
+@superadmin_or_admin_required
+async def delete_project(pnumber):
+    deleted = await execute(*project_delete(pnumber, session['department_id']))
+    if deleted and session['department_id'] is None:
+        invalidate_pages('project')
+    elif deleted:
+        invalidate_pages('project', session['department_id'])
+    elif session['department_id'] is not None:
+        await flash("Failed to delete project - the project is not in the correct department.", "delete_project_error")
+    return redirect(url_for('view_projects'))
+
+
+# Works On
+@app.route('/worksOn')
+@read_only
+@login_required
+async def view_worksOn():
+    details = request.args.get('details') == '1' or wants_json()
+    select_sql, where, params = works_on_scope(session['department_id'], details)
+    page = await fetch_page(select_sql, [("Essn", "ASC"), ("Pno", "ASC")], [0, 1], where, params)
+    if wants_json():
+        return jsonify(listing_json(WORKS_ON_DETAIL_COLUMNS, page))
+    return await render_template('view_worksOn.html', worksOn=page['rows'], page=page, details=details)
+
+
+@app.route('/worksOn/export')
+@read_only
+@login_required
+async def export_worksOn():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"Unsupported format: {fmt}"), 400
+    sql, where, params = works_on_scope(session['department_id'])
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return await export_response(sql, params, ["Essn", "Pno", "Hours"], fmt, "works_on")
+
+
+@app.route('/worksOn/add', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def add_worksOn():
+    if request.method == 'POST':
+        form = await request.form
+        try:
+            if await execute(*works_on_insert(form['essn'], form['pnum'], form['Hours'], session['department_id'])):
+                invalidate_pages('works_on')
+            else:
+                await flash("You can only assign work to employees within your own department.")
+        except psycopg.IntegrityError:
+            await flash("Failed to add work. Ensure the Employee SSN and Project Number are valid and not already "
+                        "assigned.")
+        return redirect(url_for('view_worksOn'))
+    return await render_template('add_worksOn.html')
+
+
+@app.route('/worksOn/batch', methods=['POST'])
+@superadmin_or_admin_required
+async def update_worksOn_batch():
+    json_response = request.is_json
+    back = url_for('view_worksOn', **request.args)
+
+    async def reject(message, status, errors=()):
+        if json_response:
+            return jsonify(error=message, errors=list(errors)), status
+        await flash(message, "update_worksOn_error")
+        return redirect(back)
+
+    items = json_changes(await request.get_json(silent=True)) if json_response else grid_items(await request.form)
+    if items is None:
+        return await reject('Expected a JSON object with a "changes" list.', 400)
+    changes, errors = hours_changes(items)
+    limit = app.config.get('WORKS_ON_BATCH_LIMIT', 1000)
+    if errors:
+        return await reject("Invalid changes, nothing was updated.", 400, errors)
+    if not changes:
+        return await reject("No changes to save.", 400)
+    if len(changes) > limit:
+        return await reject(f"At most {limit} assignments can be changed at once.", 400)
+
+    conn = await get_db_connection()
+    try:
+        async with conn.cursor() as cursor:
+            department_id = session['department_id']
+            if department_id is not None:
+                pnos = sorted({pno for _, pno in changes})
+                await cursor.execute("SELECT Pnumber FROM Project WHERE Pnumber = ANY(%s) AND Dnum = %s",
+                                     (pnos, department_id))
+                forbidden = sorted(set(pnos) - {row[0] for row in await cursor.fetchall()})
+                if forbidden:
+                    await conn.rollback()
+                    return await reject(
+                        f"You can only update work on projects within your department (not {forbidden}).", 403)
+
+            await cursor.execute(*hours_batch_update(changes))
+            updated = {(essn.rstrip(), pno) for essn, pno in await cursor.fetchall()}
+        await commit(conn)
+        invalidate_pages('works_on')
+    except psycopg.Error as e:
+        await conn.rollback()
+        return await reject(f"Failed to update hours, nothing was changed: {e}", 500)
+
+    missing = [{"essn": essn, "pno": pno} for essn, pno in changes if (essn, pno) not in updated]
+    if json_response:
+        return jsonify(updated=len(updated), missing=missing)
+    await flash(f"Updated hours for {len(updated)} assignment(s).", "update_worksOn_success")
+    if missing:
+        await flash(f"{len(missing)} assignment(s) no longer exist and were skipped.", "update_worksOn_error")
+    return redirect(back)
+
+
+@app.route('/worksOn/update/<string:ssn>/<int:pnumber>', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def update_worksOn(ssn, pnumber):
+    if request.method == 'POST':
+        form = await request.form
+        if await execute(*works_on_update(ssn, pnumber, form['Hours'], session['department_id'])):
+            invalidate_pages('works_on')
+        elif session['department_id'] is not None:
+            await flash("You can only update work to projects within your department.")
+        return redirect(url_for('view_worksOn'))
+    worksOn = await fetchone("SELECT Essn, Pno, Hours FROM Works_On WHERE Essn = %s and Pno = %s", (ssn, pnumber))
+    return await render_template('update_worksOn.html', worksOn=worksOn)
+
+
+@app.route('/worksOn/delete/<string:ssn>/<int:pnumber>', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def delete_worksOn(ssn, pnumber):
+    if await execute(*works_on_delete(ssn, pnumber, session['department_id'])):
+        invalidate_pages('works_on')
+    elif session['department_id'] is not None:
+        await flash("Failed to delete works on - incorrect department")
+    return redirect(url_for('view_worksOn'))
+
+
+# Dependents
+@app.route('/dependents')
+@read_only
+@login_required
+async def view_dependents():
+    details = request.args.get('details') == '1' or wants_json()
+    select_sql, where, params = dependent_scope(session['department_id'], details)
+    page = await fetch_page(select_sql, [("d.Essn", "ASC"), ("d.Dependent_name", "ASC")], [0, 1], where, params)
+    if wants_json():
+        return jsonify(listing_json(DEPENDENT_DETAIL_COLUMNS, page))
+    return await render_template('view_dependents.html', dependents=page['rows'], page=page, details=details)
+
+
+@app.route('/dependents/add', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def add_dependent():
+    if request.method == 'POST':
+        form = await request.form
+        try:
+            if await execute(*dependent_insert(form['SSN'], form['Dependent_Name'], form['Sex'], form['Birthday'],
+                                               form['Relationship'], session['department_id'])):
+                invalidate_pages('dependent')
+            else:
+                await flash("You can only add dependents for your own department.")
+        except psycopg.IntegrityError:
+            await flash("Failed to add dependent. Ensure the Employee SSN is valid and the dependent is not already "
+                        "recorded.")
+        return redirect(url_for('view_dependents'))
+    return await render_template('add_dependent.html')
+
+
+@app.route('/dependents/update/<string:ssn>/<string:depName>', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def update_dependents(ssn, depName):
+    if request.method == 'POST':
+        form = await request.form
+        if await execute(*dependent_update(ssn, depName, form['Sex'], form['Birthday'], form['Relationship'],
+                                           session['department_id'])):
+            invalidate_pages('dependent')
+        return redirect(url_for('view_dependents'))
+    dependent = await fetchone(*dependent_select(ssn, depName, session['department_id']))
+    # Outside an admin's department there is no row
+    if dependent is None and session['department_id'] is not None:
+        return redirect(url_for('view_dependents'))
+    return await render_template('update_dependents.html', dependent=dependent)
+
+
+@app.route('/dependents/delete/<string:ssn>/<string:depName>', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def delete_dependents(ssn, depName):
+    if await execute(*dependent_delete(ssn, depName, session['department_id'])):
+        invalidate_pages('dependent')
+    elif session['department_id'] is not None:
+        await flash("Failed to delete works on - incorrect department")
+    return redirect(url_for('view_dependents'))
+
+
+# department location views
+@app.route('/locations')
+@read_only
+@login_required
+@page_cached('dept_location')
+async def view_locations():
+    select_sql = "SELECT Dnumber, Dlocation FROM Dept_location"
+    key_columns = [("Dnumber", "ASC"), ("Dlocation", "ASC")]
+    if session['department_id'] is not None:
+        page = await fetch_page(select_sql, key_columns, [0, 1], ["Dnumber = %s"], [session['department_id']])
+    else:
+        page = await fetch_page(select_sql, key_columns, [0, 1])
+    return await render_template('view_locations.html', locations=page['rows'], page=page)
+
+
+@app.route('/locations/add', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def add_location():
+    if request.method == 'POST':
+        form = await request.form
+        dnumber = form['dnumber']
+        try:
+            if await execute(*location_insert(dnumber, form['dlocation'], session['department_id'])):
+                invalidate_pages('dept_location', dnumber)
+            else:
+                await flash("Failed to insert - the department location is not in the correct department.",
+                            "add_location_error")
+        except psycopg.IntegrityError:
+            await flash("Failed to add location. Ensure the Department Number is valid and the location is not "
+                        "already recorded.", "add_location_error")
+        return redirect(url_for('view_locations'))
+    return await render_template('add_location.html')
+
+
+@app.route('/location/update/<int:dnumber>/<dlocation>', methods=('GET', 'POST'))
+@superadmin_or_admin_required
+async def update_location(dnumber, dlocation):
+    if request.method == 'POST':
+        form = await request.form
+        if await execute(*location_update(dnumber, dlocation, form['dnumber'], form['dlocation'],
+                                          session['department_id'])):
+            invalidate_pages('dept_location', dnumber, form['dnumber'])
+        elif session['department_id'] is not None:
+            await flash("Failed to update - the department location is not in the correct department.",
+                        "update_location_error")
+        return redirect(url_for('view_locations'))
+
+    location = await fetchone("SELECT Dnumber, Dlocation FROM Dept_location WHERE Dnumber = %s AND Dlocation = %s",
+                              (dnumber, dlocation))
+    return await render_template('update_location.html', dept_location=location)
+
+
+@app.route('/locations/delete/<int:dnumber>/<dlocation>', methods=('POST',))
+@superadmin_or_admin_required
+async def delete_location(dnumber, dlocation):
+    if await execute(*location_delete(dnumber, dlocation, session['department_id'])):
+        invalidate_pages('dept_location', dnumber)
+    elif session['department_id'] is not None:
+        await flash("Failed to delete - the department location is not in the correct department.",
+                    "delete_location_error")
+    return redirect(url_for('view_locations'))
+
+
+# JSON API (api.py)
+def api_login_required(f):
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if 'user_id' not in session or await current_role() is None:
+            return jsonify(error="Authentication required; log in at /login first."), 401
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+
+def compressed(f):
+    """
+    Async counterpart of app.compressed.
+    """
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        response = await make_response(await f(*args, **kwargs))
+        response.vary.add('Accept-Encoding')
+        config = app.config.get('API_CONFIG', {})
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if encoding and compressible(response.status_code, response.headers, response.content_length, config):
+            response.set_data(compress_body(await response.get_data(), encoding, config))
+            response.headers['Content-Encoding'] = encoding
+            if response.headers.get('ETag', '').startswith('"'):
+                response.headers['ETag'] = 'W/' + response.headers['ETag']
+        return response
+
+    return decorated_function
+
+
+def api_listing(entity):
+    async def view():
+        try:
+            fields = api_fields(entity, request.args.get('fields'))
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
+        query = api_listing_query(entity, fields, session.get('role_id'), session.get('department_id'))
+        if query is None:
+            return jsonify(error=f"Access denied. You do not have permission to view {entity}."), 403
+        page = await fetch_page(*query, prepare=not request.args.get('fields'))
+        return jsonify(listing_json(fields, page))
+
+    view.__name__ = f"api_{entity}"
+    return view
+
+
+for _entity, _spec in API_ENTITIES.items():
+    app.add_url_rule(f'/api/v1/{_entity}', f'api_{_entity}',
+                     read_only(compressed(api_login_required(page_cached(*_spec['tables'], flashes=False)(api_listing(_entity))))))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # The workers add up their /metrics through snapshot files, starting from zero each run
+    os.environ.setdefault('METRICS_MULTIPROC_DIR', app.config.get('METRICS_CONFIG', {}).get('multiprocess_dir')
+                          or os.path.join(tempfile.gettempdir(), 'company_db_metrics'))
+    clear_snapshots(os.environ['METRICS_MULTIPROC_DIR'])
+    uvicorn.run("asgi_app:app", **app.config.get('ASGI_SERVER_CONFIG', {}))
@@ -0,0 +1,67 @@
+"""
+Bulk import throughput versus one add_employee form POST per row.
+
+Generates employees for a scratch department, loads them once through /import (CSV) and
+a sample of them through /employees/add, and reports rows per second for both. The
+scratch rows are deleted afterwards. Needs the database from config.py.
+
+    python benchmarks/bench_import.py [--rows 20000] [--form-rows 200] [--department 9999]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import psycopg2  # noqa: E402
+
+from app import app  # noqa: E402
+
+
+def employee(i, department):
+    return {"fname": f"B{i}", "minit": "B", "lname": f"Imp{department}", "ssn": f"B{i:08d}",
+            "address": "1 Bench Road", "sex": "F", "salary": "50000", "super_ssn": "888665555",
+            "dno": str(department)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--form-rows', type=int, default=200)
+    parser.add_argument('--department', type=int, default=9999)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'superadmin', 'password': 'superkey'})
+    conn = psycopg2.connect(**app.config['DATABASE_CONFIG'])
+    cursor = conn.cursor()
+
+    try:
+        columns = ["fname", "minit", "lname", "ssn", "address", "sex", "salary", "super_ssn", "dno"]
+        lines = [",".join(columns)]
+        lines += [",".join(employee(i, args.department)[c] for c in columns) for i in range(args.rows)]
+        body = ("\n".join(lines) + "\n").encode()
+
+        start = time.perf_counter()
+        report = client.post('/import', data={'kind': 'employees', 'file': (io.BytesIO(body), 'employees.csv')},
+                             headers={'Accept': 'application/json'}).get_json()
+        bulk_seconds = time.perf_counter() - start
+        print(f"bulk import: {report['inserted']} of {args.rows} rows in {bulk_seconds:.2f}s "
+              f"({report['inserted'] / bulk_seconds:,.0f} rows/s), {report['rejected']} rejected")
+
+        start = time.perf_counter()
+        for i in range(args.rows, args.rows + args.form_rows):
+            client.post('/employees/add', data=employee(i, args.department))
+        form_seconds = time.perf_counter() - start
+        print(f"form posts:  {args.form_rows} rows in {form_seconds:.2f}s "
+              f"({args.form_rows / form_seconds:,.0f} rows/s)")
+    finally:
+        cursor.execute("DELETE FROM Employee WHERE Dno = %s AND Ssn LIKE 'B%%'", (args.department,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Parse and planning time the prepared hot statements save, per route.
+
+For each route's hot statement (the role lookup every protected request runs, the login
+query and the department admin's listing pages) it prints the planning time Postgres
+reports for it (EXPLAIN SUMMARY) and the time per execution sent as text and through
+prepared.execute_prepared(), on one connection, and what the difference adds up to at
+--rate requests per second. It then lists the plan-cache counts Postgres keeps for the
+prepared statements (generic vs custom plans) and the registry's hit rate. Needs the
+database from config.py, initialised with init_db.sql.
+
+    python benchmarks/bench_prepared.py [--iterations 2000] [--rate 1000]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app  # noqa: E402
+from pagination import keyset_query  # noqa: E402
+from prepared import execute_prepared, prepared_stats, statements_for  # noqa: E402
+from queries import dependent_scope, employee_listing_query, employee_scope, employee_sort, works_on_scope  # noqa: E402
+from roles import LOGIN_SQL, ROLE_SQL  # noqa: E402
+
+PLANNING = re.compile(r'Planning Time: ([\d.]+) ms')
+
+# The department admin's view, as for admin/adminkey
+DEPARTMENT = 5
+
+
+def listing(select_sql, key_columns, where=(), params=()):
+    return keyset_query(select_sql, key_columns, where, params, limit=app.config.get('PAGE_SIZE', 50))
+
+
+def route_statements(user_id):
+    works_on_sql, works_on_where, works_on_params = works_on_scope(DEPARTMENT)
+    dependent_sql, dependent_where, dependent_params = dependent_scope(DEPARTMENT)
+    employee_sql, employee_where, employee_params = employee_listing_query(employee_scope(2, DEPARTMENT), {})
+    return [
+        ("every request (role)", ROLE_SQL, (user_id,)),
+        ("/login", LOGIN_SQL, ('admin',)),
+        ("/view_departments", *listing("SELECT Dnumber, Dname, Mgr_ssn FROM Department", [("Dnumber", "ASC")],
+                                       ["Dnumber = %s"], [DEPARTMENT])),
+        ("/view_employees", *listing(employee_sql, employee_sort(None)[0], employee_where, employee_params)),
+        ("/projects", *listing("SELECT Pnumber, Pname, Plocation, Dnum FROM Project", [("Pnumber", "ASC")],
+                               ["Dnum=%s"], [DEPARTMENT])),
+        ("/worksOn", *listing(works_on_sql, [("Essn", "ASC"), ("Pno", "ASC")], works_on_where, works_on_params)),
+        ("/dependents", *listing(dependent_sql, [("d.Essn", "ASC"), ("d.Dependent_name", "ASC")], dependent_where,
+                                 dependent_params)),
+        ("/locations", *listing("SELECT Dnumber, Dlocation FROM Dept_location", [("Dnumber", "ASC"), ("Dlocation", "ASC")],
+                                ["Dnumber = %s"], [DEPARTMENT])),
+    ]
+
+
+def planning_ms(cursor, sql, params):
+    cursor.execute("EXPLAIN (SUMMARY) " + sql, params)
+    plan = '\n'.join(row[0] for row in cursor.fetchall())
+    return float(PLANNING.search(plan).group(1))
+
+
+def per_execution_us(cursor, execute, sql, params, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        execute(cursor, sql, params)
+        cursor.fetchall()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=1000.0, help="requests per second to scale the savings to")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**app.config['DATABASE_CONFIG'])
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM Users WHERE username = 'admin'")
+    user_id = cursor.fetchone()[0]
+
+    print(f"{'route':24} {'planning':>10} {'as text':>10} {'prepared':>10} {'saved':>9} {'at ' + str(int(args.rate)) + '/s':>14}")
+    for route, sql, params in route_statements(user_id):
+        plan = planning_ms(cursor, sql, params)
+        text = per_execution_us(cursor, lambda c, s, p: c.execute(s, p), sql, params, args.iterations)
+        prepared = per_execution_us(cursor, execute_prepared, sql, params, args.iterations)
+        saved = text - prepared
+        print(f"{route:24} {plan * 1000:8.0f}us {text:8.0f}us {prepared:8.0f}us {saved:7.0f}us "
+              f"{saved * args.rate / 1000:9.1f} ms/s")
+
+    # Postgres' own counts: executions that reused the cached generic plan vs planned afresh
+    cursor.execute("SELECT generic_plans, custom_plans FROM pg_prepared_statements")
+    generic, custom = (sum(column) for column in zip(*cursor.fetchall()))
+    lookups = prepared_stats["hits"] + prepared_stats["misses"]
+    print(f"\n{len(statements_for(conn))} statements prepared; generic plans {generic}, custom plans {custom} "
+          f"({generic / max(generic + custom, 1):.1%} from the plan cache); registry hit rate "
+          f"{prepared_stats['hits'] / max(lookups, 1):.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Queries and latency spent on authorization per protected request.
+
+Compares the role decorators answering from the server-side session (the normal hot path)
+against re-reading the role from Users on every request, which is what the old
+per-request `SELECT role_id FROM Users` lookup cost, and times loading a session from the
+store. Needs the database from config.py, initialised with init_db.sql.
+
+    python benchmarks/bench_role_resolution.py [requests]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app  # noqa: E402
+from roles import ROLE_CHECKED  # noqa: E402
+from sessions import load_session  # noqa: E402
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def run(client, path, n, cold):
+    query_count = 0
+    latencies = []
+    for _ in range(n):
+        if cold:
+            with client.session_transaction() as sess:
+                sess[ROLE_CHECKED] = 0
+        start = time.perf_counter()
+        response = client.get(path)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        # Statements the request ran, from the Server-Timing header (instrumentation.py)
+        query_count += int(QUERIES.search(response.headers['Server-Timing']).group(1))
+    latencies.sort()
+    return {
+        "queries_per_request": query_count / n,
+        "p50_ms": latencies[n // 2] * 1000,
+        "p95_ms": latencies[int(n * 0.95)] * 1000,
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'adminkey'})
+
+    # /projects/add renders a form behind superadmin_or_admin_required and runs no query itself
+    path = '/projects/add'
+    for label, cold in (("per-request lookup (stale session)", True), ("role from the session", False)):
+        result = run(client, path, n, cold)
+        print(f"{label:34} {result['queries_per_request']:.2f} queries/request  "
+              f"p50 {result['p50_ms']:.3f} ms  p95 {result['p95_ms']:.3f} ms")
+
+    sid = client.get_cookie(app.config['SESSION_COOKIE_NAME']).value
+    start = time.perf_counter()
+    for _ in range(n):
+        load_session(sid)
+    print(f"{'session load':34} {(time.perf_counter() - start) / n * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Fail if any view_* listing or the employee search plans a full scan of a large table.
+
+Seeds a large synthetic data set inside one transaction, runs each listing route for a
+superadmin and for a department admin on that transaction's connection, and EXPLAINs
+every statement the route executed. The transaction is rolled back at the end, so the
+database is left unchanged. Run after `python migrate.py`:
+
+    python benchmarks/check_query_plans.py [--departments 100] [--employees 100000]
+
+Exits 1 if a route plans, on a table holding at least --min-rows rows, a Seq Scan or an
+index scan that only filters (walks the whole index in key order, with no Index Cond).
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import psycopg2  # noqa: E402
+from flask import g, session  # noqa: E402
+
+from app import app  # noqa: E402
+from db import PooledConnection  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+from seed import seed  # noqa: E402
+
+LISTING_ROUTES = ['/view_employees', '/projects', '/worksOn', '/dependents', '/locations', '/view_departments']
+
+
+class CapturingCursor:
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, sql, params=None):
+        self._statements.append(self._cursor.mogrify(sql, params).decode())
+        return self._cursor.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CapturingConnection(PooledConnection):
+    """
+    Hands the route the seeding transaction's connection and records what it executes.
+    A route's own commit/rollback only acts on a savepoint, so the seed survives.
+    """
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.statements = []
+
+    def cursor(self, *args, **kwargs):
+        return CapturingCursor(self.raw.cursor(*args, **kwargs), self.statements)
+
+    def commit(self):
+        self.raw.cursor().execute("RELEASE SAVEPOINT route; SAVEPOINT route")
+
+    def rollback(self):
+        self.raw.cursor().execute("ROLLBACK TO SAVEPOINT route")
+
+
+def run_route(conn, path, user):
+    capture = CapturingConnection(conn)
+    conn.cursor().execute("SAVEPOINT route")
+    with app.test_request_context(path):
+        session.update(user)
+        g.db_conn = capture
+        try:
+            endpoint, view_args = app.url_map.bind('localhost').match(path.split('?')[0])
+            app.view_functions[endpoint](**view_args)
+        finally:
+            # Not a pooled connection: keep the teardown hook from returning it to the pool
+            g.pop('db_conn', None)
+    conn.cursor().execute("RELEASE SAVEPOINT route")
+    return capture.statements
+
+
+def full_scans(plan):
+    node = plan.get('Node Type')
+    if node == 'Seq Scan':
+        yield plan['Relation Name']
+    elif node in ('Index Scan', 'Index Only Scan') and 'Filter' in plan and 'Index Cond' not in plan:
+        yield plan['Relation Name']
+    for child in plan.get('Plans', []):
+        yield from full_scans(child)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--departments', type=int, default=100)
+    parser.add_argument('--employees', type=int, default=100000)
+    parser.add_argument('--min-rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**app.config['DATABASE_CONFIG'])
+    cursor = conn.cursor()
+    print(f"Seeding {args.departments} departments / {args.employees} employees (rolled back afterwards)...")
+    seed(cursor, args.departments, args.employees)
+
+    cursor.execute("SELECT lower(relname) FROM pg_class WHERE relkind = 'r' AND reltuples >= %s", (args.min_rows,))
+    large_tables = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT id FROM Users WHERE role_id = 1 ORDER BY id LIMIT 1")
+    superadmin_id = cursor.fetchone()[0]
+    cursor.execute("SELECT id, department_id FROM Users WHERE username = 'bench_admin_1'")
+    admin_id, department_id = cursor.fetchone()
+
+    superadmin = {"user_id": superadmin_id, "role_id": 1, "department_id": None}
+    admin = {"user_id": admin_id, "role_id": 2, "department_id": department_id}
+    middle = encode_cursor(['X' + str(args.employees // 2).zfill(8)])
+    cases = [(path, "superadmin", superadmin) for path in LISTING_ROUTES + ['/view_users']]
+    cases += [(path, "dept admin", admin) for path in LISTING_ROUTES]
+    cases += [(f'/view_employees?after={middle}', "dept admin", admin),
+              (f'/view_employees?before={middle}', "superadmin", superadmin),
+              ('/employees/search?q=X0005', "superadmin", superadmin),
+              ('/employees/search?q=l12', "dept admin", admin),
+              ('/view_employees?sort=-salary', "superadmin", superadmin),
+              ('/view_employees?sort=-salary', "dept admin", admin),
+              ('/view_employees?sort=lname&salary_min=50000', "dept admin", admin),
+              ('/view_employees?q=l50012', "superadmin", superadmin),
+              ('/view_employees?q=l12&sex=F', "dept admin", admin),
+              ('/view_employees?super_ssn=X00000001', "superadmin", superadmin),
+              ('/worksOn?details=1', "superadmin", superadmin),
+              ('/worksOn?details=1', "dept admin", admin),
+              ('/dependents?details=1', "superadmin", superadmin),
+              ('/dependents?details=1', "dept admin", admin),
+              ('/employees/prefetch?ssn=X00000001,X00000101,X00050000', "superadmin", superadmin),
+              ('/employees/prefetch?ssn=X00000001,X00000101,X00050000', "dept admin", admin)]
+
+    failures = 0
+    for path, who, user in cases:
+        for sql in run_route(conn, path, user):
+            if not sql.lstrip(' \n(').upper().startswith(('SELECT', 'WITH')):
+                continue
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+            plan = cursor.fetchone()[0][0]['Plan']
+            scanned = sorted({t for t in full_scans(plan) if t.lower() in large_tables})
+            status = "FAIL" if scanned else "ok  "
+            failures += bool(scanned)
+            detail = f" full scan of {', '.join(scanned)}" if scanned else ""
+            print(f"{status} {who:10} {path:40} {' '.join(sql.split())[:70]}{detail}")
+            if scanned:
+                print(json.dumps(plan, indent=2))
+
+    conn.rollback()
+    conn.close()
+    print(f"{failures} statement(s) with full scans of tables of {args.min_rows}+ rows")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Load-test comparison between running servers, e.g. the Flask app and the async ASGI app.
+
+Each simulated user logs in, then requests a mix of view_* pages back to back for a fixed
+time. Start the servers first, for example
+
+    python app.py                       # Flask, http://127.0.0.1:5000
+    python asgi_app.py                  # Quart under uvicorn, http://127.0.0.1:8000
+
+then run
+
+    python benchmarks/load_compare.py http://127.0.0.1:5000 http://127.0.0.1:8000 --users 50 --seconds 20
+
+Reports requests/sec and p50/p95/p99 latency per server.
+"""
+import argparse
+import http.cookiejar
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+DEFAULT_PATHS = ['/view_employees', '/projects', '/worksOn', '/dependents', '/locations', '/view_departments']
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def user_session(base_url, username, password, paths, deadline, latencies, errors):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    login = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    opener.open(base_url + '/login', data=login).read()
+
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            opener.open(base_url + path).read()
+            latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, ConnectionError):
+            errors.append(path)
+
+
+def run(base_url, args):
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.seconds
+    threads = [threading.Thread(target=user_session,
+                                args=(base_url, args.username, args.password, args.paths, deadline, latencies, errors))
+               for _ in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / args.seconds,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('urls', nargs='+', help="base URLs of the servers to compare")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='adminkey')
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    args = parser.parse_args()
+
+    print(f"{args.users} concurrent users, {args.seconds:.0f}s per server, as {args.username}")
+    print(f"{'server':32} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for url in args.urls:
+        r = run(url.rstrip('/'), args)
+        print(f"{url:32} {r['rps']:8.1f} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['errors']:7}")
+
+
+if __name__ == '__main__':
+    main()
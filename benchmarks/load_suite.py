@@ -0,0 +1,238 @@
+"""
+Load-test suite: a scripted mix of logins, listings and CRUD posts per role, on synthetic data.
+
+Seeds the data set from seed.py (committed, removed again at the end), then runs
+--sessions simulated users per role concurrently through the Flask test client against
+the database in config.py. Each user logs in and repeats its role's script --iterations
+times. Reports requests/sec and p50/p95/p99 latency per route and saves them as JSON, so
+two commits can be compared:
+
+    python benchmarks/load_suite.py --departments 100 --employees 100000 --output before.json
+    git checkout <other commit>
+    python benchmarks/load_suite.py --departments 100 --employees 100000 --compare before.json
+
+With a data set kept from `python benchmarks/seed.py ...`, pass --reuse to skip seeding.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import psycopg2  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import app  # noqa: E402
+from instrumentation import configure_logging  # noqa: E402
+from seed import PROJECTS_PER_DEPARTMENT, is_seeded, seed, unseed  # noqa: E402
+
+LISTINGS = ['/view_employees', '/projects', '/worksOn', '/dependents', '/locations', '/view_departments']
+
+
+def bench_ssn(n):
+    return 'X' + str(n).zfill(8)
+
+
+def project_of(employee, departments):
+    """
+    One of the two seeded projects employee `employee` works on (see seed.SEED_SQL).
+    """
+    return 100000 + ((employee - 1) % departments) * PROJECTS_PER_DEPARTMENT + employee % PROJECTS_PER_DEPARTMENT + 1
+
+
+def employee_crud(user, n):
+    """
+    Add, edit and delete an employee of the user's own department: (method, path, form) steps.
+    """
+    ssn = 'Y' + str(n).zfill(8)
+    form = {'fname': f'BF{n}', 'minit': 'B', 'lname': f'BL{n}', 'ssn': ssn, 'address': 'Bench St',
+            'sex': 'F', 'salary': '50000', 'super_ssn': bench_ssn(user['department']), 'dno': str(1000 + user['department'])}
+    return [
+        ('GET', '/employees/add', None),
+        ('POST', '/employees/add', form),
+        ('GET', f'/employees/update/{ssn}', None),
+        ('POST', f'/employees/update/{ssn}', {**form, 'salary': '51000'}),
+        ('POST', f'/employees/delete/{ssn}', None),
+    ]
+
+
+def update_hours(user, n):
+    employee = user['department']
+    return [('POST', f'/worksOn/update/{bench_ssn(employee)}/{project_of(employee, user["departments"])}',
+             {'Hours': str(5 + n % 30)})]
+
+
+def search(user, n):
+    return [('GET', f'/employees/search?q=L{user["department"]}{n % 10}', None)]
+
+
+def listings(user, n):
+    return [('GET', path, None) for path in LISTINGS]
+
+
+# What one iteration of each role does
+SCRIPTS = {
+    "superadmin": [listings, lambda user, n: [('GET', '/view_users', None)], search, update_hours],
+    "admin": [listings, search, employee_crud, update_hours],
+    "user": [listings, search],
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def endpoint(method, path):
+    try:
+        return app.url_map.bind('localhost').match(path.split('?')[0], method)[0]
+    except Exception:
+        return path
+
+
+def user_session(role, user, args, counter, results, lock):
+    client = app.test_client()
+    samples = []
+
+    def request(method, path, form=None):
+        start = time.perf_counter()
+        try:
+            response = client.open(path, method=method, data=form)
+            error = response.status_code >= 400
+        except Exception:
+            error = True
+        samples.append((f'{method} {endpoint(method, path)}', time.perf_counter() - start, error))
+
+    request('POST', '/login', {'username': user['username'], 'password': args.password})
+    for _ in range(args.iterations):
+        for step in SCRIPTS[role]:
+            with lock:
+                n = next(counter)
+            for method, path, form in step(user, n):
+                request(method, path, form)
+
+    with lock:
+        for route, seconds, error in samples:
+            results.setdefault((role, route), []).append((seconds, error))
+
+
+def run(args):
+    departments = args.departments
+    users = {
+        "superadmin": [{"username": "bench_superadmin", "department": 1, "departments": departments}],
+        "admin": [{"username": f"bench_admin_{d}", "department": d, "departments": departments}
+                  for d in range(1, departments + 1)],
+        "user": [{"username": f"bench_user_{d}", "department": d, "departments": departments}
+                 for d in range(1, departments + 1)],
+    }
+    rng = random.Random(args.random_seed)
+    counter, results, lock = iter(range(1, 10 ** 8)), {}, threading.Lock()
+    threads = [threading.Thread(target=user_session, args=(role, rng.choice(users[role]), args, counter, results, lock))
+               for role in SCRIPTS for _ in range(args.sessions)]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for (role, route), samples in sorted(results.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        routes[f'{role} {route}'] = {
+            "requests": len(samples),
+            "errors": sum(error for _, error in samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "total": {"requests": total, "errors": sum(r["errors"] for r in routes.values()),
+                  "seconds": round(elapsed, 2), "rps": round(total / elapsed, 1)},
+        "routes": routes,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(report, baseline=None):
+    base_routes = baseline["routes"] if baseline else {}
+    print(f"{'role / route':48} {'reqs':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}"
+          + (f" {'p95 vs base':>12}" if baseline else ""))
+    for name, r in report["routes"].items():
+        line = (f"{name:48} {r['requests']:6} {r['rps']:8.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+                f"{r['p99_ms']:8.2f} {r['errors']:6}")
+        if name in base_routes and base_routes[name]["p95_ms"]:
+            line += f" {(r['p95_ms'] / base_routes[name]['p95_ms'] - 1) * 100:+11.0f}%"
+        print(line)
+    t = report["total"]
+    print(f"{t['requests']} requests in {t['seconds']}s: {t['rps']} req/s, {t['errors']} errors"
+          + (f" (baseline {baseline['commit']}: {baseline['total']['rps']} req/s)" if baseline else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--departments', type=int, default=100)
+    parser.add_argument('--employees', type=int, default=100000)
+    parser.add_argument('--sessions', type=int, default=2, help="concurrent users per role")
+    parser.add_argument('--iterations', type=int, default=20, help="script repetitions per user")
+    parser.add_argument('--password', default='bench', help="password of the seeded bench_* users")
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--reuse', action='store_true', help="use the data set seeded by seed.py, and keep it")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="results JSON of an earlier run to compare p95 latency with")
+    args = parser.parse_args()
+    # One log line per request would drown the report; slow queries are still logged
+    configure_logging(log_requests=False)
+
+    conn = psycopg2.connect(**app.config['DATABASE_CONFIG'])
+    with conn, conn.cursor() as cursor:
+        if args.reuse and not is_seeded(cursor):
+            sys.exit("No seeded data set: run benchmarks/seed.py first, or drop --reuse")
+        if not args.reuse:
+            print(f"Seeding {args.departments} departments / {args.employees} employees...")
+            unseed(cursor)
+            seed(cursor, args.departments, args.employees, generate_password_hash(args.password))
+
+    try:
+        report = {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec='seconds'),
+            "config": {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'password')},
+            **run(args),
+        }
+    finally:
+        if not args.reuse:
+            with conn, conn.cursor() as cursor:
+                unseed(cursor)
+        conn.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Concurrent department users on view_locations: isolation and throughput.
+
+Creates one temporary normal user per department, then runs N threads that each log in as
+one of them and request /locations for a fixed time. Every response is checked to contain
+exactly that department's locations and nothing from another department. The temporary
+users are removed afterwards. Needs the database from config.py.
+
+    python benchmarks/locations_concurrency.py [--threads 16] [--seconds 5]
+
+Exits 1 if any response leaked or missed rows.
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import psycopg2  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import app  # noqa: E402
+
+PASSWORD = 'concurrency'
+ROW_PATTERN = re.compile(r'<tr>\s*<td>(.*?)</td>\s*<td>(\d+)</td>', re.S)
+
+
+def worker(username, dnumber, expected, deadline, results):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    requests = errors = 0
+    while time.monotonic() < deadline:
+        body = client.get('/locations?limit=500').get_data(as_text=True)
+        rows = {(int(dnum), location) for location, dnum in ROW_PATTERN.findall(body)}
+        requests += 1
+        if rows != expected:
+            errors += 1
+            print(f"department {dnumber}: expected {sorted(expected)}, got {sorted(rows)}")
+    results.append((requests, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**app.config['DATABASE_CONFIG'])
+    cursor = conn.cursor()
+    cursor.execute("SELECT Dnumber, Dlocation FROM Dept_location")
+    locations = {}
+    for dnumber, location in cursor.fetchall():
+        locations.setdefault(dnumber, set()).add((dnumber, location))
+    departments = sorted(locations)
+
+    password_hash = generate_password_hash(PASSWORD)
+    for dnumber in departments:
+        cursor.execute("INSERT INTO Users (username, password_hash, role_id, department_id) VALUES (%s, %s, 3, %s)",
+                       (f'concurrency_{dnumber}', password_hash, dnumber))
+    conn.commit()
+
+    try:
+        results = []
+        deadline = time.monotonic() + args.seconds
+        threads = []
+        for i in range(args.threads):
+            dnumber = departments[i % len(departments)]
+            thread = threading.Thread(target=worker, args=(f'concurrency_{dnumber}', dnumber, locations[dnumber],
+                                                           deadline, results))
+            threads.append(thread)
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        cursor.execute("DELETE FROM Users WHERE username LIKE 'concurrency\\_%%'")
+        conn.commit()
+        conn.close()
+
+    total = sum(r for r, _ in results)
+    errors = sum(e for _, e in results)
+    print(f"{args.threads} threads over {len(departments)} departments: {total} requests in {args.seconds}s "
+          f"({total / args.seconds:.0f} req/s), {errors} responses with another department's or missing rows")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Sign-in storm: login latency, and the latency of other routes meanwhile.
+
+Runs N threads that each log in repeatedly for a fixed time, while one more thread,
+already logged in, keeps requesting a page that needs no hashing (/projects/add). Login
+rate limits are switched off for the run (every thread signs in as the same user from the
+same address); the hashing pool keeps PASSWORD_HASHING_CONFIG, so with more threads than
+"workers" + "max_queue" some logins are refused with a 503 rather than queued, and their
+thread waits the Retry-After before trying again. Needs the database from config.py.
+
+    python benchmarks/login_storm.py [--threads 32] [--seconds 5]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import app  # noqa: E402
+from passwords import configure_passwords  # noqa: E402
+
+
+def percentile(latencies, p):
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+
+def login_worker(deadline, latencies, statuses):
+    client = app.test_client()
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        response = client.post('/login', data={'username': 'admin', 'password': 'adminkey'})
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] += 1
+        if 'Retry-After' in response.headers:
+            # Back off like a browser user told the server is busy
+            time.sleep(float(response.headers['Retry-After']))
+
+
+def page_worker(client, deadline, latencies):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        client.get('/projects/add')
+        latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    configure_passwords(app.config.get('PASSWORD_HASHING_CONFIG'), {})
+    # Logging in starts the pool's processes before timing
+    page_client = app.test_client()
+    page_client.post('/login', data={'username': 'admin', 'password': 'adminkey'})
+
+    login_latencies, page_latencies, statuses = [], [], Counter()
+    deadline = time.monotonic() + args.seconds
+    threads = [threading.Thread(target=login_worker, args=(deadline, login_latencies, statuses))
+               for _ in range(args.threads)]
+    threads.append(threading.Thread(target=page_worker, args=(page_client, deadline, page_latencies)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"logins   {len(login_latencies) / args.seconds:8.1f}/s  p50 {percentile(login_latencies, 0.5):8.1f} ms  "
+          f"p99 {percentile(login_latencies, 0.99):8.1f} ms  statuses {dict(statuses)}")
+    print(f"page     {len(page_latencies) / args.seconds:8.1f}/s  p50 {percentile(page_latencies, 0.5):8.1f} ms  "
+          f"p99 {percentile(page_latencies, 0.99):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Read/write split check against a primary and a streaming read replica.
+
+Set up a second local instance as a standby of the one in config.py, e.g.
+
+    pg_basebackup -h localhost -p 5432 -U postgres -D /tmp/replica -R -X stream --checkpoint=fast
+    pg_ctl -D /tmp/replica -o "-p 5433" -l /tmp/replica.log start
+
+then run
+
+    python benchmarks/replica_routing.py [--replica-port 5433]
+
+With a temporary superadmin it checks that a listing is read from the replica, that after a
+write made while the replica's replay is paused (pg_wal_replay_pause) both the writer and
+another user of the same process read from the primary and see the write, and that reads
+go back to the replica once replay resumes. With the replica stopped it checks that reads
+fall back to the primary. Exits 1 on a failed check.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import psycopg2  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import app  # noqa: E402
+from metrics import local_samples  # noqa: E402
+
+PASSWORD = 'replica'
+
+
+def reads():
+    counts = {"replica": 0, "primary": 0}
+    for name, labels, value in local_samples()['counters']:
+        if name == 'db_reads_total':
+            counts[dict(map(tuple, labels))['target']] = value
+    return counts
+
+
+def served_by(client, path):
+    """
+    Which database served one read-only request: "replica" or "primary". Paths are made
+    unique per check so the page cache cannot answer instead.
+    """
+    before = reads()
+    response = client.get(path)
+    after = reads()
+    target = "replica" if after["replica"] > before["replica"] else "primary"
+    return target, response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--replica-host', default=app.config['DATABASE_CONFIG'].get('host'))
+    parser.add_argument('--replica-port', default='5433')
+    args = parser.parse_args()
+
+    replica_dsn = {**app.config['DATABASE_CONFIG'], "host": args.replica_host, "port": args.replica_port,
+                   "connect_timeout": 2}
+    check_interval = 0.5
+    app.config['REPLICA_CONFIG'] = {**app.config.get('REPLICA_CONFIG', {}), "replicas": [replica_dsn],
+                                    "check_interval": check_interval}
+
+    conn = psycopg2.connect(**app.config['DATABASE_CONFIG'])
+    with conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM Users WHERE username IN ('replica_check_1', 'replica_check_2')")
+        for username in ('replica_check_1', 'replica_check_2'):
+            cursor.execute("INSERT INTO Users (username, password_hash, role_id, department_id) VALUES (%s, %s, 1, NULL)",
+                           (username, generate_password_hash(PASSWORD)))
+        cursor.execute("SELECT Dnumber, Dname, Mgr_ssn FROM Department ORDER BY Dnumber LIMIT 1")
+        dnumber, dname, mgr_ssn = cursor.fetchone()
+
+    failures = 0
+
+    def check(label, ok):
+        nonlocal failures
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label}")
+
+    try:
+        writer, other = app.test_client(), app.test_client()
+        writer.post('/login', data={'username': 'replica_check_1', 'password': PASSWORD})
+        other.post('/login', data={'username': 'replica_check_2', 'password': PASSWORD})
+
+        try:
+            replica = psycopg2.connect(**replica_dsn)
+        except psycopg2.OperationalError:
+            target, response = served_by(writer, '/view_departments?check=down')
+            check("replica down: listing read from the primary", target == "primary" and response.status_code == 200)
+            return failures
+
+        replica.autocommit = True
+        target, _ = served_by(writer, '/view_departments?check=0')
+        check("listing read from the replica", target == "replica")
+
+        new_name = 'Rep' + str(int(time.time()) % 100000)
+        replica.cursor().execute("SELECT pg_wal_replay_pause()")
+        try:
+            writer.post(f'/departments/update/{dnumber}',
+                        data={'dnumber': dnumber, 'dname': new_name, 'mgr_ssn': mgr_ssn})
+            time.sleep(check_interval * 2)
+            target, response = served_by(writer, '/view_departments?limit=500&check=1')
+            check("writer reads its write from the primary while replay is paused",
+                  target == "primary" and new_name in response.get_data(as_text=True))
+            target, _ = served_by(other, '/view_departments?check=other')
+            check("other user of the same process also reads from the primary", target == "primary")
+        finally:
+            replica.cursor().execute("SELECT pg_wal_replay_resume()")
+
+        time.sleep(check_interval * 2 + 0.5)
+        target, response = served_by(writer, '/view_departments?limit=500&check=2')
+        check("back on the replica once it has replayed the write",
+              target == "replica" and new_name in response.get_data(as_text=True))
+        replica.close()
+    finally:
+        with conn, conn.cursor() as cursor:
+            cursor.execute("UPDATE Department SET Dname = %s WHERE Dnumber = %s", (dname, dnumber))
+            cursor.execute("DELETE FROM Users WHERE username IN ('replica_check_1', 'replica_check_2')")
+        conn.close()
+    return failures
+
+
+if __name__ == '__main__':
+    failed = main()
+    print(f"{failed} failed check(s)")
+    sys.exit(1 if failed else 0)
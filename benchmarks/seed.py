@@ -0,0 +1,149 @@
+"""
+Synthetic company data at a configurable scale.
+
+Rows are generated inside PostgreSQL with generate_series, so seeding a million employees
+takes seconds and no data crosses the wire. Seeded keys never collide with init_db.sql:
+department numbers start at 1000, SSNs start with "X" (or "Y" for employees the load suite
+creates), project numbers at 100000 and user names with "bench_".
+
+The benchmarks seed inside a transaction they roll back. To keep a data set in the
+database, e.g. for repeated load_suite.py runs, seed it from the command line:
+
+    python benchmarks/seed.py --departments 100 --employees 1000000
+    python benchmarks/seed.py --remove
+
+Seeded users (bench_superadmin, bench_admin_<n>, bench_user_<n>) log in with --password.
+"""
+import argparse
+import os
+import sys
+
+PROJECTS_PER_DEPARTMENT = 10
+LOCATIONS_PER_DEPARTMENT = 3
+
+SEED_SQL = [
+    # Departments; the manager is the department's first employee
+    """
+    INSERT INTO Department (Dname, Dnumber, Mgr_ssn)
+    SELECT 'Dept ' || d, 1000 + d, 'X' || lpad(d::text, 8, '0')
+    FROM generate_series(1, %(departments)s) AS d
+    """,
+    """
+    INSERT INTO Dept_Location (Dnumber, Dlocation)
+    SELECT 1000 + d, 'Site ' || l
+    FROM generate_series(1, %(departments)s) AS d, generate_series(1, %(locations)s) AS l
+    """,
+    # Employee i belongs to department ((i - 1) % departments) + 1 and reports to employee i - departments
+    """
+    INSERT INTO Employee (Fname, Minit, Lname, SSN, Address, Sex, Salary, Super_ssn, Dno, BDate, EmpDate)
+    SELECT 'F' || i, chr(65 + i %% 26), 'L' || i, 'X' || lpad(i::text, 8, '0'), (i %% 9999) || ' Main St',
+           CASE WHEN i %% 2 = 0 THEN 'F' ELSE 'M' END, 20000 + (i * 7919) %% 300000,
+           'X' || lpad(greatest(i - %(departments)s, 1)::text, 8, '0'), 1000 + (i - 1) %% %(departments)s + 1,
+           date '1955-01-01' + (i * 13) %% 18000, date '1980-01-01' + (i * 17) %% 16000
+    FROM generate_series(1, %(employees)s) AS i
+    """,
+    """
+    INSERT INTO Project (Pname, Pnumber, Plocation, Dnum)
+    SELECT 'Proj ' || p, 100000 + p, 'Site ' || (p %% %(locations)s + 1), 1000 + (p - 1) / %(projects)s + 1
+    FROM generate_series(1, %(departments)s * %(projects)s) AS p
+    """,
+    # Every employee works on two projects of their own department
+    """
+    INSERT INTO Works_On (Essn, Pno, Hours)
+    SELECT 'X' || lpad(i::text, 8, '0'),
+           100000 + ((i - 1) %% %(departments)s) * %(projects)s + (i + k) %% %(projects)s + 1,
+           5 + (i + k) %% 36
+    FROM generate_series(1, %(employees)s) AS i, generate_series(0, 1) AS k
+    """,
+    # Every third employee has a dependent
+    """
+    INSERT INTO Dependent (Essn, Dependent_name, Sex, Bdate, Relationship)
+    SELECT 'X' || lpad(i::text, 8, '0'), 'Dep ' || i %% 1000, 'F', date '2000-01-01' + i %% 7000, 'Child'
+    FROM generate_series(3, %(employees)s, 3) AS i
+    """,
+    # One department admin and one normal user per department
+    """
+    INSERT INTO Users (username, password_hash, role_id, department_id)
+    SELECT 'bench_' || r.name || '_' || d, %(password_hash)s, r.id, 1000 + d
+    FROM generate_series(1, %(departments)s) AS d,
+         (VALUES (2, 'admin'), (3, 'user')) AS r (id, name)
+    """,
+    """
+    INSERT INTO Users (username, password_hash, role_id, department_id)
+    VALUES ('bench_superadmin', %(password_hash)s, 1, NULL)
+    """,
+]
+
+# Deletes everything seed() and the load suite insert, children first (run without parameters)
+UNSEED_SQL = [
+    "DELETE FROM Users WHERE username LIKE 'bench\\_%'",
+    "DELETE FROM Dependent WHERE Essn LIKE 'X%' OR Essn LIKE 'Y%'",
+    "DELETE FROM Works_On WHERE Essn LIKE 'X%' OR Essn LIKE 'Y%' OR Pno >= 100000",
+    "DELETE FROM Employee WHERE Ssn LIKE 'X%' OR Ssn LIKE 'Y%'",
+    "DELETE FROM Project WHERE Pnumber >= 100000",
+    "DELETE FROM Dept_Location WHERE Dnumber >= 1000",
+    "DELETE FROM Department WHERE Dnumber >= 1000",
+]
+
+SEEDED_TABLES = ['Department', 'Dept_Location', 'Employee', 'Project', 'Works_On', 'Dependent', 'Users']
+
+
+def seed(cursor, departments=100, employees=100000, password_hash='!'):
+    """
+    Insert the synthetic data set through `cursor` and refresh planner statistics.
+    Does not commit. Seeded users log in with whatever password `password_hash` encodes.
+    """
+    params = {
+        "departments": departments,
+        "employees": employees,
+        "projects": PROJECTS_PER_DEPARTMENT,
+        "locations": LOCATIONS_PER_DEPARTMENT,
+        "password_hash": password_hash,
+    }
+    for sql in SEED_SQL:
+        cursor.execute(sql, params)
+    for table in SEEDED_TABLES:
+        cursor.execute(f"ANALYZE {table}")
+
+
+def unseed(cursor):
+    """
+    Remove the synthetic data set (does not commit).
+    """
+    for sql in UNSEED_SQL:
+        cursor.execute(sql)
+    for table in SEEDED_TABLES:
+        cursor.execute(f"ANALYZE {table}")
+
+
+def is_seeded(cursor):
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM Users WHERE username = 'bench_superadmin')")
+    return cursor.fetchone()[0]
+
+
+def main():
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import psycopg2
+    from werkzeug.security import generate_password_hash
+
+    from config import DATABASE_CONFIG
+
+    parser = argparse.ArgumentParser(description="Seed (and commit) or remove the synthetic company data set.")
+    parser.add_argument('--departments', type=int, default=100)
+    parser.add_argument('--employees', type=int, default=100000)
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--remove', action='store_true', help="only remove a previously seeded data set")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    with conn, conn.cursor() as cursor:
+        unseed(cursor)
+        if not args.remove:
+            seed(cursor, args.departments, args.employees, generate_password_hash(args.password))
+    conn.close()
+    print("Removed the synthetic data set" if args.remove else
+          f"Seeded {args.departments} departments / {args.employees} employees")
+
+
+if __name__ == '__main__':
+    main()
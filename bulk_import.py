@@ -0,0 +1,269 @@
+import codecs
+import csv
+import datetime
+import json
+import time
+
+from psycopg2.extras import execute_values
+
+from queries import parse_hours
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+def _text(max_length):
+    def convert(value):
+        value = str(value).strip()
+        if len(value) > max_length:
+            raise ValueError(f"longer than {max_length} characters")
+        return value
+    return convert
+
+
+def _int(value):
+    return int(str(value).strip())
+
+
+def _date(value):
+    return datetime.date.fromisoformat(str(value).strip())
+
+
+# What each import kind loads: target table, (column, converter, required) in insert order,
+# the unique keys a row may not repeat, and the column holding the row's department, if any.
+# The first unique key is the primary key, returned by the INSERT to tell loaded rows apart.
+IMPORT_SPECS = {
+    "employees": {
+        "table": "Employee",
+        "fields": [("Fname", _text(10), True), ("Minit", _text(1), True), ("Lname", _text(10), True),
+                   ("SSN", _text(9), True), ("Address", _text(15), True), ("Sex", _text(1), True),
+                   ("Salary", _int, True), ("Super_ssn", _text(9), True), ("Dno", _int, True),
+                   ("BDate", _date, False), ("EmpDate", _date, False)],
+        "unique": [("SSN",), ("Fname", "Lname")],
+        "department": "Dno",
+    },
+    "projects": {
+        "table": "Project",
+        "fields": [("Pname", _text(15), True), ("Pnumber", _int, True), ("Plocation", _text(15), True),
+                   ("Dnum", _int, True)],
+        "unique": [("Pnumber",), ("Pname",)],
+        "department": "Dnum",
+    },
+    # A Works_On row belongs to its project's department, looked up in works_on_lookups()
+    "works_on": {
+        "table": "Works_On",
+        "fields": [("Essn", _text(9), True), ("Pno", _int, True), ("Hours", parse_hours, True)],
+        "unique": [("Essn", "Pno")],
+        "department": None,
+    },
+}
+
+
+def _lines(stream):
+    """
+    Yield (line, text) for each line of an upload, decoded as UTF-8 with any byte order
+    mark dropped. `text` is None for a line that is not valid UTF-8.
+    """
+    for line, raw in enumerate(stream, start=1):
+        if line == 1:
+            raw = raw.removeprefix(codecs.BOM_UTF8)
+        try:
+            yield line, raw.decode('utf-8')
+        except UnicodeDecodeError:
+            yield line, None
+
+
+def read_records(stream, fmt):
+    """
+    Yield (line, record) for each row of an uploaded CSV (with a header row) or NDJSON file.
+    `record` is a dict, or an error message for a line that cannot be parsed.
+    """
+    if fmt == "csv":
+        # An undecodable line reaches the reader as a blank one (which it skips) and is
+        # reported in its place
+        undecodable = []
+
+        def texts():
+            for line, text in _lines(stream):
+                if text is None:
+                    undecodable.append(line)
+                yield text or ''
+
+        reader = csv.DictReader(texts())
+        for record in reader:
+            while undecodable:
+                yield undecodable.pop(0), "not valid UTF-8"
+            yield reader.line_num, record
+        for line in undecodable:
+            yield line, "not valid UTF-8"
+        return
+
+    for line, text in _lines(stream):
+        if text is None:
+            yield line, "not valid UTF-8"
+            continue
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield line, f"invalid JSON: {e}"
+            continue
+        yield line, record if isinstance(record, dict) else "not a JSON object"
+
+
+def validate_records(spec, records, role_id, department_id):
+    """
+    Convert and check parsed records. Returns (rows, errors, received): `rows` is a list of
+    (line, values) in the spec's column order, `errors` a list of {"line", "error"}.
+
+    A department admin may only import into their own department, the rule add_employee
+    enforces. Rows repeating a unique key of an earlier row in the same file are rejected
+    here; rows clashing with existing data are reported after the insert.
+    """
+    columns = [column for column, _, _ in spec["fields"]]
+    rows, errors, seen, received = [], [], [set() for _ in spec["unique"]], 0
+    department_index = columns.index(spec["department"]) if spec["department"] else None
+
+    for line, record in records:
+        received += 1
+        if not isinstance(record, dict):
+            errors.append({"line": line, "error": record})
+            continue
+
+        record = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+        values, problems = [], []
+        for column, convert, required in spec["fields"]:
+            raw = record.get(column.lower())
+            if raw is None or str(raw).strip() == "":
+                if required:
+                    problems.append(f"{column} is required")
+                values.append(None)
+                continue
+            try:
+                values.append(convert(raw))
+            except (ValueError, TypeError) as e:
+                problems.append(f"{column}: {e}")
+                values.append(None)
+        if problems:
+            errors.append({"line": line, "error": "; ".join(problems)})
+            continue
+
+        if role_id != 1 and department_index is not None and values[department_index] != department_id:
+            errors.append({"line": line, "error": "You can only import into your own department."})
+            continue
+
+        keys = [tuple(values[columns.index(c)] for c in unique) for unique in spec["unique"]]
+        clash = next((unique for unique, key, known in zip(spec["unique"], keys, seen) if key in known), None)
+        if clash:
+            errors.append({"line": line, "error": f"Duplicate {', '.join(clash)} earlier in the file"})
+            continue
+        for key, known in zip(keys, seen):
+            known.add(key)
+        rows.append((line, tuple(values)))
+
+    return rows, errors, received
+
+
+def works_on_lookups(rows):
+    """
+    Queries resolving the projects and employees a batch of Works_On rows refers to:
+    [(sql, params)] for project departments and for existing employee SSNs.
+    """
+    return [
+        ("SELECT Pnumber, Dnum FROM Project WHERE Pnumber = ANY(%s)", (sorted({v[1] for _, v in rows}),)),
+        ("SELECT Ssn FROM Employee WHERE Ssn = ANY(%s)", (sorted({v[0] for _, v in rows}),)),
+    ]
+
+
+def check_works_on(rows, project_rows, employee_rows, role_id, department_id):
+    """
+    Split Works_On rows into those referring to an existing employee and project (of the
+    admin's own department, as in add_worksOn) and the errors for the rest.
+    """
+    project_departments = dict(project_rows)
+    employees = {ssn.rstrip() for ssn, in employee_rows}
+    kept, errors = [], []
+    for line, values in rows:
+        essn, pno = values[0], values[1]
+        if pno not in project_departments:
+            errors.append({"line": line, "error": f"Unknown project {pno}"})
+        elif essn not in employees:
+            errors.append({"line": line, "error": f"Unknown employee {essn}"})
+        elif role_id != 1 and project_departments[pno] != department_id:
+            errors.append({"line": line, "error": "You can only assign work on your own department's projects."})
+        else:
+            kept.append((line, values))
+    return kept, errors
+
+
+def insert_sql(spec, values="%s"):
+    """
+    Multi-row INSERT (execute_values fills in `values`): skips rows clashing with existing
+    data and returns the primary key of every row it did insert.
+    """
+    columns = ", ".join(column for column, _, _ in spec["fields"])
+    return (f"INSERT INTO {spec['table']} ({columns}) VALUES {values} ON CONFLICT DO NOTHING "
+            f"RETURNING {', '.join(spec['unique'][0])}")
+
+
+def row_key(spec, values):
+    columns = [column for column, _, _ in spec["fields"]]
+    return tuple(values[columns.index(c)] for c in spec["unique"][0])
+
+
+def returned_key(row):
+    return tuple(v.rstrip() if isinstance(v, str) else v for v in row)
+
+
+def import_report(kind, spec, rows, errors, received, inserted_keys, started):
+    """
+    Final report: counts, rows/second and per-line errors, including the rows the INSERT
+    skipped because they already exist.
+    """
+    for line, values in rows:
+        if row_key(spec, values) not in inserted_keys:
+            errors.append({"line": line, "error": "Already exists"})
+    seconds = time.perf_counter() - started
+    return {
+        "kind": kind,
+        "received": received,
+        "inserted": len(inserted_keys),
+        "rejected": len(errors),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(len(inserted_keys) / seconds) if seconds else None,
+        "errors": sorted(errors, key=lambda e: e["line"] or 0),
+    }
+
+
+def run_import(conn, kind, stream, fmt, role_id, department_id, batch_size):
+    """
+    Validate and load an uploaded file into the table for `kind`, in one transaction with
+    multi-row INSERTs of `batch_size` rows. Rows that fail validation or already exist are
+    reported and skipped; a database error rolls back the whole import.
+    """
+    started = time.perf_counter()
+    spec = IMPORT_SPECS[kind]
+    rows, errors, received = validate_records(spec, read_records(stream, fmt), role_id, department_id)
+
+    cursor = conn.cursor()
+    try:
+        if kind == "works_on" and rows:
+            lookups = []
+            for sql, params in works_on_lookups(rows):
+                cursor.execute(sql, params)
+                lookups.append(cursor.fetchall())
+            rows, reference_errors = check_works_on(rows, *lookups, role_id, department_id)
+            errors += reference_errors
+
+        inserted = []
+        if rows:
+            inserted = execute_values(cursor, insert_sql(spec), [values for _, values in rows],
+                                      page_size=batch_size, fetch=True)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return import_report(kind, spec, rows, errors, received, {returned_key(row) for row in inserted}, started)
@@ -5,3 +5,181 @@ DATABASE_CONFIG = {
 "host": "localhost",
 "port": "5432"
 }
+
+# Connection pool (one per worker process). Up to `maxconn` connections are checked out at
+# once; further requests wait up to `timeout` seconds. Idle connections are checked with a
+# `SELECT 1` before reuse once idle longer than `health_check_after` seconds, and closed
+# after `max_idle` seconds.
+DB_POOL_CONFIG = {
+"minconn": 1,
+"maxconn": 10,
+"timeout": 5.0,
+"health_check_after": 30.0,
+"max_idle": 300.0
+}
+
+# Server-side prepared statements for the hot queries (role lookup, login, listing pages;
+# prepared.py): each pooled connection prepares them on first use and keeps at most
+# "max_per_connection". Filtered, searched, sorted and ?fields= listings are not prepared,
+# so the fixed set stays near 85 statements. Set "enabled" to False behind PgBouncer in
+# transaction mode.
+PREPARED_STATEMENTS_CONFIG = {
+"enabled": True,
+"max_per_connection": 100
+}
+
+# Read replicas (streaming standbys of DATABASE_CONFIG) for the read-only listings, searches,
+# exports and reference lists (replicas.py); empty sends everything to the primary. Each
+# entry takes the same keys as DATABASE_CONFIG; add "connect_timeout" so a replica that is
+# down is given up on quickly. A replica is used while it is at most "max_lag_seconds"
+# behind (checked every "check_interval" seconds) and has replayed this worker's commits
+# and, for "sticky_seconds" after a write, the user's own; otherwise reads go to the
+# primary. An unreachable replica is retried after "retry_after" seconds.
+REPLICA_CONFIG = {
+"replicas": [],
+"max_lag_seconds": 5.0,
+"check_interval": 1.0,
+"retry_after": 10.0,
+"sticky_seconds": 10.0
+}
+
+# Server-side sessions (sessions.py); the cookie only carries a random session id. "backend"
+# is "sqlite" (one file at "path", default in the temp directory, shared by every worker on
+# the host) or "memory" (per process, for a single-process server only). A session expires
+# "lifetime" seconds after its last request; its stored expiry is pushed back at most once
+# every "refresh_after" seconds.
+SESSION_CONFIG = {
+"backend": "sqlite",
+"path": None,
+"lifetime": 28800,
+"refresh_after": 60
+}
+
+# Key for anything Flask/Quart signs. The SECRET_KEY environment variable takes precedence;
+# with neither set each process uses a random key (sessions do not depend on it).
+SECRET_KEY = None
+
+# Password hashing and verification (passwords.py) run on a pool of "workers" processes per
+# app process; up to "max_queue" more wait their turn, and beyond that, or after "timeout"
+# seconds, login and register answer 503. "method" is the werkzeug hash method for new
+# passwords; a user whose stored hash uses other parameters is rehashed at their next login.
+PASSWORD_HASHING_CONFIG = {
+"method": "scrypt",
+"workers": 2,
+"max_queue": 8,
+"timeout": 10.0
+}
+
+# Token buckets charged by every login attempt, per username and per client address: up to
+# "burst" attempts at once, then "per_minute". Kept per process. Further attempts get a 429.
+LOGIN_RATE_LIMITS = {
+"username": {"burst": 5, "per_minute": 5},
+"ip": {"burst": 30, "per_minute": 60}
+}
+
+# Seconds a session's role is trusted before it is re-read from Users, to pick up changes
+# made outside the app. Changes made through update_user/delete_user reach every session of
+# the user, in every worker, immediately.
+ROLE_CACHE_TTL = 60
+
+# Rows per page on the view_* listings (overridable with ?limit=, up to MAX_PAGE_SIZE).
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Rows fetched per round trip by the streaming CSV/NDJSON exports.
+EXPORT_BATCH_SIZE = 1000
+
+# Async serving mode (python asgi_app.py): uvicorn options. Each worker process opens its
+# own async pool sized by DB_POOL_CONFIG.
+ASGI_SERVER_CONFIG = {
+"host": "127.0.0.1",
+"port": 8000,
+"workers": 4
+}
+
+# Production WSGI serving (gunicorn -c gunicorn.conf.py wsgi:app). "workers": None means one
+# worker per CPU core. Each worker has its own DB_POOL_CONFIG pool, so keep
+# workers * maxconn below the server's max_connections.
+WSGI_SERVER_CONFIG = {
+"bind": "127.0.0.1:8080",
+"workers": None,
+"threads": 4,
+"timeout": 30,
+"graceful_timeout": 30,
+"max_requests": 10000,
+"max_requests_jitter": 500
+}
+
+# Per-process cache of the reference list behind the department dropdowns (department
+# numbers). Writes through the app invalidate it at once; with "listen" on, each process
+# also LISTENs for the Department trigger from migration 0003 and so sees changes made by
+# other workers or outside the app right away, otherwise within "ttl" seconds.
+REFERENCE_CACHE_CONFIG = {
+"ttl": 300,
+"maxsize": 128,
+"listen": False
+}
+
+# Matches returned by the /employees/search type-ahead behind the manager SSN pickers.
+EMPLOYEE_SEARCH_LIMIT = 10
+
+# Rows per multi-row INSERT statement in the bulk import (/import). All batches of one
+# upload run in a single transaction.
+IMPORT_BATCH_SIZE = 1000
+
+# Largest number of Works_On assignments one batch Hours update (/worksOn/batch) may change.
+WORKS_ON_BATCH_LIMIT = 1000
+
+# Per-request SQL instrumentation (instrumentation.py). Every response gets a Server-Timing
+# header (SQL time and statement count, pool wait, handler time); statements slower than
+# "slow_query_ms" are logged as JSON to the app.slow_queries logger (None turns that off),
+# and with "log_requests" on, each request logs one JSON line to app.requests at INFO.
+SQL_INSTRUMENTATION = {
+"slow_query_ms": 100,
+"server_timing": True,
+"log_requests": True
+}
+
+# Prometheus metrics at /metrics (metrics.py). Each process keeps its own counters; when
+# "multiprocess_dir" is set (or the METRICS_MULTIPROC_DIR environment variable, which
+# gunicorn.conf.py and asgi_app.py set for their workers), every process also writes a
+# snapshot there at most every "snapshot_interval" seconds and /metrics adds them all up.
+METRICS_CONFIG = {
+"multiprocess_dir": None,
+"snapshot_interval": 5.0
+}
+
+# /dashboard reads per-department aggregates from the department_summary materialized view
+# (migration 0005). With "refresh_in_app" on, the app refreshes it in the background once
+# it is "refresh_interval" seconds old (one process at a time); turn it off to refresh
+# from cron with `python summary.py` instead.
+DASHBOARD_CONFIG = {
+"refresh_interval": 300,
+"refresh_in_app": True
+}
+
+# Cache of the rendered view_departments, view_projects and view_locations pages and the
+# /api/v1 listings, per route, role, department and query string (page_cache.py),
+# revalidated with ETags and Last-Modified. "backend" is
+# "memory" (per-process LRU of "maxsize" pages; other workers' writes show after "ttl"
+# seconds) or "sqlite" (one file at "path", default in the temp directory, shared by all
+# workers on the host, so every write invalidates at once).
+PAGE_CACHE_CONFIG = {
+"enabled": True,
+"backend": "memory",
+"maxsize": 512,
+"ttl": 60,
+"path": None
+}
+
+# Most employees one /employees/prefetch request may ask for (?ssn=a,b,...).
+PREFETCH_LIMIT = 500
+
+# JSON API (/api/v1/<entity>, api.py). Responses of "compress_min_bytes" or more are sent
+# brotli-compressed (at "brotli_quality", if the brotli package is installed) or gzipped
+# (at "gzip_level") to clients that accept it.
+API_CONFIG = {
+"compress_min_bytes": 1024,
+"gzip_level": 6,
+"brotli_quality": 5
+}
@@ -0,0 +1,143 @@
+"""
+Department-scoped writes for the project, Works_On, dependent and location routes.
+
+Each mutation is one statement whose WHERE clause carries the department check: a
+department admin's statement matches no row outside their department, and the number of
+rows it affected decides whether the write happened. There is no separate existence check
+before it, so no second round trip and no window between the check and the write. A
+department_id of None (a superadmin) drops the check.
+
+The builders return (sql, params), run by execute() below in app.py and by the async
+execute in asgi_app.py.
+"""
+from db import get_db_connection
+
+
+def execute(sql, params=()):
+    """
+    Run one write on the request's connection and commit it. Returns the number of rows
+    affected; a failed write is rolled back before its error is raised.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        rowcount = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return rowcount
+
+
+# Projects: department admins write their department's projects only
+def project_insert(pname, pnumber, plocation, dnum, department_id):
+    if department_id is None:
+        return ("INSERT INTO Project (Pname, Pnumber, Plocation, Dnum) VALUES (%s, %s, %s, %s)",
+                (pname, pnumber, plocation, dnum))
+    return ("INSERT INTO Project (Pname, Pnumber, Plocation, Dnum) "
+            "SELECT %s, %s, %s, Dnumber FROM Department WHERE Dnumber = %s AND Dnumber = %s",
+            (pname, pnumber, plocation, dnum, department_id))
+
+
+def project_update(pnumber, pname, plocation, dnum, department_id):
+    if department_id is None:
+        return ("UPDATE Project SET Pname = %s, Plocation = %s, Dnum = %s WHERE Pnumber = %s",
+                (pname, plocation, dnum, pnumber))
+    return ("UPDATE Project SET Pname = %s, Plocation = %s, Dnum = %s WHERE Pnumber = %s AND Dnum = %s",
+            (pname, plocation, dnum, pnumber, department_id))
+
+
+def project_delete(pnumber, department_id):
+    if department_id is None:
+        return "DELETE FROM Project WHERE Pnumber = %s", (pnumber,)
+    return "DELETE FROM Project WHERE Pnumber = %s AND Dnum = %s", (pnumber, department_id)
+
+
+# Works_On: scoped by the department of the project worked on (the view_worksOn rule)
+def works_on_insert(essn, pno, hours, department_id):
+    if department_id is None:
+        return "INSERT INTO Works_On (Essn, Pno, Hours) VALUES (%s, %s, %s)", (essn, pno, hours)
+    return ("INSERT INTO Works_On (Essn, Pno, Hours) SELECT %s, Pnumber, %s FROM Project WHERE Pnumber = %s AND Dnum = %s",
+            (essn, hours, pno, department_id))
+
+
+def works_on_update(essn, pno, hours, department_id):
+    if department_id is None:
+        return "UPDATE Works_On SET Hours = %s WHERE Pno = %s AND Essn = %s", (hours, pno, essn)
+    return ("UPDATE Works_On SET Hours = %s FROM Project WHERE Pno = %s AND Essn = %s AND Pnumber = Pno AND Dnum = %s",
+            (hours, pno, essn, department_id))
+
+
+def works_on_delete(essn, pno, department_id):
+    if department_id is None:
+        return "DELETE FROM Works_On WHERE Pno = %s AND Essn = %s", (pno, essn)
+    return ("DELETE FROM Works_On USING Project WHERE Pno = %s AND Essn = %s AND Pnumber = Pno AND Dnum = %s",
+            (pno, essn, department_id))
+
+
+# Dependents: scoped by the department of the employee they depend on
+def dependent_select(essn, name, department_id):
+    """
+    The dependent's row for the update form, or no row outside the admin's department.
+    """
+    if department_id is None:
+        return ("SELECT Essn, Dependent_name, Sex, Bdate, Relationship FROM Dependent "
+                "WHERE Essn = %s AND Dependent_name = %s", (essn, name))
+    return ("SELECT d.Essn, d.Dependent_name, d.Sex, d.Bdate, d.Relationship FROM Dependent d "
+            "JOIN Employee e ON e.Ssn = d.Essn WHERE d.Essn = %s AND d.Dependent_name = %s AND e.Dno = %s",
+            (essn, name, department_id))
+
+
+def dependent_insert(essn, name, sex, bdate, relationship, department_id):
+    if department_id is None:
+        return ("INSERT INTO Dependent (Essn, Dependent_name, Sex, Bdate, Relationship) VALUES (%s, %s, %s, %s, %s)",
+                (essn, name, sex, bdate, relationship))
+    return ("INSERT INTO Dependent (Essn, Dependent_name, Sex, Bdate, Relationship) "
+            "SELECT Ssn, %s, %s, %s, %s FROM Employee WHERE Ssn = %s AND Dno = %s",
+            (name, sex, bdate, relationship, essn, department_id))
+
+
+def dependent_update(essn, name, sex, bdate, relationship, department_id):
+    if department_id is None:
+        return ("UPDATE Dependent SET Sex = %s, Bdate = %s, Relationship = %s WHERE Essn = %s AND Dependent_name = %s",
+                (sex, bdate, relationship, essn, name))
+    return ("UPDATE Dependent SET Sex = %s, Bdate = %s, Relationship = %s FROM Employee "
+            "WHERE Essn = %s AND Dependent_name = %s AND Ssn = Essn AND Dno = %s",
+            (sex, bdate, relationship, essn, name, department_id))
+
+
+def dependent_delete(essn, name, department_id):
+    if department_id is None:
+        return "DELETE FROM Dependent WHERE Essn = %s AND Dependent_name = %s", (essn, name)
+    return ("DELETE FROM Dependent USING Employee WHERE Essn = %s AND Dependent_name = %s AND Ssn = Essn AND Dno = %s",
+            (essn, name, department_id))
+
+
+# Department locations: department admins keep theirs within their department
+def location_insert(dnumber, dlocation, department_id):
+    if department_id is None:
+        return "INSERT INTO Dept_location (Dnumber, Dlocation) VALUES (%s, %s)", (dnumber, dlocation)
+    return ("INSERT INTO Dept_location (Dnumber, Dlocation) "
+            "SELECT Dnumber, %s FROM Department WHERE Dnumber = %s AND Dnumber = %s",
+            (dlocation, dnumber, department_id))
+
+
+def location_update(dnumber, dlocation, new_dnumber, new_dlocation, department_id):
+    """
+    Rename a location; a superadmin may also move it to another department.
+    """
+    if department_id is None:
+        return ("UPDATE Dept_location SET Dlocation = %s, Dnumber = %s WHERE Dnumber = %s AND Dlocation = %s",
+                (new_dlocation, new_dnumber, dnumber, dlocation))
+    return ("UPDATE Dept_location SET Dlocation = %s WHERE Dnumber = %s AND Dlocation = %s AND Dnumber = %s",
+            (new_dlocation, dnumber, dlocation, department_id))
+
+
+def location_delete(dnumber, dlocation, department_id):
+    if department_id is None:
+        return "DELETE FROM Dept_location WHERE Dnumber = %s AND Dlocation = %s", (dnumber, dlocation)
+    return ("DELETE FROM Dept_location WHERE Dnumber = %s AND Dlocation = %s AND Dnumber = %s",
+            (dnumber, dlocation, department_id))
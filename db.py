@@ -0,0 +1,335 @@
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from flask import current_app, g, has_request_context, session
+
+from instrumentation import InstrumentedCursor, record_acquire
+from metrics import inc
+from replicas import STATUS_SQL, WRITE_LSN_SQL, replica_router
+
+
+class PoolTimeoutError(PoolError):
+    """
+    Raised when no pooled connection became free within the configured timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of psycopg2 connections.
+
+    At most `maxconn` connections are checked out at once; callers beyond that wait up to
+    `timeout` seconds for one to be returned. Idle connections are health checked before
+    reuse once they have been idle longer than `health_check_after` seconds.
+    """
+
+    def __init__(self, dsn_kwargs, minconn=1, maxconn=10, timeout=5.0, health_check_after=30.0, max_idle=300.0):
+        self.dsn_kwargs = dsn_kwargs
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, time it was returned)
+
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._opened = 0
+        self._closed = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.dsn_kwargs)
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._closed += 1
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, returned_at = self._idle.pop()
+
+            idle_for = time.monotonic() - returned_at
+            if conn.closed:
+                self._discard(conn)
+            elif self.max_idle and idle_for > self.max_idle:
+                self._discard(conn)
+            elif idle_for > self.health_check_after and not self._is_healthy(conn):
+                self._discard(conn)
+            else:
+                return conn
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(f"No database connection available within {self.timeout}s")
+        waited = time.monotonic() - start
+
+        try:
+            conn = self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if waited > 0.001:
+                self._waits += 1
+        return conn
+
+    def putconn(self, conn):
+        try:
+            keep = not conn.closed
+            if keep:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    keep = False
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    # Handlers that returned early leave their transaction open; never hand it on.
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        keep = False
+
+            if keep:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "peak_in_use": self._peak_in_use,
+                "saturation": self._in_use / self.maxconn,
+                "opened": self._opened,
+                "closed": self._closed,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "wait_seconds_total": self._wait_total,
+                "wait_seconds_max": self._wait_max,
+            }
+
+
+class PooledConnection:
+    """
+    Request-scoped handle on a pooled connection. Route handlers may call close() as they
+    always have; the connection is only handed back to `pool` when the request ends.
+    Its cursors time every statement into the request's stats (see instrumentation.py).
+    With read replicas configured, commits on the primary record their WAL position for
+    the replica routing (see replicas.py).
+    """
+
+    def __init__(self, conn, pool, router=None):
+        self.raw = conn
+        self.pool = pool
+        self.router = router
+
+    def close(self):
+        pass
+
+    def commit(self):
+        self.raw.commit()
+        if self.router is not None:
+            cursor = self.cursor()
+            cursor.execute(WRITE_LSN_SQL)
+            lsn = cursor.fetchone()[0]
+            cursor.close()
+            if has_request_context():
+                self.router.remember_write(session, lsn)
+            else:
+                self.router.note_write(lsn)
+
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault('cursor_factory', InstrumentedCursor)
+        return self.raw.cursor(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_router = None
+_router_pid = None
+
+
+def get_pool(create=True):
+    """
+    Return this process's pool, creating it on first use. A forked worker never reuses the
+    parent's sockets: it starts a pool of its own. With create=False, returns None instead
+    of opening a pool that does not exist yet.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        if not create:
+            return None
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                pool_config = current_app.config.get('DB_POOL_CONFIG', {})
+                _pool = ConnectionPool(current_app.config['DATABASE_CONFIG'], **pool_config)
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def get_router(create=True):
+    """
+    This process's replicas.ReplicaRouter, with a pool per replica, or None when
+    REPLICA_CONFIG lists no replicas. Like the pool, a forked worker creates its own.
+    """
+    global _router, _router_pid
+    if _router_pid != os.getpid():
+        if not create:
+            return None
+        with _pool_lock:
+            if _router_pid != os.getpid():
+                _router = replica_router(current_app.config.get('REPLICA_CONFIG'))
+                pool_config = current_app.config.get('DB_POOL_CONFIG', {})
+                for replica in (_router.replicas if _router else []):
+                    replica.pool = ConnectionPool(replica.dsn_kwargs, **{**pool_config, "minconn": 0})
+                _router_pid = os.getpid()
+    return _router
+
+
+def reset_pool():
+    """
+    Forget the current pools without touching their connections (used right after a fork).
+    """
+    global _pool, _pool_pid, _router, _router_pid
+    with _pool_lock:
+        _pool = None
+        _pool_pid = None
+        _router = None
+        _router_pid = None
+
+
+def _checkout(pool, router=None):
+    start = time.perf_counter()
+    conn = PooledConnection(pool.getconn(), pool, router)
+    record_acquire(time.perf_counter() - start)
+    return conn
+
+
+def get_db_connection():
+    """
+    Return the connection for the current request, checking one out of the pool the first
+    time it is asked for. The role decorators and the handler share it. In a handler marked
+    read-only (g.read_only), this is get_read_connection().
+    """
+    if g.get('read_only'):
+        return get_read_connection()
+    conn = g.get('db_conn')
+    if conn is None:
+        conn = g.db_conn = _checkout(get_pool(), get_router())
+    return conn
+
+
+def get_read_connection():
+    """
+    Connection for read-only queries: a read replica that is current enough for this user
+    and process (see replicas.py), or else the request's primary connection.
+    """
+    conn = g.get('read_conn')
+    if conn is None:
+        conn = _replica_connection()
+        inc("db_reads_total", (("target", "primary" if conn is None else "replica"),))
+        if conn is None:
+            conn = g.get('db_conn') or _checkout(get_pool(), get_router())
+            g.db_conn = conn
+        g.read_conn = conn
+    return conn
+
+
+def _replica_connection():
+    router = get_router()
+    if router is None:
+        return None
+    min_lsn = router.min_lsn(session if has_request_context() else {})
+    for replica in router.candidates(min_lsn):
+        try:
+            conn = _checkout(replica.pool)
+        except (psycopg2.Error, PoolError) as e:
+            router.record_failure(replica, e)
+            continue
+        if router.needs_check(replica):
+            try:
+                cursor = conn.cursor()
+                cursor.execute(STATUS_SQL)
+                router.record_status(replica, cursor.fetchone())
+                cursor.close()
+            except psycopg2.Error as e:
+                router.record_failure(replica, e)
+                replica.pool.putconn(conn.raw)
+                continue
+        if router.usable(replica, min_lsn):
+            return conn
+        replica.pool.putconn(conn.raw)
+    return None
+
+
+def release_db_connection(exc=None):
+    """
+    Teardown hook: return the request's connections to their pools, on success and error paths.
+    """
+    conn = g.pop('db_conn', None)
+    read_conn = g.pop('read_conn', None)
+    if conn is not None:
+        conn.pool.putconn(conn.raw)
+    if read_conn is not None and read_conn is not conn:
+        read_conn.pool.putconn(read_conn.raw)
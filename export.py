@@ -0,0 +1,64 @@
+import csv
+import datetime
+import decimal
+import io
+import json
+import uuid
+
+from flask import Response, current_app, stream_with_context
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _json_value(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_chunk(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def stream_rows(conn, sql, params, columns, fmt, batch_size):
+    """
+    Yield `sql` as CSV or NDJSON text, one chunk per batch. Rows come from a server-side
+    (named) cursor, so at most `batch_size` rows are held in memory at any time.
+    """
+    cursor = conn.cursor(name=f"export_{uuid.uuid4().hex}")
+    cursor.itersize = batch_size
+    try:
+        cursor.execute(sql, params)
+        if fmt == "csv":
+            yield _csv_chunk([columns])
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if fmt == "csv":
+                yield _csv_chunk(rows)
+            else:
+                yield "".join(json.dumps(dict(zip(columns, row)), default=_json_value) + "\n" for row in rows)
+    finally:
+        cursor.close()
+        # The export only read data; end the transaction the named cursor lived in
+        conn.rollback()
+
+
+def export_response(conn, sql, params, columns, fmt, filename):
+    """
+    Chunked download response for an export query.
+    """
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    return Response(
+        stream_with_context(stream_rows(conn, sql, params, columns, fmt, batch_size)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}.{fmt}"},
+    )
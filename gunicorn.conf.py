@@ -0,0 +1,39 @@
+# Gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app`, taken from
+# WSGI_SERVER_CONFIG in config.py. Send SIGHUP to the master for a graceful restart.
+import multiprocessing
+import os
+import tempfile
+
+from config import METRICS_CONFIG, WSGI_SERVER_CONFIG
+
+bind = WSGI_SERVER_CONFIG.get("bind", "127.0.0.1:8080")
+workers = WSGI_SERVER_CONFIG.get("workers") or multiprocessing.cpu_count()
+threads = WSGI_SERVER_CONFIG.get("threads", 1)
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = WSGI_SERVER_CONFIG.get("timeout", 30)
+graceful_timeout = WSGI_SERVER_CONFIG.get("graceful_timeout", 30)
+max_requests = WSGI_SERVER_CONFIG.get("max_requests", 0)
+max_requests_jitter = WSGI_SERVER_CONFIG.get("max_requests_jitter", 0)
+
+# Workers share their /metrics counters through snapshot files (see metrics.py); the app
+# reads the directory from the environment, so set it before the app is preloaded.
+os.environ.setdefault("METRICS_MULTIPROC_DIR", METRICS_CONFIG.get("multiprocess_dir")
+                      or os.path.join(tempfile.gettempdir(), "company_db_metrics"))
+
+# Import the app (and compile its templates, see wsgi.py) once in the master before forking
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Connection pools are per process: make sure each worker opens its own after the fork
+    # rather than sharing any socket with the master.
+    from db import reset_pool
+
+    reset_pool()
+
+
+def on_starting(server):
+    # Counters start from zero with every server start, not with the last run's totals
+    from metrics import clear_snapshots
+
+    clear_snapshots(os.environ["METRICS_MULTIPROC_DIR"])
@@ -0,0 +1,162 @@
+import contextvars
+import json
+import logging
+import time
+
+from psycopg2 import extensions
+
+request_logger = logging.getLogger('app.requests')
+slow_query_logger = logging.getLogger('app.slow_queries')
+
+# Stats of the request being handled: per thread under Flask, per task under Quart
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """
+    What one request cost the database: statements run, time spent in them, time spent
+    waiting for a pooled connection, and the slowest statement.
+    """
+
+    def __init__(self, route, slow_query_ms=None):
+        self.route = route
+        self.slow_query_ms = slow_query_ms
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.acquire_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+
+    def as_dict(self):
+        return {
+            "route": self.route,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "queries": self.queries,
+            "db_ms": round(self.db_seconds * 1000, 2),
+            "acquire_ms": round(self.acquire_seconds * 1000, 2),
+            "slowest_ms": round(self.slowest_seconds * 1000, 2),
+            "slowest_sql": self.slowest_sql,
+        }
+
+
+def _statement(sql, limit=500):
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors='replace')
+    sql = ' '.join(str(sql).split())
+    return sql if len(sql) <= limit else sql[:limit] + '…'
+
+
+def begin_request(route, slow_query_ms=None):
+    """
+    Start collecting stats for the current request. Statements slower than `slow_query_ms`
+    are logged to app.slow_queries (None disables the log).
+    """
+    stats = RequestStats(route, slow_query_ms)
+    _current.set(stats)
+    return stats
+
+
+def current_stats():
+    return _current.get()
+
+
+def end_request():
+    """
+    Stop collecting and return the request's stats, or None if none were being collected.
+    """
+    stats = _current.get()
+    _current.set(None)
+    return stats
+
+
+def record_acquire(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.acquire_seconds += seconds
+
+
+def record_query(sql, seconds, count=True):
+    """
+    Add one statement (or, with count=False, one more round trip of it, e.g. a FETCH from a
+    server-side cursor) to the current request's stats. No-op outside a request.
+    """
+    stats = _current.get()
+    if stats is None:
+        return
+    if count:
+        stats.queries += 1
+    stats.db_seconds += seconds
+    if seconds > stats.slowest_seconds:
+        stats.slowest_seconds = seconds
+        stats.slowest_sql = _statement(sql)
+    if stats.slow_query_ms is not None and seconds * 1000 >= stats.slow_query_ms:
+        slow_query_logger.warning(json.dumps({
+            "event": "slow_query",
+            "route": stats.route,
+            "duration_ms": round(seconds * 1000, 2),
+            "sql": _statement(sql),
+        }))
+
+
+def server_timing(stats):
+    """
+    Server-Timing header value: time in SQL (with the statement count), waiting for a
+    connection, and in the whole handler.
+    """
+    d = stats.as_dict()
+    return (f'db;dur={d["db_ms"]};desc="{d["queries"]} queries", '
+            f'acquire;dur={d["acquire_ms"]}, app;dur={d["duration_ms"]}')
+
+
+def configure_logging(log_requests):
+    """
+    Turn the per-request log on or off, and give both loggers a plain stderr handler (one
+    JSON object per line) unless the deployment has configured logging already.
+    """
+    request_logger.setLevel(logging.INFO if log_requests else logging.WARNING)
+    for logger in (request_logger, slow_query_logger):
+        if not logger.hasHandlers():
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+
+
+def log_request(stats, method, status):
+    """
+    One structured (JSON) line per request on app.requests, at INFO.
+    """
+    if request_logger.isEnabledFor(logging.INFO):
+        request_logger.info(json.dumps({"event": "request", "method": method, "status": status, **stats.as_dict()}))
+
+
+class InstrumentedCursor(extensions.cursor):
+    """
+    psycopg2 cursor that times every statement into the current request's stats.
+    Handed out by db.PooledConnection.cursor().
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+    # A server-side (named) cursor goes back to the database on every fetch
+
+    def fetchmany(self, size=None):
+        if not self.name:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        start = time.perf_counter()
+        try:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        finally:
+            record_query(self.query, time.perf_counter() - start, count=False)
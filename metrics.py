@@ -0,0 +1,308 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+Recording is lock-free: every thread adds to its own shard, and the shards are only summed
+when the metrics are read. Under several worker processes (gunicorn, uvicorn --workers)
+each process also writes its totals to <dir>/<pid>.json at most every `snapshot_interval`
+seconds, and /metrics sums the snapshots of all of them; counters of exited workers are
+kept, their gauges dropped.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    "http_requests_total": ("counter", "Requests handled, by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "Time to handle a request, by route."),
+    "db_queries_total": ("counter", "SQL statements run, by route."),
+    "db_query_seconds_total": ("counter", "Time spent in SQL statements, by route."),
+    "db_pool_acquire_seconds": ("histogram", "Time a request waited for a pooled connection."),
+    "db_pool_connections": ("gauge", "Pooled connections, by state (in_use, idle) and the configured size."),
+    "db_pool_checkouts_total": ("counter", "Connections checked out of the pool."),
+    "db_pool_waits_total": ("counter", "Checkouts that had to wait for a free connection."),
+    "db_pool_timeouts_total": ("counter", "Checkouts that gave up waiting."),
+    "db_pool_wait_seconds_total": ("counter", "Time spent waiting for pooled connections."),
+    "db_pool_opened_total": ("counter", "Database connections opened by the pool."),
+    "db_pool_closed_total": ("counter", "Database connections closed by the pool."),
+    "db_reads_total": ("counter", "Read-only requests, by the database that served them (replica, primary)."),
+    "cache_requests_total": ("counter", "Cache lookups, by cache (role, session, reference, page) and result (hit, miss)."),
+    "cache_invalidations_total": ("counter", "Cache entries invalidated, by cache."),
+    "password_hashing_total": ("counter", "Password operations on the hashing pool, by kind (verify, hash, rehash)."),
+    "password_hashing_rejected_total": ("counter", "Logins and hashes refused, by reason (busy, rate_limited)."),
+}
+
+_local = threading.local()
+_shards = []  # (counters, histograms) of every thread of this process
+_shards_lock = threading.Lock()  # only taken when a thread records its first sample
+_shards_pid = None
+
+_collectors = []  # callables returning [(name, labels, value)] read at collection time
+
+_snapshot_lock = threading.Lock()
+_snapshot_due = 0.0
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None or shard[2] != os.getpid():
+        global _shards, _shards_pid
+        shard = ({}, {}, os.getpid())
+        _local.shard = shard
+        with _shards_lock:
+            if _shards_pid != os.getpid():
+                # A forked worker starts from zero rather than with its parent's samples
+                _shards, _shards_pid = [], os.getpid()
+            _shards.append(shard)
+    return shard
+
+
+def inc(name, labels=(), value=1.0):
+    """
+    Add `value` to a counter. `labels` is a tuple of (label, value) pairs.
+    """
+    counters = _shard()[0]
+    key = (name, labels)
+    counters[key] = counters.get(key, 0.0) + value
+
+
+def observe(name, value, labels=()):
+    """
+    Record one observation in a LATENCY_BUCKETS histogram.
+    """
+    histograms = _shard()[1]
+    key = (name, labels)
+    histogram = histograms.get(key)
+    if histogram is None:
+        # One count per bucket, the +Inf bucket, then the sum of the observations
+        histogram = histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+    histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+    histogram[-1] += value
+
+
+def register_collector(collector):
+    """
+    Add a callable read at collection time, returning [(name, labels, value)] for
+    counters and gauges kept elsewhere (pool statistics, cache hit counts).
+    """
+    _collectors.append(collector)
+
+
+def observe_request(stats, method, status):
+    """
+    Record a finished request from its instrumentation.RequestStats.
+    """
+    route = (("route", stats.route or "unmatched"),)
+    inc("http_requests_total", route + (("method", method), ("status", str(status))))
+    observe("http_request_duration_seconds", time.perf_counter() - stats.started, route)
+    if stats.queries:
+        inc("db_queries_total", route, stats.queries)
+        inc("db_query_seconds_total", route, stats.db_seconds)
+    if stats.acquire_seconds:
+        observe("db_pool_acquire_seconds", stats.acquire_seconds)
+
+
+# db.ConnectionPool.stats() key behind each pool metric
+POOL_STATS = [
+    ("db_pool_connections", (("state", "in_use"),), "in_use"),
+    ("db_pool_connections", (("state", "idle"),), "idle"),
+    ("db_pool_connections", (("state", "size"),), "size"),
+    ("db_pool_checkouts_total", (), "checkouts"),
+    ("db_pool_waits_total", (), "waits"),
+    ("db_pool_timeouts_total", (), "timeouts"),
+    ("db_pool_wait_seconds_total", (), "wait_seconds_total"),
+    ("db_pool_opened_total", (), "opened"),
+    ("db_pool_closed_total", (), "closed"),
+]
+
+
+def pool_samples(stats):
+    """
+    Samples for db.ConnectionPool.stats() (or a dict with some of its keys), or nothing
+    before the pool exists.
+    """
+    if not stats:
+        return []
+    return [(name, labels, stats[key]) for name, labels, key in POOL_STATS if key in stats]
+
+
+def cache_samples():
+    """
+    Hit/miss/invalidation counts of the roles kept in sessions (behind the auth decorators),
+    the session store, the reference-list cache, the rendered-page cache and the prepared
+    statements of the pooled connections.
+    """
+    from page_cache import page_cache_stats
+    from prepared import prepared_stats
+    from reference import reference_cache_stats
+    from roles import role_cache_stats
+    from sessions import session_stats
+
+    samples = []
+    for cache, stats in (("role", role_cache_stats), ("session", session_stats), ("reference", reference_cache_stats),
+                         ("page", page_cache_stats), ("prepared_statement", prepared_stats)):
+        samples.append(("cache_requests_total", (("cache", cache), ("result", "hit")), stats["hits"]))
+        samples.append(("cache_requests_total", (("cache", cache), ("result", "miss")), stats["misses"]))
+        samples.append(("cache_invalidations_total", (("cache", cache),), stats["invalidations"]))
+    return samples
+
+
+def password_samples():
+    """
+    Counts of the password hashing pool and the login rate limits.
+    """
+    from passwords import password_stats
+
+    return ([("password_hashing_total", (("kind", kind),), password_stats[key])
+             for kind, key in (("verify", "verified"), ("hash", "hashed"), ("rehash", "rehashed"))]
+            + [("password_hashing_rejected_total", (("reason", reason),), password_stats[reason])
+               for reason in ("busy", "rate_limited")])
+
+
+def local_samples():
+    """
+    This process's samples: {"counters": [...], "gauges": [...], "histograms": [...]}, each
+    entry [name, [[label, value], ...], value or bucket counts].
+    """
+    counters, histograms = {}, {}
+    with _shards_lock:
+        shards = list(_shards) if _shards_pid == os.getpid() else []
+    for shard_counters, shard_histograms, _ in shards:
+        for key, value in shard_counters.copy().items():
+            counters[key] = counters.get(key, 0.0) + value
+        for key, histogram in shard_histograms.copy().items():
+            total = histograms.setdefault(key, [0] * len(histogram))
+            for i, value in enumerate(list(histogram)):
+                total[i] += value
+
+    gauges = {}
+    for collector in _collectors:
+        for name, labels, value in collector():
+            target = gauges if METRICS[name][0] == "gauge" else counters
+            target[(name, labels)] = target.get((name, labels), 0.0) + value
+
+    def entries(samples):
+        return [[name, [list(pair) for pair in labels], value] for (name, labels), value in samples.items()]
+
+    return {"counters": entries(counters), "gauges": entries(gauges), "histograms": entries(histograms)}
+
+
+def write_snapshot(directory):
+    """
+    Write this process's samples to <directory>/<pid>.json, atomically.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(local_samples(), f)
+    os.replace(path + ".tmp", path)
+
+
+def maybe_write_snapshot(directory, interval):
+    """
+    write_snapshot at most every `interval` seconds; called after each request. Never makes
+    a request wait for another thread's write.
+    """
+    global _snapshot_due
+    if not directory or time.monotonic() < _snapshot_due or not _snapshot_lock.acquire(blocking=False):
+        return
+    try:
+        _snapshot_due = time.monotonic() + interval
+        write_snapshot(directory)
+    finally:
+        _snapshot_lock.release()
+
+
+def clear_snapshots(directory):
+    """
+    Remove the snapshots of a previous run; called once by the server before starting workers.
+    """
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect(directory=None):
+    """
+    Samples of this process, or with `directory` the sum over all worker processes.
+    """
+    if not directory:
+        return local_samples()
+
+    with _snapshot_lock:
+        write_snapshot(directory)
+    merged = {"counters": {}, "gauges": {}, "histograms": {}}
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+            pid = int(os.path.basename(path).split(".")[0])
+        except (OSError, ValueError):
+            continue
+        for kind, samples in snapshot.items():
+            if kind == "gauges" and not _alive(pid):
+                continue
+            for name, labels, value in samples:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if kind == "histograms":
+                    total = merged[kind].setdefault(key, [0] * len(value))
+                    for i, v in enumerate(value):
+                        total[i] += v
+                else:
+                    merged[kind][key] = merged[kind].get(key, 0.0) + value
+    return {kind: [[name, labels, value] for (name, labels), value in samples.items()]
+            for kind, samples in merged.items()}
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(samples):
+    """
+    Prometheus text exposition (version 0.0.4) of collect()'s samples.
+    """
+    by_name = {}
+    for kind in ("counters", "gauges", "histograms"):
+        for name, labels, value in samples.get(kind, []):
+            by_name.setdefault(name, []).append((tuple(tuple(pair) for pair in labels), value))
+
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = METRICS.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(by_name[name]):
+            if kind != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {_number(cumulative)}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {_number(cumulative)}")
+    return "\n".join(lines) + "\n"
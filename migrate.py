@@ -0,0 +1,71 @@
+"""
+Apply the versioned SQL migrations in migrations/ to the database in config.py.
+
+Run once after init_db.sql, and again whenever a new migration is added:
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+
+Each file runs in its own transaction and is recorded in schema_migrations, so it is
+applied exactly once. Files are applied in name order (0001_..., 0002_..., ...).
+"""
+import os
+import sys
+
+import psycopg2
+
+from config import DATABASE_CONFIG
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def migration_files():
+    return sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith('.sql'))
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations
+        (
+            version    VARCHAR(255) PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn, status_only=False):
+    cursor = conn.cursor()
+    applied = applied_versions(cursor)
+    conn.commit()
+
+    for name in migration_files():
+        version = name[:-len('.sql')]
+        if version in applied:
+            print(f"  applied  {version}")
+            continue
+        if status_only:
+            print(f"  pending  {version}")
+            continue
+
+        with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+            sql = f.read()
+        try:
+            cursor.execute(sql)
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+            conn.commit()
+            print(f"  applied  {version} (now)")
+        except psycopg2.Error as e:
+            conn.rollback()
+            print(f"  FAILED   {version}: {e}")
+            return False
+    cursor.close()
+    return True
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    ok = migrate(conn, status_only='--status' in sys.argv)
+    conn.close()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,23 @@
+-- Secondary indexes for the department-filtered read paths. The primary keys only serve
+-- lookups by key; every view_* query for a department admin or user filters on another column.
+
+-- view_employees / export: WHERE Dno = %s ORDER BY Ssn, answered by an index-only scan.
+-- Also drives the Dependent listing, which joins Dependent to Employee on Dno.
+CREATE INDEX IF NOT EXISTS employee_dno_ssn_idx
+    ON Employee (Dno, Ssn)
+    INCLUDE (Fname, Minit, Lname, Address, Sex, Salary, Super_ssn, BDate, EmpDate);
+
+-- view_projects: WHERE Dnum = %s ORDER BY Pnumber, and the Dnum lookups in the Works_On joins.
+CREATE INDEX IF NOT EXISTS project_dnum_pnumber_idx
+    ON Project (Dnum, Pnumber)
+    INCLUDE (Pname, Plocation);
+
+-- view_worksOn: Works_On joined to a department's projects on Pno.
+CREATE INDEX IF NOT EXISTS works_on_pno_idx
+    ON Works_On (Pno, Essn)
+    INCLUDE (Hours);
+
+-- login: one index-only probe by username returns everything the login query needs.
+CREATE UNIQUE INDEX IF NOT EXISTS users_username_login_idx
+    ON Users (username)
+    INCLUDE (id, password_hash, role_id, department_id);
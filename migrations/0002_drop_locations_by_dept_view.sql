@@ -0,0 +1,3 @@
+-- view_locations used to CREATE (and DROP/re-CREATE) this view on every request from a
+-- department user. It now reads Dept_location directly; remove the leftover global view.
+DROP VIEW IF EXISTS LocationsByDept;
@@ -0,0 +1,20 @@
+-- Notify the app's reference-list cache (reference.py) when Department or Employee changes,
+-- including writes made outside the app. The payload is the lower-case table name.
+-- Statement-level, so a bulk change sends one notification rather than one per row;
+-- notifications are delivered at commit and duplicates within a transaction are folded.
+CREATE OR REPLACE FUNCTION notify_reference_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('reference_changed', lower(TG_TABLE_NAME));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS department_reference_change ON Department;
+CREATE TRIGGER department_reference_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Department
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_change();
+
+DROP TRIGGER IF EXISTS employee_reference_change ON Employee;
+CREATE TRIGGER employee_reference_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Employee
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_change();
@@ -0,0 +1,11 @@
+-- /employees/search: prefix matches on SSN, last name and first name, each returned in index
+-- order and cut at the search limit. The "C" collation lets a plain btree serve both
+-- LIKE 'prefix%' and the ORDER BY, whatever the database's default collation is.
+CREATE INDEX IF NOT EXISTS employee_ssn_prefix_idx
+    ON Employee ((Ssn::text) COLLATE "C");
+
+CREATE INDEX IF NOT EXISTS employee_lname_prefix_idx
+    ON Employee ((lower(Lname)) COLLATE "C");
+
+CREATE INDEX IF NOT EXISTS employee_fname_prefix_idx
+    ON Employee ((lower(Fname)) COLLATE "C");
@@ -0,0 +1,32 @@
+-- Per-department aggregates behind /dashboard: headcount, payroll, projects, hours booked
+-- on the department's projects and dependents of its employees. Read by the dashboard
+-- instead of GROUP BYs over the base tables on every page view, and refreshed by
+-- summary.py. The unique index lets REFRESH ... CONCURRENTLY replace the rows without
+-- blocking readers.
+CREATE MATERIALIZED VIEW IF NOT EXISTS department_summary AS
+SELECT d.Dnumber,
+       d.Dname,
+       coalesce(e.employees, 0)   AS employees,
+       coalesce(e.total_salary, 0) AS total_salary,
+       e.avg_salary,
+       coalesce(p.projects, 0)    AS projects,
+       coalesce(w.total_hours, 0) AS total_hours,
+       coalesce(dep.dependents, 0) AS dependents,
+       now()                      AS refreshed_at
+FROM Department d
+         LEFT JOIN (SELECT Dno, count(*) AS employees, sum(Salary) AS total_salary, round(avg(Salary), 2) AS avg_salary
+                    FROM Employee
+                    GROUP BY Dno) e ON e.Dno = d.Dnumber
+         LEFT JOIN (SELECT Dnum, count(*) AS projects
+                    FROM Project
+                    GROUP BY Dnum) p ON p.Dnum = d.Dnumber
+         LEFT JOIN (SELECT pr.Dnum, sum(wo.Hours) AS total_hours
+                    FROM Works_On wo
+                             JOIN Project pr ON pr.Pnumber = wo.Pno
+                    GROUP BY pr.Dnum) w ON w.Dnum = d.Dnumber
+         LEFT JOIN (SELECT em.Dno, count(*) AS dependents
+                    FROM Dependent de
+                             JOIN Employee em ON em.Ssn = de.Essn
+                    GROUP BY em.Dno) dep ON dep.Dno = d.Dnumber;
+
+CREATE UNIQUE INDEX IF NOT EXISTS department_summary_dnumber ON department_summary (Dnumber);
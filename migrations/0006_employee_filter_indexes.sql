@@ -0,0 +1,30 @@
+-- view_employees filters, sorts and search, combined with the Dno scoping of department
+-- admins and users and with keyset pagination.
+
+-- ?q= word-prefix search over names and address. A tsvector GIN index ships with every
+-- PostgreSQL (pg_trgm is a contrib extension that is not always installed); a department's
+-- rows are narrowed by ANDing its bitmap with employee_dno_ssn_idx.
+CREATE INDEX IF NOT EXISTS employee_search_tsv_idx
+    ON Employee USING gin (to_tsvector('simple', Fname || ' ' || Lname || ' ' || Address));
+
+-- ?sort=salary / ?sort=lname, and the salary range filter: WHERE Dno = %s ORDER BY key, Ssn
+-- walks one of these in order and stops after a page (backwards for a descending sort).
+CREATE INDEX IF NOT EXISTS employee_dno_salary_ssn_idx
+    ON Employee (Dno, Salary, Ssn);
+
+CREATE INDEX IF NOT EXISTS employee_dno_lname_ssn_idx
+    ON Employee (Dno, Lname, Ssn);
+
+-- The same sorts for the superadmin, who sees every department.
+CREATE INDEX IF NOT EXISTS employee_salary_ssn_idx
+    ON Employee (Salary, Ssn);
+
+CREATE INDEX IF NOT EXISTS employee_lname_ssn_idx
+    ON Employee (Lname, Ssn);
+
+-- Hire date range (?hired_from= / ?hired_to=) and the supervisor filter (?super_ssn=).
+CREATE INDEX IF NOT EXISTS employee_empdate_idx
+    ON Employee (EmpDate);
+
+CREATE INDEX IF NOT EXISTS employee_super_ssn_idx
+    ON Employee (Super_ssn);
@@ -0,0 +1,3 @@
+-- The manager SSN pickers search /employees/search instead of a cached list of every SSN,
+-- so no reference list reads Employee any more. Stop notifying the listener on each write.
+DROP TRIGGER IF EXISTS employee_reference_change ON Employee;
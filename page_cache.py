@@ -0,0 +1,238 @@
+"""
+Cache of rendered listing pages, keyed on (route, role_id, department_id, query parameters).
+
+A cached page is served without querying the database, with an ETag and a Last-Modified
+date (when it was rendered), so a client revalidating an unchanged page gets a 304 and no
+body. Each page records the tables it
+shows; the write routes call invalidate_pages(table, department, ...) to drop the pages of
+the departments they touched, plus the superadmin's all-department pages.
+
+Two backends, chosen by PAGE_CACHE_CONFIG["backend"]:
+- "memory": a per-process LRU. Cheapest, but another worker's writes only show up after
+  "ttl" seconds.
+- "sqlite": one SQLite file (WAL mode) shared by every worker process on the host, so an
+  invalidation in one worker is seen by all.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.http import parse_date
+
+page_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+_config = {}
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def configure_page_cache(config):
+    """
+    Set PAGE_CACHE_CONFIG; called once by app.py / asgi_app.py at import time.
+    """
+    global _config, _store
+    _config = dict(config or {})
+    _store = None
+
+
+def page_cache_enabled():
+    return _config.get('enabled', True)
+
+
+def page_key(route, role_id, department_id, args):
+    """
+    Cache key of a listing page: `args` is the request's query string as (name, value) pairs.
+    """
+    return json.dumps([route, role_id, department_id, sorted(args)])
+
+
+def page_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def not_modified(entry, if_none_match, if_modified_since=None):
+    """
+    True when the client's copy is the cached page: If-None-Match names its ETag (weakly
+    compared, as compressed responses carry it as W/"..."), or without an If-None-Match,
+    If-Modified-Since is no earlier than the page was rendered.
+    """
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return if_none_match.strip() == '*' or entry["etag"] in tags
+    if if_modified_since and entry.get("modified"):
+        since = parse_date(if_modified_since)
+        return since is not None and int(entry["modified"]) <= since.timestamp()
+    return False
+
+
+def _department(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class MemoryPageStore:
+    """
+    Per-process LRU of rendered pages.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.generation = 0
+        self._pages = OrderedDict()  # key -> (entry, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page and page[1] > time.monotonic():
+                self._pages.move_to_end(key)
+                return page[0]
+            self._pages.pop(key, None)
+            return None
+
+    def current_generation(self):
+        return self.generation
+
+    def put(self, key, entry, ttl, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._pages[key] = (entry, time.monotonic() + ttl)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+                page_cache_stats["evictions"] += 1
+
+    def invalidate(self, tables, departments):
+        with self._lock:
+            self.generation += 1
+            for key, (entry, _) in list(self._pages.items()):
+                if (tables.intersection(entry["tables"])
+                        and (departments is None or entry["department"] is None or entry["department"] in departments)):
+                    del self._pages[key]
+                    page_cache_stats["invalidations"] += 1
+
+
+class SqlitePageStore:
+    """
+    Rendered pages in a SQLite file shared by the worker processes of one host. Each thread
+    uses its own SQLite connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS pages
+                (
+                    key        TEXT PRIMARY KEY,
+                    department INTEGER,
+                    tables     TEXT NOT NULL,
+                    entry      TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE TABLE IF NOT EXISTS generation (value INTEGER NOT NULL)")
+            db.execute("INSERT INTO generation SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM generation)")
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        row = self._connect().execute("SELECT entry FROM pages WHERE key = ? AND expires_at > ?",
+                                      (key, time.time())).fetchone()
+        if row is None:
+            return None
+        entry = json.loads(row[0])
+        entry["body"] = entry["body"].encode()
+        return entry
+
+    def current_generation(self):
+        return self._connect().execute("SELECT value FROM generation").fetchone()[0]
+
+    def put(self, key, entry, ttl, generation):
+        db = self._connect()
+        stored = json.dumps({**entry, "body": entry["body"].decode()})
+        now = time.time()
+        db.execute("""
+            INSERT OR REPLACE INTO pages (key, department, tables, entry, expires_at)
+            SELECT ?, ?, ?, ?, ? WHERE (SELECT value FROM generation) = ?
+        """, (key, entry["department"], "," + ",".join(entry["tables"]) + ",", stored, now + ttl, generation))
+        db.execute("DELETE FROM pages WHERE expires_at <= ?", (now,))
+
+    def invalidate(self, tables, departments):
+        db = self._connect()
+        where = " OR ".join("tables LIKE ?" for _ in tables)
+        params = [f"%,{table},%" for table in tables]
+        if departments is not None:
+            where = f"({where}) AND (department IS NULL OR department IN ({', '.join('?' for _ in departments)}))"
+            params += list(departments)
+        db.execute("BEGIN IMMEDIATE")
+        db.execute("UPDATE generation SET value = value + 1")
+        cursor = db.execute(f"DELETE FROM pages WHERE {where}", params)
+        db.execute("COMMIT")
+        page_cache_stats["invalidations"] += max(cursor.rowcount, 0)
+
+
+def page_store():
+    """
+    This process's store, created on first use from PAGE_CACHE_CONFIG.
+    """
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store_pid != os.getpid():
+                if _config.get('backend', 'memory') == 'sqlite':
+                    _store = SqlitePageStore(_config.get('path')
+                                             or os.path.join(tempfile.gettempdir(), 'company_db_pages.sqlite3'))
+                else:
+                    _store = MemoryPageStore(_config.get('maxsize', 512))
+                _store_pid = os.getpid()
+    return _store
+
+
+def cached_page(key):
+    """
+    Cached entry for `key` ({"etag", "body", "mimetype", ...}), or None.
+    """
+    entry = page_store().get(key)
+    page_cache_stats["hits" if entry is not None else "misses"] += 1
+    return entry
+
+
+def remember_page(key, body, mimetype, department_id, tables, generation):
+    """
+    Store a freshly rendered page, unless an invalidation happened since `generation` was
+    taken (the page may show rows from before the write). Returns the entry.
+    """
+    entry = {"etag": page_etag(body), "body": body, "mimetype": mimetype, "modified": time.time(),
+             "department": _department(department_id), "tables": sorted(tables)}
+    page_store().put(key, entry, _config.get('ttl', 60), generation)
+    return entry
+
+
+def page_generation():
+    return page_store().current_generation()
+
+
+def invalidate_pages(table, *departments):
+    """
+    Drop the cached pages showing `table` for the given departments and the superadmin's
+    all-department pages; with no department, for every department.
+    """
+    page_store().invalidate({table.lower()}, {_department(d) for d in departments} if departments else None)
@@ -0,0 +1,183 @@
+import base64
+import json
+
+import psycopg2
+from flask import current_app, request, url_for
+
+from prepared import execute_prepared
+
+
+def encode_cursor(values):
+    """
+    Turn a row's key values into an opaque token for the `after`/`before` query parameters.
+    """
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Inverse of encode_cursor. Raises ValueError on a malformed token.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid page cursor: {e}")
+    # encode_cursor writes key values as numbers and strings (dates and decimals as text)
+    if not isinstance(values, list) or not all(type(value) in (int, float, str) for value in values):
+        raise ValueError("Invalid page cursor")
+    return values
+
+
+def page_size(args=None, config=None):
+    """
+    Requested page size, clamped to MAX_PAGE_SIZE.
+    """
+    args = request.args if args is None else args
+    config = current_app.config if config is None else config
+    default = config.get('PAGE_SIZE', 50)
+    maximum = config.get('MAX_PAGE_SIZE', 500)
+    try:
+        limit = int(args.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+def _seek_condition(key_columns, values, forward):
+    """
+    WHERE fragment selecting rows strictly after (or before) `values` in key order.
+    Uses a row comparison when every key column sorts the same way, and the expanded
+    OR form otherwise.
+    """
+    directions = {direction for _, direction in key_columns}
+    if len(directions) == 1:
+        ascending = directions.pop() == 'ASC'
+        op = '>' if ascending == forward else '<'
+        columns = ', '.join(column for column, _ in key_columns)
+        placeholders = ', '.join(['%s'] * len(key_columns))
+        return f"({columns}) {op} ({placeholders})", list(values)
+
+    branches, params = [], []
+    for i, (column, direction) in enumerate(key_columns):
+        op = '>' if (direction == 'ASC') == forward else '<'
+        parts = [f"{c} = %s" for c, _ in key_columns[:i]] + [f"{column} {op} %s"]
+        branches.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(branches) + ')', params
+
+
+def keyset_query(select_sql, key_columns, where=(), params=(), after=None, before=None, limit=50):
+    """
+    Build the SQL for one page of `select_sql` ordered by `key_columns`.
+
+    `select_sql` is a "SELECT ... FROM ..." without WHERE/ORDER BY; `where` is a list of
+    AND-ed fragments with `params` for their placeholders. `key_columns` is a list of
+    (column, 'ASC'|'DESC') that must identify a row uniquely. One row more than `limit` is
+    requested so the caller can tell whether another page exists.
+    """
+    where = list(where)
+    params = list(params)
+    forward = before is None
+    if after is not None or before is not None:
+        condition, seek_params = _seek_condition(key_columns, after if forward else before, forward)
+        where.append(condition)
+        params.extend(seek_params)
+
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+
+    order = []
+    for column, direction in key_columns:
+        if not forward:
+            direction = 'DESC' if direction == 'ASC' else 'ASC'
+        order.append(f"{column} {direction}")
+    sql += " ORDER BY " + ", ".join(order) + " LIMIT %s"
+    params.append(limit + 1)
+    return sql, params
+
+
+def keyset_page(rows, key_indexes, limit, after=None, before=None):
+    """
+    Trim the rows fetched by keyset_query to one page and work out the cursors for the
+    neighbouring pages. Returns a dict with `rows`, `next`, `prev` and `limit`.
+    """
+    rows = list(rows)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, after is not None
+
+    def key(row):
+        return encode_cursor(row[i] for i in key_indexes)
+
+    return {
+        "rows": rows,
+        "next": key(rows[-1]) if rows and has_next else None,
+        "prev": key(rows[0]) if rows and has_prev else None,
+        "limit": limit,
+    }
+
+
+def page_cursors(args=None, key_count=None):
+    """
+    Decoded (after, before) cursors from the request. A malformed cursor, or with
+    `key_count` one of another length (e.g. from before the sort order changed), restarts
+    from the first page rather than failing the request.
+    """
+    args = request.args if args is None else args
+    try:
+        after = decode_cursor(args['after']) if args.get('after') else None
+        before = decode_cursor(args['before']) if args.get('before') else None
+    except ValueError:
+        return None, None
+    if key_count is not None and any(c is not None and len(c) != key_count for c in (after, before)):
+        return None, None
+    return after, None if after is not None else before
+
+
+def fetch_page(cursor, select_sql, key_columns, key_indexes, where=(), params=(), args=None, prepare=True):
+    """
+    Run one keyset page of a listing for the current request's `after`/`before`/`limit`
+    parameters. `key_indexes` are the positions of the key columns in the selected row.
+    Pass prepare=False for the request-shaped statements (filters, searches, sorts, field
+    selections), which would crowd the fixed listings out of prepared.py's registry.
+    A cursor whose values do not fit the key columns' types restarts from the first page,
+    like a malformed one.
+    """
+    limit = page_size(args)
+    after, before = page_cursors(args, len(key_columns))
+
+    def run(after, before):
+        sql, sql_params = keyset_query(select_sql, key_columns, where, params, after, before, limit)
+        if prepare:
+            execute_prepared(cursor, sql, sql_params)
+        else:
+            cursor.execute(sql, sql_params)
+
+    try:
+        run(after, before)
+    except (psycopg2.DataError, psycopg2.errors.UndefinedFunction, psycopg2.errors.DatatypeMismatch):
+        if after is None and before is None:
+            raise
+        cursor.connection.rollback()
+        after = before = None
+        run(after, before)
+    return keyset_page(cursor.fetchall(), key_indexes, limit, after, before)
+
+
+def page_url(**params):
+    """
+    Template helper: the current listing URL with its query string updated by `params`.
+    Moving to another page drops the old cursor.
+    """
+    args = request.args.to_dict()
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update({k: v for k, v in params.items() if v is not None})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,208 @@
+"""
+Password hashing and verification off the request threads, with login rate limits.
+
+The KDFs behind werkzeug's password hashes are deliberately CPU-heavy, so they run on a
+small per-process pool of worker processes (PASSWORD_HASHING_CONFIG). At most "workers"
+hashes run at once and "max_queue" more may wait; beyond that, or when a hash is not done
+within "timeout" seconds, the caller gets HashingBusy and answers 503 instead of piling up
+threads behind the pool. A pool whose worker process died (OOM, SIGKILL) is broken for
+good, so it is replaced, and the requests it failed get HashingBusy too. Verifying a hash made with other parameters than "method" also
+returns a new hash, which login stores (rehash on login). The pool's processes are started
+with "forkserver" (or "spawn"), which imports the main module, so scripts using the app
+need the usual `if __name__ == '__main__':` guard.
+
+Login attempts are charged to token buckets per username and per client address
+(LOGIN_RATE_LIMITS) before any hashing happens. The buckets are per process.
+"""
+import concurrent.futures
+import concurrent.futures.process
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+password_stats = {"verified": 0, "hashed": 0, "rehashed": 0, "busy": 0, "rate_limited": 0}
+
+_config = {}
+_limits = {}
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """
+    The hashing pool's queue is full, a hash took longer than the configured timeout, or a
+    worker process died.
+    """
+
+
+def configure_passwords(config, limits=None):
+    """
+    Set PASSWORD_HASHING_CONFIG and LOGIN_RATE_LIMITS; called once by app.py / asgi_app.py
+    at import time.
+    """
+    global _config, _limits, _executor
+    _config = dict(config or {})
+    _limits = {scope: RateLimiter(**limit) for scope, limit in (limits or {}).items()}
+    _executor = None
+
+
+def hash_timeout():
+    return _config.get('timeout', 10.0)
+
+
+# Run in the pool's worker processes
+@functools.lru_cache(maxsize=None)
+def _method_prefix(method):
+    # The parameter part ("scrypt:32768:8:1") werkzeug writes for `method` with its defaults
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method)
+
+
+def _verify(password_hash, password, method):
+    """
+    (matches, new hash or None): a new hash when the password matches a hash made with
+    other parameters than `method`.
+    """
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if password_hash.split('$', 1)[0] == _method_prefix(method):
+        return True, None
+    return True, generate_password_hash(password, method)
+
+
+def _usable(executor):
+    # A ProcessPoolExecutor that lost a worker fails every later submit with BrokenProcessPool
+    return executor is not None and _executor_pid == os.getpid() and not getattr(executor, '_broken', False)
+
+
+def _pool():
+    global _executor, _executor_pid, _slots
+    if not _usable(_executor):
+        with _executor_lock:
+            if not _usable(_executor):
+                if _executor is not None and _executor_pid == os.getpid():
+                    _executor.shutdown(wait=False, cancel_futures=True)
+                workers = _config.get('workers', 2)
+                # Not "fork": the app's threads may hold locks a forked child would inherit
+                context = multiprocessing.get_context(
+                    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+                _executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                _slots = threading.BoundedSemaphore(workers + _config.get('max_queue', 8))
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _submit(fn, *args):
+    """
+    Queue `fn(*args)` on the pool, or raise HashingBusy when the queue is full.
+    """
+    executor = _pool()
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        password_stats["busy"] += 1
+        raise HashingBusy("password hashing queue is full")
+    try:
+        future = executor.submit(fn, *args)
+    except concurrent.futures.process.BrokenProcessPool:
+        # Replaced by the next _pool()
+        slots.release()
+        password_stats["busy"] += 1
+        raise HashingBusy("password hashing pool is broken") from None
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def submit_verify(password_hash, password):
+    """
+    Future of _verify() for a stored hash; raises HashingBusy when the queue is full.
+    """
+    password_stats["verified"] += 1
+    return _submit(_verify, password_hash, password, _config.get('method', 'scrypt'))
+
+
+def submit_hash(password):
+    password_stats["hashed"] += 1
+    return _submit(_hash, password, _config.get('method', 'scrypt'))
+
+
+def _result(future):
+    try:
+        return future.result(timeout=hash_timeout())
+    except concurrent.futures.TimeoutError:
+        password_stats["busy"] += 1
+        raise HashingBusy("password hashing timed out") from None
+    except concurrent.futures.process.BrokenProcessPool:
+        password_stats["busy"] += 1
+        raise HashingBusy("password hashing worker died") from None
+
+
+def verify_password(password_hash, password):
+    """
+    Blocking verify on the pool: (matches, new hash or None). The request thread waits
+    without holding the GIL.
+    """
+    return _result(submit_verify(password_hash, password))
+
+
+def hash_password(password):
+    """
+    Blocking hash of a new password on the pool.
+    """
+    return _result(submit_hash(password))
+
+
+class RateLimiter:
+    """
+    Token buckets per key: up to `burst` attempts at once, refilled at `per_minute`. At most
+    `maxsize` keys are tracked; the least recently used are forgotten first.
+    """
+
+    def __init__(self, burst, per_minute, maxsize=100000):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """
+        Spend one token for `key`: 0 if allowed, else the seconds until one is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def login_retry_after(username, address):
+    """
+    Charge one login attempt to the username's and the address's buckets. Returns 0 when
+    the attempt may proceed, else the seconds the client should wait.
+    """
+    waits = []
+    for scope, key in (("username", (username or '').lower()), ("ip", address or '')):
+        limiter = _limits.get(scope)
+        if limiter is not None:
+            waits.append(limiter.take(key))
+    wait = max(waits, default=0.0)
+    if wait:
+        password_stats["rate_limited"] += 1
+    return wait
@@ -0,0 +1,177 @@
+"""
+Server-side prepared statements for the hot query set: the role lookup, the login query
+and the keyset pages behind the listings (view_* routes and /api/v1).
+
+Postgres parses and plans every statement it is sent as text. The statements run through
+execute_prepared() are PREPAREd once per pooled connection instead and then EXECUTEd by
+name, so each request skips the parse and, once Postgres settles on a generic plan for the
+statement (after five executions), the planning as well. A connection keeps at most
+PREPARED_STATEMENTS_CONFIG["max_per_connection"] statements; the least recently used is
+deallocated first. The async app uses psycopg 3's own prepare=True for the same statements
+and counts them through note_prepared().
+
+Prepared statements belong to the server session, so turn this off behind a proxy that
+hands one client several server connections (PgBouncer in transaction pooling mode).
+"""
+import functools
+import hashlib
+import itertools
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from psycopg2 import errors, extensions
+
+from instrumentation import record_query
+
+# "hits": executions of an already prepared statement, "misses": statements prepared,
+# "invalidations": statements deallocated to make room
+prepared_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+_config = {}
+_registries = weakref.WeakKeyDictionary()
+_registries_lock = threading.Lock()
+
+_PLACEHOLDER = re.compile(r"%[s%]")
+
+
+def configure_prepared(config):
+    """
+    Set PREPARED_STATEMENTS_CONFIG; called once by app.py / asgi_app.py at import time.
+    """
+    global _config
+    _config = dict(config or {})
+
+
+def prepared_enabled():
+    return _config.get('enabled', True)
+
+
+def max_per_connection():
+    return _config.get('max_per_connection', 100)
+
+
+@functools.lru_cache(maxsize=1024)
+def server_sql(sql):
+    """
+    (sql with $1, $2, ... placeholders, number of parameters) for a statement written with
+    psycopg's %s placeholders.
+    """
+    count = 0
+
+    def number(match):
+        nonlocal count
+        if match.group() == '%%':
+            return '%'
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(number, sql), count
+
+
+class ConnectionStatements:
+    """
+    The statements prepared on one connection (sql -> name), least recently used first. A
+    connection is used by one request at a time, so this needs no lock.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._names = OrderedDict()
+
+    def lookup(self, sql):
+        """
+        (name, prepare, evict): the statement's name on this connection, whether it still
+        has to be prepared, and the (sql, name) of the least recently used statements to
+        deallocate first. Nothing is added or dropped here: the caller remember()s the
+        statement once it is prepared and forget()s each evicted one once it is deallocated.
+        """
+        name = self._names.get(sql)
+        if name is not None:
+            self._names.move_to_end(sql)
+            prepared_stats["hits"] += 1
+            return name, False, []
+        prepared_stats["misses"] += 1
+        evict = list(itertools.islice(self._names.items(), max(len(self._names) - self.maxsize + 1, 0)))
+        return 'stmt_' + hashlib.sha1(sql.encode()).hexdigest()[:16], True, evict
+
+    def remember(self, sql, name):
+        self._names[sql] = name
+
+    def forget(self, sql):
+        if self._names.pop(sql, None) is not None:
+            prepared_stats["invalidations"] += 1
+
+    def __len__(self):
+        return len(self._names)
+
+
+def statements_for(conn):
+    """
+    The registry of `conn` (a psycopg2 or psycopg connection), created on first use and
+    dropped with the connection.
+    """
+    statements = _registries.get(conn)
+    if statements is None:
+        with _registries_lock:
+            statements = _registries.get(conn)
+            if statements is None:
+                statements = _registries[conn] = ConnectionStatements(max_per_connection())
+    return statements
+
+
+def _prepare(cursor, name, text):
+    """
+    PREPARE `name` on the cursor's connection. A statement the server already has under
+    that name (prepared by a request whose registry entry was lost) is used as it is; the
+    savepoint keeps that error from aborting the request's transaction.
+    """
+    savepoint = not cursor.connection.autocommit
+    try:
+        cursor.execute(f"SAVEPOINT {name}; PREPARE {name} AS {text}; RELEASE SAVEPOINT {name}" if savepoint
+                       else f"PREPARE {name} AS {text}")
+    except errors.DuplicatePreparedStatement:
+        if savepoint:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {name}; RELEASE SAVEPOINT {name}")
+
+
+def execute_prepared(cursor, sql, params=()):
+    """
+    cursor.execute(sql, params) for a hot statement on a psycopg2 cursor: prepared on the
+    cursor's connection the first time, executed by name afterwards. The request's stats
+    and the slow-query log see `sql` rather than the EXECUTE.
+    """
+    if not prepared_enabled():
+        cursor.execute(sql, params)
+        return
+    statements = statements_for(cursor.connection)
+    name, prepare, evict = statements.lookup(sql)
+    text, count = server_sql(sql)
+    for old_sql, old in evict:
+        cursor.execute(f"DEALLOCATE {old}")
+        statements.forget(old_sql)
+    if prepare:
+        _prepare(cursor, name, text)
+        statements.remember(sql, name)
+    start = time.perf_counter()
+    try:
+        extensions.cursor.execute(cursor, f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count
+                                  else f"EXECUTE {name}", params)
+    finally:
+        record_query(sql, time.perf_counter() - start)
+
+
+def note_prepared(conn, sql):
+    """
+    Count an execution of a hot statement on an async psycopg connection, which prepares
+    and evicts it itself (prepare=True, prepared_max).
+    """
+    if prepared_enabled():
+        statements = statements_for(conn)
+        name, prepare, evict = statements.lookup(sql)
+        for old_sql, _ in evict:
+            statements.forget(old_sql)
+        if prepare:
+            statements.remember(sql, name)
@@ -0,0 +1,388 @@
+"""
+Query building, scoping and validation shared by app.py and asgi_app.py: the employee
+listing's filters, sort and search, the manager search, the employee prefetch, the
+department scoping of the Works_On and dependent listings and the batch Hours update.
+Nothing here touches a connection, so each app runs the SQL with its own driver.
+"""
+import datetime
+import decimal
+import re
+
+
+# Employees
+EMPLOYEE_COLUMNS = ["Fname", "Minit", "Lname", "SSN", "Address", "Sex", "Salary", "Super_ssn", "Dno", "Bdate", "Empdate"]
+
+
+def employee_scope(role_id, department_id):
+    """
+    WHERE fragments and params limiting Employee rows to what the role may see,
+    or None if the role may not view employees at all.
+    """
+    if role_id == 1:  # Super Admin
+        return [], []
+    if role_id in [2, 3]:  # Department Admin&user
+        return ["Dno = %s"], [department_id]
+    return None
+
+
+# view_employees ?sort= keys. Only NOT NULL columns, so the keyset cursors compare exactly.
+EMPLOYEE_SORT_COLUMNS = {"fname": "Fname", "lname": "Lname", "ssn": "SSN", "salary": "Salary", "dno": "Dno"}
+
+# to_tsvector expression behind the ?q= search; must match the 0006 GIN index exactly.
+EMPLOYEE_SEARCH_VECTOR = "to_tsvector('simple', Fname || ' ' || Lname || ' ' || Address)"
+
+# Shortest search word for which employee_listing_query goes through the GIN index.
+EMPLOYEE_SEARCH_MIN_WORD = 3
+
+
+def employee_sort(value):
+    """
+    Keyset key columns and their positions in EMPLOYEE_COLUMNS for a ?sort= value such as
+    "lname,-salary" (a leading "-" sorts descending). SSN is added last, in the direction of
+    the first key, so the key is unique and a single-column sort reads one index in either
+    direction. Raises ValueError on an unknown column.
+    """
+    key_columns = []
+    for name in (value or 'ssn').split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        column = EMPLOYEE_SORT_COLUMNS.get(name.lstrip('-'))
+        if column is None:
+            raise ValueError(f"Cannot sort employees by {name.lstrip('-')!r}.")
+        if column not in [c for c, _ in key_columns]:
+            key_columns.append((column, 'DESC' if name.startswith('-') else 'ASC'))
+    if not key_columns:
+        key_columns.append(("SSN", 'ASC'))
+    elif "SSN" not in [c for c, _ in key_columns]:
+        key_columns.append(("SSN", key_columns[0][1]))
+    return key_columns, [EMPLOYEE_COLUMNS.index(column) for column, _ in key_columns]
+
+
+def _sex(value):
+    if value.upper() not in ('M', 'F'):
+        raise ValueError(value)
+    return value.upper()
+
+
+def _ssn(value):
+    if len(value) > 9:
+        raise ValueError(value)
+    return value
+
+
+# view_employees filters: (query parameter, WHERE fragment, parser)
+EMPLOYEE_FILTERS = [
+    ("salary_min", "Salary >= %s", int),
+    ("salary_max", "Salary <= %s", int),
+    ("sex", "Sex = %s", _sex),
+    ("super_ssn", "Super_ssn = %s", _ssn),
+    ("hired_from", "EmpDate >= %s", datetime.date.fromisoformat),
+    ("hired_to", "EmpDate <= %s", datetime.date.fromisoformat),
+]
+
+
+def search_tsquery(q):
+    """
+    to_tsquery('simple', ...) text matching rows that have a word starting with each word of
+    `q`, or "" when `q` has no words.
+    """
+    return ' & '.join(f"{word}:*" for word in re.findall(r'[^\W_]+', q.lower()))
+
+
+def employee_filters(args, search=True):
+    """
+    WHERE fragments and params for the EMPLOYEE_FILTERS and (unless `search` is False) the
+    ?q= name/address search, to be AND-ed with employee_scope. Raises ValueError on a
+    malformed value.
+    """
+    where, params = [], []
+    for name, condition, parse in EMPLOYEE_FILTERS:
+        value = args.get(name, '').strip()
+        if not value:
+            continue
+        try:
+            params.append(parse(value))
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {value!r}.")
+        where.append(condition)
+    query = search_tsquery(args.get('q', '')) if search else ''
+    if query:
+        where.append(f"{EMPLOYEE_SEARCH_VECTOR} @@ to_tsquery('simple', %s)")
+        params.append(query)
+    return where, params
+
+
+def employee_listing_query(scope, args):
+    """
+    (select_sql, where, params) for fetch_page over the employees in `scope` matching the
+    request's filters and search. PostgreSQL guesses a fixed share of rows for a prefix
+    tsquery, so it would rather walk the sort index filtering every row than use the GIN
+    index; a search with words of EMPLOYEE_SEARCH_MIN_WORD characters or more is therefore
+    collected through the index first (a MATERIALIZED CTE) and only the matches sorted.
+    Shorter prefixes match a large share of rows, for which the index walk is the better plan.
+    """
+    where, params = employee_filters(args, search=False)
+    where, params = scope[0] + where, scope[1] + params
+    columns = ', '.join(EMPLOYEE_COLUMNS)
+    query = search_tsquery(args.get('q', ''))
+    if not query:
+        return f"SELECT {columns} FROM Employee", where, params
+
+    where.append(f"{EMPLOYEE_SEARCH_VECTOR} @@ to_tsquery('simple', %s)")
+    params.append(query)
+    if min(len(word) for word in query.replace(':*', '').split(' & ')) < EMPLOYEE_SEARCH_MIN_WORD:
+        return f"SELECT {columns} FROM Employee", where, params
+    return (f"WITH matches AS MATERIALIZED (SELECT {columns} FROM Employee WHERE {' AND '.join(where)}) "
+            f"SELECT {columns} FROM matches"), [], params
+
+
+def employee_filter_args(args):
+    """
+    The filter and search parameters of the request, carried over to the sort links and the
+    export links.
+    """
+    return {name: args[name] for name in [*(f[0] for f in EMPLOYEE_FILTERS), 'q'] if args.get(name)}
+
+
+def json_row(columns, row):
+    """
+    A result row as a JSON object: CHAR padding stripped, dates as ISO 8601, numerics as numbers.
+    """
+    def value(v):
+        if isinstance(v, str):
+            return v.rstrip()
+        if isinstance(v, decimal.Decimal):
+            return float(v)
+        if isinstance(v, (datetime.date, datetime.datetime)):
+            return v.isoformat()
+        return v
+    return {column: value(v) for column, v in zip(columns, row)}
+
+
+def listing_json(columns, page):
+    """
+    JSON body for a keyset-paginated listing: the rows as objects plus the page cursors.
+    """
+    return {"rows": [json_row(columns, row) for row in page['rows']], "next": page['next'], "prev": page['prev'],
+            "limit": page['limit']}
+
+
+# Employee prefetch: one request resolves many employees with their assignments and dependents
+PREFETCH_WORKS_ON_COLUMNS = ["Essn", "Pno", "Pname", "Dnum", "Hours"]
+PREFETCH_DEPENDENT_COLUMNS = ["Essn", "Dependent_name", "Sex", "Bdate", "Relationship"]
+
+
+def prefetch_queries(ssns, role_id, department_id):
+    """
+    The three statements behind /employees/prefetch, as (sql, params): the employees, their
+    Works_On rows with project names, and their dependents, each for all `ssns` at once.
+    Department users only get their department's employees, and only the assignments on
+    their department's projects (the view_worksOn rule).
+    """
+    employees = f"SELECT {', '.join(EMPLOYEE_COLUMNS)} FROM Employee WHERE Ssn = ANY(%s::bpchar[])"
+    works_on = ("SELECT w.Essn, w.Pno, p.Pname, p.Dnum, w.Hours FROM Works_On w "
+                "JOIN Project p ON p.Pnumber = w.Pno WHERE w.Essn = ANY(%s::bpchar[])")
+    dependents = ("SELECT d.Essn, d.Dependent_name, d.Sex, d.Bdate, d.Relationship FROM Dependent d "
+                  "JOIN Employee e ON e.Ssn = d.Essn WHERE d.Essn = ANY(%s::bpchar[])")
+    if role_id == 1:
+        return [(employees + " ORDER BY Ssn", (ssns,)),
+                (works_on + " ORDER BY w.Essn, w.Pno", (ssns,)),
+                (dependents + " ORDER BY d.Essn, d.Dependent_name", (ssns,))]
+    return [(employees + " AND Dno = %s ORDER BY Ssn", (ssns, department_id)),
+            (works_on + " AND p.Dnum = %s ORDER BY w.Essn, w.Pno", (ssns, department_id)),
+            (dependents + " AND e.Dno = %s ORDER BY d.Essn, d.Dependent_name", (ssns, department_id))]
+
+
+def prefetch_result(ssns, employee_rows, works_on_rows, dependent_rows):
+    """
+    Nest each employee's Works_On rows and dependents under it; SSNs that are unknown or
+    outside the user's department are listed as missing. The three statements see separate
+    snapshots, so rows of an employee the first one did not return are dropped.
+    """
+    employees = {}
+    for row in employee_rows:
+        employee = json_row(EMPLOYEE_COLUMNS, row)
+        employees[employee['SSN']] = {**employee, "works_on": [], "dependents": []}
+    for row in works_on_rows:
+        assignment = json_row(PREFETCH_WORKS_ON_COLUMNS, row)
+        if assignment['Essn'] in employees:
+            employees[assignment['Essn']]['works_on'].append(assignment)
+    for row in dependent_rows:
+        dependent = json_row(PREFETCH_DEPENDENT_COLUMNS, row)
+        if dependent['Essn'] in employees:
+            employees[dependent['Essn']]['dependents'].append(dependent)
+    return {"employees": list(employees.values()), "missing": [ssn for ssn in ssns if ssn not in employees]}
+
+
+def prefetch_ssns(args):
+    """
+    SSNs asked for by ?ssn=...: repeated and/or comma-separated, duplicates dropped.
+    """
+    ssns = [ssn.strip() for value in args.getlist('ssn') for ssn in value.split(',') if ssn.strip()]
+    return list(dict.fromkeys(ssns))
+
+
+# Employee search (the manager SSN pickers)
+def like_prefix(text):
+    """
+    LIKE pattern matching values that start with `text`, with its wildcards escaped.
+    """
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def employee_search_query(q, where, params, limit):
+    """
+    SQL and params for the employees whose SSN, last name or first name starts with `q`
+    (names case-insensitively), limited to `where`. Each prefix search walks one of the 0004
+    expression indexes and stops after `limit` rows, so the cost does not grow with the table.
+    """
+    branches, sql_params = [], []
+    for expression, pattern in (('Ssn::text COLLATE "C"', like_prefix(q)),
+                                ('lower(Lname) COLLATE "C"', like_prefix(q.lower())),
+                                ('lower(Fname) COLLATE "C"', like_prefix(q.lower()))):
+        conditions = [f"{expression} LIKE %s"] + list(where)
+        branches.append(f"(SELECT SSN, Fname, Lname, Dno FROM Employee WHERE {' AND '.join(conditions)}"
+                        f" ORDER BY {expression} LIMIT %s)")
+        sql_params += [pattern, *params, limit]
+    return " UNION ALL ".join(branches), sql_params
+
+
+def employee_search_results(rows, limit):
+    """
+    The first `limit` distinct employees from the rows of employee_search_query, as dicts.
+    """
+    results, seen = [], set()
+    for ssn, fname, lname, dno in rows:
+        if ssn not in seen and len(results) < limit:
+            seen.add(ssn)
+            results.append({"ssn": ssn, "fname": fname, "lname": lname, "dno": dno})
+    return results
+
+
+# Bulk import
+def import_format(upload, requested=None):
+    """
+    Format of an uploaded import file: the one requested, else the file extension.
+    """
+    if requested:
+        return requested
+    extension = upload.filename.rsplit('.', 1)[-1].lower() if upload and '.' in upload.filename else ''
+    return 'ndjson' if extension in ('ndjson', 'jsonl') else extension
+
+
+# Works_On
+WORKS_ON_DETAIL_COLUMNS = ["Essn", "Pno", "Hours", "Fname", "Lname", "Pname", "Dnum"]
+
+
+def parse_hours(value):
+    """
+    A Works_On Hours value as a Decimal rounded to one place, 0 to 999.9; raises ValueError
+    otherwise. Used by the batch Hours update and the works_on import.
+    """
+    try:
+        hours = decimal.Decimal(str(value).strip()).quantize(decimal.Decimal('0.1'), decimal.ROUND_HALF_UP)
+    except decimal.InvalidOperation:
+        raise ValueError("not a number")
+    if not hours.is_finite():
+        raise ValueError("not a number")
+    if not 0 <= hours < 1000:
+        raise ValueError("must be between 0 and 999.9")
+    return hours
+
+
+def works_on_scope(department_id, details=False):
+    """
+    FROM clause, WHERE fragments and params for the Works_On rows of the user's department
+    (the department of the project), or every row for a superadmin. With `details`, each
+    row also carries the employee's name and the project's name and department
+    (WORKS_ON_DETAIL_COLUMNS), joined on the primary keys in the same statement.
+    """
+    if details:
+        select_sql = ("SELECT Essn, Pno, Hours, e.Fname, e.Lname, p.Pname, p.Dnum FROM Works_On "
+                      "JOIN Project p ON p.Pnumber = Pno JOIN Employee e ON e.Ssn = Essn")
+        if department_id != None:
+            return select_sql, ["p.Dnum = %s"], [department_id]
+        return select_sql, [], []
+    if department_id != None:
+        return "SELECT Essn, Pno, Hours FROM Works_On, Project", ["Pno=Pnumber", "Dnum = %s"], [department_id]
+    return "SELECT Essn, Pno, Hours FROM Works_On", [], []
+
+
+def hours_changes(items):
+    """
+    Validate the items of a batch Hours update, [{"essn", "pno", "hours"}, ...]. Returns
+    ({(essn, pno): hours}, errors); a later item for the same assignment wins.
+    """
+    changes, errors = {}, []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": i, "error": "expected an object with essn, pno and hours"})
+            continue
+        try:
+            essn = str(item['essn']).strip()
+            if not essn or len(essn) > 9:
+                raise ValueError(f"invalid Essn {essn!r}")
+            changes[(essn, int(item['pno']))] = parse_hours(item['hours'])
+        except KeyError as e:
+            errors.append({"index": i, "error": f"missing {e.args[0]}"})
+        except (TypeError, ValueError, decimal.InvalidOperation) as e:
+            errors.append({"index": i, "error": str(e)})
+    return changes, errors
+
+
+def json_changes(body):
+    """
+    The items of a JSON batch Hours update, {"changes": [...]}, or None for any other body.
+    """
+    changes = body.get('changes') if isinstance(body, dict) else None
+    return changes if isinstance(changes, list) else None
+
+
+def grid_items(form):
+    """
+    Batch items from the view_worksOn grid, whose inputs are named hours:<essn>:<pno>.
+    """
+    items = []
+    for name, hours in form.items():
+        parts = name.split(':')
+        if len(parts) == 3 and parts[0] == 'hours':
+            items.append({"essn": parts[1], "pno": parts[2], "hours": hours})
+    return items
+
+
+def hours_batch_update(changes):
+    """
+    One UPDATE setting every changed Hours value, joined against a VALUES list, returning
+    the assignments it found.
+    """
+    values = ", ".join(["(%s::bpchar, %s::int, %s::numeric)"] * len(changes))
+    params = [value for (essn, pno), hours in changes.items() for value in (essn, pno, hours)]
+    return (f"""
+        UPDATE Works_On w SET Hours = v.hours
+        FROM (VALUES {values}) AS v (essn, pno, hours)
+        WHERE w.Essn = v.essn AND w.Pno = v.pno
+        RETURNING w.Essn, w.Pno
+    """, params)
+
+
+# Dependents
+DEPENDENT_DETAIL_COLUMNS = ["Essn", "Dependent_name", "Sex", "Bdate", "Relationship", "Fname", "Lname", "Dno"]
+
+
+def dependent_scope(department_id, details=False):
+    """
+    FROM clause, WHERE fragments and params for the dependents of the user's department's
+    employees, or every dependent for a superadmin. With `details`, rows also carry the
+    employee's name and department (DEPENDENT_DETAIL_COLUMNS).
+    """
+    if details:
+        select_sql = ("SELECT d.Essn, Dependent_name, d.Sex, d.Bdate, Relationship, e.Fname, e.Lname, e.Dno "
+                      "FROM Dependent d JOIN Employee e ON e.Ssn = d.Essn")
+        if department_id != None:
+            return select_sql, ["e.Dno = %s"], [department_id]
+        return select_sql, [], []
+    if department_id != None:
+        return ("SELECT Essn, Dependent_name, d.Sex, d.Bdate, Relationship FROM Dependent d, Employee E",
+                ["Essn=SSN", "Dno=%s"], [department_id])
+    return "SELECT Essn, Dependent_name, Sex, Bdate, Relationship FROM Dependent d", [], []
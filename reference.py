@@ -0,0 +1,158 @@
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.extensions
+from flask import current_app
+
+from db import get_read_connection
+from roles import MISSING
+
+logger = logging.getLogger(__name__)
+
+# Reference lists used to fill form dropdowns: name -> (query, tables whose writes invalidate it).
+# Table names are lower-case, as they arrive in NOTIFY payloads.
+REFERENCE_QUERIES = {
+    "department_numbers": ("SELECT Dnumber FROM Department ORDER BY Dnumber", ("department",)),
+}
+
+# Channel the 0003 migration's triggers notify on, with the changed table as the payload
+NOTIFY_CHANNEL = 'reference_changed'
+
+# name -> (values, expires_at), least recently used first
+_reference_cache = OrderedDict()
+_reference_cache_lock = threading.Lock()
+# Bumped by every invalidation so a read that raced with a write does not store stale rows
+_generation = 0
+_listener_pid = None
+
+reference_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+def _config():
+    return current_app.config.get('REFERENCE_CACHE_CONFIG', {})
+
+
+def cached_reference(name):
+    """
+    Cache-only lookup returning (values, generation). `values` is MISSING when the entry is
+    absent or expired; the caller then reads the list itself and hands `generation` back to
+    remember_reference.
+    """
+    with _reference_cache_lock:
+        entry = _reference_cache.get(name)
+        if entry and entry[1] > time.monotonic():
+            _reference_cache.move_to_end(name)
+            reference_cache_stats["hits"] += 1
+            return entry[0], _generation
+        _reference_cache.pop(name, None)
+        reference_cache_stats["misses"] += 1
+        return MISSING, _generation
+
+
+def remember_reference(name, values, generation, ttl=None, maxsize=None):
+    """
+    Store freshly read values, unless an invalidation happened since `generation` was taken.
+    Evicts the least recently used lists beyond `maxsize`.
+    """
+    if ttl is None or maxsize is None:
+        config = _config()
+        ttl = config.get('ttl', 300) if ttl is None else ttl
+        maxsize = config.get('maxsize', 128) if maxsize is None else maxsize
+    with _reference_cache_lock:
+        if generation != _generation:
+            return
+        _reference_cache[name] = (tuple(values), time.monotonic() + ttl)
+        _reference_cache.move_to_end(name)
+        while len(_reference_cache) > maxsize:
+            _reference_cache.popitem(last=False)
+            reference_cache_stats["evictions"] += 1
+
+
+def invalidate_reference(*tables):
+    """
+    Drop every cached list that reads one of `tables`, or all of them when no table is given.
+    Called after the app writes to Department, and by the NOTIFY listener.
+    """
+    global _generation
+    tables = {table.lower() for table in tables}
+    with _reference_cache_lock:
+        _generation += 1
+        for name, (_, depends_on) in REFERENCE_QUERIES.items():
+            if (not tables or tables.intersection(depends_on)) and _reference_cache.pop(name, None):
+                reference_cache_stats["invalidations"] += 1
+
+
+def reference_list(name):
+    """
+    Return the values of a reference list, e.g. reference_list('department_numbers').
+
+    Served from the per-process cache while the entry is fresh; only a miss or an expired
+    entry runs the query, on a read replica when one is current enough (see replicas.py).
+    Writes through this process are invalidated immediately; writes from other workers or
+    outside the app are picked up by the NOTIFY listener when REFERENCE_CACHE_CONFIG["listen"]
+    is on, and within the TTL otherwise.
+    """
+    _ensure_listener()
+    values, generation = cached_reference(name)
+    if values is not MISSING:
+        return values
+
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    cursor.execute(REFERENCE_QUERIES[name][0])
+    values = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+
+    remember_reference(name, values, generation)
+    return tuple(values)
+
+
+def _ensure_listener():
+    if _config().get('listen'):
+        start_listener(current_app.config['DATABASE_CONFIG'])
+
+
+def start_listener(dsn_kwargs):
+    """
+    Start this process's LISTEN thread unless it is already running. Like the pool, a forked
+    worker starts its own.
+    """
+    global _listener_pid
+    with _reference_cache_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+    thread = threading.Thread(target=_listen, args=(dict(dsn_kwargs),), name='reference-cache-listener', daemon=True)
+    thread.start()
+
+
+def _listen(dsn_kwargs, retry_after=5.0):
+    """
+    Invalidate cached lists on NOTIFY from the 0003 migration's triggers, so changes made by
+    other workers or outside the app show up right away. Uses its own connection, outside
+    the pool, and reconnects after errors.
+    """
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**dsn_kwargs)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Anything may have changed while we were not listening
+            invalidate_reference()
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    invalidate_reference(conn.notifies.pop(0).payload)
+        except psycopg2.Error as e:
+            logger.warning("Reference cache listener disconnected: %s", e)
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(retry_after)
@@ -0,0 +1,158 @@
+"""
+Routing of read-only queries to streaming read replicas (REPLICA_CONFIG).
+
+Handlers marked read-only (the view_* listings, searches and exports) and the reference
+lists read from a replica, everything else from the primary. A replica is only used when
+- its last status check, at most "check_interval" seconds old, found it a standby no more
+  than "max_lag_seconds" behind the primary,
+- it has replayed the WAL up to the last commit made by this process (so nothing cached
+  in this process after a write can come from before it), and
+- it has replayed the current user's last commit, made by any worker, during the
+  "sticky_seconds" after it (read-your-writes; the commit's LSN travels in the session).
+Otherwise the read goes to the primary. A replica that cannot be reached is skipped for
+"retry_after" seconds.
+
+The router only keeps state; db.py (Flask) and asgi_app.py (Quart) own the connections.
+"""
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# One row: in recovery?, replayed LSN, seconds behind the primary. A standby that has
+# replayed everything it received from a live WAL stream is not behind at all (after a
+# restart the receive position starts at the segment boundary, behind the replay
+# position); otherwise the lag is the age of the last replayed transaction (NULL before
+# the first one).
+STATUS_SQL = """
+    SELECT pg_is_in_recovery(),
+           pg_last_wal_replay_lsn()::text,
+           CASE WHEN pg_last_wal_replay_lsn() >= pg_last_wal_receive_lsn()
+                     AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
+# Run on the primary right after a commit: a WAL position at or after the commit record
+WRITE_LSN_SQL = "SELECT pg_current_wal_lsn()::text"
+
+# Session keys carrying the user's last commit to whichever worker serves the next request
+SESSION_LSN = 'replica_lsn'
+SESSION_LSN_UNTIL = 'replica_lsn_until'
+
+
+def parse_lsn(text):
+    """
+    A pg_lsn ('16/B374D848') as an integer, or 0 for None.
+    """
+    if not text:
+        return 0
+    high, low = text.split('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+class Replica:
+    """
+    One configured replica: its connection parameters, its pool (set by the owner) and the
+    result of its last status check.
+    """
+
+    def __init__(self, name, dsn_kwargs):
+        self.name = name
+        self.dsn_kwargs = dsn_kwargs
+        self.pool = None
+        self.standby = False
+        self.replay_lsn = 0
+        self.lag_seconds = None
+        self.checked_at = None
+        self.down_until = 0.0
+
+
+class ReplicaRouter:
+    """
+    Per-process routing state: the replicas' health and the WAL position of the process's
+    last commit.
+    """
+
+    def __init__(self, replicas, max_lag_seconds=5.0, check_interval=1.0, retry_after=10.0, sticky_seconds=10.0):
+        self.replicas = [Replica(f"replica{i}", dict(dsn_kwargs)) for i, dsn_kwargs in enumerate(replicas)]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.sticky_seconds = sticky_seconds
+        self.write_lsn = 0
+        self._lock = threading.Lock()
+
+    def needs_check(self, replica):
+        return replica.checked_at is None or time.monotonic() - replica.checked_at > self.check_interval
+
+    def record_status(self, replica, row):
+        standby, replay_lsn, lag = row
+        replica.standby = bool(standby)
+        replica.replay_lsn = parse_lsn(replay_lsn)
+        replica.lag_seconds = float(lag) if lag is not None else None
+        replica.checked_at = time.monotonic()
+        if not replica.standby:
+            logger.warning("Read replica %s is not a standby (promoted?); reading from the primary", replica.name)
+
+    def record_failure(self, replica, error):
+        logger.warning("Read replica %s unavailable for %ss: %s", replica.name, self.retry_after, error)
+        replica.down_until = time.monotonic() + self.retry_after
+        replica.checked_at = None
+
+    def usable(self, replica, min_lsn):
+        return (replica.standby and replica.lag_seconds is not None and replica.lag_seconds <= self.max_lag_seconds
+                and replica.replay_lsn >= min_lsn)
+
+    def candidates(self, min_lsn):
+        """
+        Replicas worth trying for a read that must see `min_lsn`, in random order: those up
+        and either usable at their last check or due for a new one.
+        """
+        now = time.monotonic()
+        replicas = [r for r in self.replicas
+                    if r.down_until <= now and (self.needs_check(r) or self.usable(r, min_lsn))]
+        random.shuffle(replicas)
+        return replicas
+
+    def note_write(self, lsn):
+        with self._lock:
+            self.write_lsn = max(self.write_lsn, parse_lsn(lsn))
+
+    def min_lsn(self, session):
+        """
+        WAL position a replica must have replayed to serve this user: the later of this
+        process's last commit and, while it is recent, the user's own.
+        """
+        user_lsn = 0
+        if session.get(SESSION_LSN) and session.get(SESSION_LSN_UNTIL, 0) > time.time():
+            user_lsn = parse_lsn(session[SESSION_LSN])
+        return max(self.write_lsn, user_lsn)
+
+    def remember_write(self, session, lsn):
+        """
+        Note a commit at `lsn` for this process and, for sticky_seconds, for the user.
+        """
+        self.note_write(lsn)
+        session[SESSION_LSN] = lsn
+        session[SESSION_LSN_UNTIL] = time.time() + self.sticky_seconds
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            "write_lsn": self.write_lsn,
+            "replicas": [{"name": r.name, "host": r.dsn_kwargs.get('host'), "port": r.dsn_kwargs.get('port'),
+                          "standby": r.standby, "lag_seconds": r.lag_seconds, "replay_lsn": r.replay_lsn,
+                          "down": r.down_until > now} for r in self.replicas],
+        }
+
+
+def replica_router(config):
+    """
+    A router for REPLICA_CONFIG, or None when no replicas are configured.
+    """
+    config = config or {}
+    if not config.get('replicas'):
+        return None
+    return ReplicaRouter(config['replicas'], **{k: v for k, v in config.items() if k != 'replicas'})
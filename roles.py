@@ -0,0 +1,94 @@
+"""
+Role resolution for the auth decorators.
+
+The logged-in user's role and department live in their server-side session (sessions.py),
+which update_user and delete_user rewrite or revoke for every worker at once, so a request
+is authorized without a query. Once a session's role is ROLE_CACHE_TTL seconds old it is
+re-read from Users, which picks up changes made outside the app.
+"""
+import time
+
+from db import get_db_connection
+from prepared import execute_prepared
+from sessions import revoke_user_sessions, update_user_sessions
+
+# "hits": requests authorized from the session, "misses": role re-reads from Users,
+# "invalidations": sessions rewritten or revoked because their user changed
+role_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+# Returned by cache-only lookups that cannot answer (reference.py)
+MISSING = object()
+
+# A user's role, department and department name; no row once the user is deleted
+ROLE_SQL = """
+    SELECT u.role_id, u.department_id, COALESCE(d.dname, 'All Departments')
+    FROM Users u
+    LEFT JOIN Department d ON u.department_id = d.dnumber
+    WHERE u.id = %s
+"""
+
+# A user's id, password hash and ROLE_SQL fields, by username (login)
+LOGIN_SQL = """
+    SELECT u.id, u.password_hash, u.role_id, u.department_id,
+           COALESCE(d.dname, 'All Departments') AS dname
+    FROM Users u
+    LEFT JOIN Department d ON u.department_id = d.dnumber
+    WHERE u.username = %s
+"""
+
+# Session key holding when the session's role was last read from Users
+ROLE_CHECKED = 'role_checked'
+
+
+def role_fields(row):
+    """
+    Session fields for a ROLE_SQL row.
+    """
+    return {"role_id": row[0], "department_id": row[1], "department_name": row[2], ROLE_CHECKED: time.time()}
+
+
+def role_is_fresh(session, ttl):
+    """
+    True while the session's role can be trusted without reading Users.
+    """
+    fresh = session.get(ROLE_CHECKED, 0) + ttl > time.time()
+    role_cache_stats["hits" if fresh else "misses"] += 1
+    return fresh
+
+
+def apply_role(session, row):
+    """
+    Bring the session in line with the ROLE_SQL row just read for its user; returns the
+    role id, or None (and clears the session) if the user has been deleted.
+    """
+    if row is None:
+        session.clear()
+        return None
+    session.update(role_fields(row))
+    return row[0]
+
+
+def resolve_role(session, ttl):
+    """
+    The role of the session's user, read from Users only when the session's copy is stale.
+    """
+    if role_is_fresh(session, ttl):
+        return session.get('role_id')
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    execute_prepared(cursor, ROLE_SQL, (session['user_id'],))
+    row = cursor.fetchone()
+    cursor.close()
+    return apply_role(session, row)
+
+
+def user_changed(user_id, row, current=None):
+    """
+    Push a user's new ROLE_SQL row (None once deleted) into all of their sessions. `current`
+    is the session of the request making the change.
+    """
+    if row is None:
+        count = revoke_user_sessions(user_id, current)
+    else:
+        count = update_user_sessions(user_id, role_fields(row), current)
+    role_cache_stats["invalidations"] += count
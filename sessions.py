@@ -0,0 +1,365 @@
+"""
+Server-side sessions. The cookie carries nothing but a random session id; the session
+itself is a compact JSON record in a store shared by the app's workers.
+
+Two backends, chosen by SESSION_CONFIG["backend"]:
+- "memory": a dict in this process. Only for a single-process server.
+- "sqlite": one SQLite file (WAL mode) shared by every worker process on the host.
+
+A record expires "lifetime" seconds after it was last used. The stored expiry is only
+pushed back once it is "refresh_after" seconds old, so most requests read their session
+without writing anything, and a session is only written back when the request changed it.
+Records are indexed by user_id: update_user rewrites and delete_user revokes every session
+of a user at once, in every worker. A request still running when its session is revoked
+cannot bring it back, since saving only updates existing records and never re-creates them.
+Saving writes back only the keys the request changed, so a role update_user pushed while
+the request ran is not overwritten by the request's stale copy.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+session_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+_config = {}
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+# Seconds between sweeps of expired records
+PURGE_INTERVAL = 60
+
+
+def configure_sessions(config):
+    """
+    Set SESSION_CONFIG; called once by app.py / asgi_app.py at import time.
+    """
+    global _config, _store
+    _config = dict(config or {})
+    _store = None
+
+
+def secret_key(config):
+    """
+    The app's signing key: the SECRET_KEY environment variable, else SECRET_KEY from
+    config.py, else a random key for this process (sessions do not depend on it).
+    """
+    return os.environ.get('SECRET_KEY') or config.get('SECRET_KEY') or secrets.token_hex(32)
+
+
+def _lifetime():
+    return _config.get('lifetime', 28800)
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(',', ':'))
+
+
+def _json_path(key):
+    return f'$."{key}"'
+
+
+class MemorySessionStore:
+    """
+    Sessions of this process: sid -> [user_id, record, expires_at], and the sids of each user.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self._purge_due = 0.0
+
+    def get(self, sid):
+        entry = self._sessions.get(sid)
+        return None if entry is None else (entry[1], entry[2])
+
+    def touch(self, sid, expires_at):
+        entry = self._sessions.get(sid)
+        if entry is not None:
+            entry[2] = expires_at
+
+    def create(self, sid, user_id, record, expires_at):
+        with self._lock:
+            self._sessions[sid] = [user_id, record, expires_at]
+            self._by_user.setdefault(user_id, set()).add(sid)
+            self._purge()
+
+    def update(self, sid, user_id, changed, removed, expires_at):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return False
+            if entry[0] != user_id:
+                self._by_user.get(entry[0], set()).discard(sid)
+                self._by_user.setdefault(user_id, set()).add(sid)
+            record = {**json.loads(entry[1]), **changed}
+            for key in removed:
+                record.pop(key, None)
+            self._sessions[sid] = [user_id, _dumps(record), expires_at]
+            return True
+
+    def delete(self, sid):
+        with self._lock:
+            self._drop(sid)
+
+    def update_user(self, user_id, fields):
+        with self._lock:
+            sids = self._by_user.get(user_id, ())
+            for sid in sids:
+                entry = self._sessions[sid]
+                entry[1] = _dumps({**json.loads(entry[1]), **fields})
+            return len(sids)
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            sids = list(self._by_user.get(user_id, ()))
+            for sid in sids:
+                self._drop(sid)
+            return len(sids)
+
+    def _drop(self, sid):
+        entry = self._sessions.pop(sid, None)
+        if entry is not None:
+            sids = self._by_user.get(entry[0])
+            sids.discard(sid)
+            if not sids:
+                del self._by_user[entry[0]]
+
+    def _purge(self):
+        now = time.time()
+        if now < self._purge_due:
+            return
+        self._purge_due = now + PURGE_INTERVAL
+        for sid in [sid for sid, entry in self._sessions.items() if entry[2] <= now]:
+            self._drop(sid)
+
+
+class SqliteSessionStore:
+    """
+    Sessions in a SQLite file shared by the worker processes of one host. Each thread uses
+    its own SQLite connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._purge_due = 0.0
+        db = self._connect()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS sessions
+            (
+                sid        TEXT PRIMARY KEY,
+                user_id    INTEGER,
+                record     TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_user_id_idx ON sessions (user_id)")
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, sid):
+        return self._connect().execute("SELECT record, expires_at FROM sessions WHERE sid = ?", (sid,)).fetchone()
+
+    def touch(self, sid, expires_at):
+        self._connect().execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (expires_at, sid))
+
+    def create(self, sid, user_id, record, expires_at):
+        db = self._connect()
+        db.execute("INSERT INTO sessions (sid, user_id, record, expires_at) VALUES (?, ?, ?, ?)",
+                   (sid, user_id, record, expires_at))
+        now = time.time()
+        if now >= self._purge_due:
+            self._purge_due = now + PURGE_INTERVAL
+            db.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def update(self, sid, user_id, changed, removed, expires_at):
+        # The changes are applied to the stored record inside the UPDATE, so keys rewritten
+        # by update_user() in the meantime are kept
+        record, params = "record", []
+        if changed:
+            record = f"json_set({record}{', ?, json(?)' * len(changed)})"
+            params += [item for key, value in changed.items() for item in (_json_path(key), _dumps(value))]
+        if removed:
+            record = f"json_remove({record}{', ?' * len(removed)})"
+            params += [_json_path(key) for key in removed]
+        cursor = self._connect().execute(
+            f"UPDATE sessions SET user_id = ?, record = {record}, expires_at = ? WHERE sid = ?",
+            [user_id, *params, expires_at, sid])
+        return cursor.rowcount > 0
+
+    def delete(self, sid):
+        self._connect().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def update_user(self, user_id, fields):
+        # json_set(record, '$.key', value, ...) rewrites the fields inside each stored record
+        params = [item for key, value in fields.items() for item in ('$.' + key, value)]
+        cursor = self._connect().execute(
+            f"UPDATE sessions SET record = json_set(record{', ?, ?' * len(fields)}) WHERE user_id = ?",
+            params + [user_id])
+        return max(cursor.rowcount, 0)
+
+    def revoke_user(self, user_id):
+        cursor = self._connect().execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+        return max(cursor.rowcount, 0)
+
+
+def session_store():
+    """
+    This process's store, created on first use from SESSION_CONFIG.
+    """
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store_pid != os.getpid():
+                if _config.get('backend', 'sqlite') == 'sqlite':
+                    _store = SqliteSessionStore(_config.get('path')
+                                                or os.path.join(tempfile.gettempdir(), 'company_db_sessions.sqlite3'))
+                else:
+                    _store = MemorySessionStore()
+                _store_pid = os.getpid()
+    return _store
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """
+    A session loaded from the store. `sid` is None until its first save; `record` is the
+    stored JSON it was loaded from, which saving diffs against.
+    """
+
+    def __init__(self, initial=None, sid=None, record=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.record = record
+        self.new = sid is None
+        self.previous_sid = None
+        self.modified = False
+
+    def regenerate(self):
+        """
+        Move the session to a new id when it is next saved (at login, so an id planted
+        before it is worthless afterwards).
+        """
+        if self.sid is not None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+def load_session(sid):
+    """
+    The session stored under `sid`, or a new empty one for a missing, unknown or expired id.
+    """
+    if sid:
+        store = session_store()
+        found = store.get(sid)
+        now = time.time()
+        if found is not None and found[1] > now:
+            session_stats["hits"] += 1
+            record, expires_at = found
+            if now + _lifetime() - expires_at > _config.get('refresh_after', 60):
+                store.touch(sid, now + _lifetime())
+            return ServerSession(json.loads(record), sid, record)
+        session_stats["misses"] += 1
+    return ServerSession()
+
+
+def save_session(session):
+    """
+    Store a session the request changed. Returns the id the cookie should carry, or None
+    when the cookie should be dropped (emptied, or revoked while the request ran).
+    """
+    store = session_store()
+    if session.previous_sid is not None:
+        store.delete(session.previous_sid)
+        session.previous_sid = None
+    if not session:
+        if session.sid is not None:
+            store.delete(session.sid)
+        return None
+
+    expires_at = time.time() + _lifetime()
+    if session.sid is None:
+        session.sid = secrets.token_urlsafe(32)
+        store.create(session.sid, session.get('user_id'), _dumps(dict(session)), expires_at)
+        return session.sid
+
+    # Compared with the stored JSON rather than the loaded dict, whose lists (the flashes)
+    # the request may have changed in place
+    loaded = json.loads(session.record) if session.record else {}
+    changed = {key: value for key, value in session.items() if key not in loaded or loaded[key] != value}
+    removed = [key for key in loaded if key not in session]
+    if not store.update(session.sid, session.get('user_id'), changed, removed, expires_at):
+        return None
+    return session.sid
+
+
+def update_user_sessions(user_id, fields, current=None):
+    """
+    Set `fields` in every session of a user, and in `current` (the session of the request
+    making the change) if it is one of them, since that one is saved after the request.
+    """
+    count = session_store().update_user(user_id, fields)
+    if current is not None and current.get('user_id') == user_id:
+        current.update(fields)
+    session_stats["invalidations"] += count
+    return count
+
+
+def revoke_user_sessions(user_id, current=None):
+    """
+    Delete every session of a user (and clear `current` if it is one of them).
+    """
+    count = session_store().revoke_user(user_id)
+    if current is not None and current.get('user_id') == user_id:
+        current.clear()
+    session_stats["invalidations"] += count
+    return count
+
+
+def write_session_cookie(interface, app, response, session):
+    """
+    Save a changed session and set or drop its cookie. Shared by the Flask interface below
+    and the Quart one in asgi_app.py.
+    """
+    response.vary.add('Cookie')
+    if not session.modified:
+        return
+    sid = save_session(session)
+    name, domain, path = (interface.get_cookie_name(app), interface.get_cookie_domain(app),
+                          interface.get_cookie_path(app))
+    if sid is None:
+        response.delete_cookie(name, domain=domain, path=path)
+        return
+    response.set_cookie(name, sid, domain=domain, path=path, httponly=interface.get_cookie_httponly(app),
+                        secure=interface.get_cookie_secure(app), samesite=interface.get_cookie_samesite(app))
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by the session store.
+    """
+
+    def open_session(self, app, request):
+        return load_session(request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        write_session_cookie(self, app, response, session)
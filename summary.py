@@ -0,0 +1,101 @@
+"""
+Refreshing the department_summary materialized view (migration 0005) behind /dashboard.
+
+Each worker process runs a background thread that refreshes the view when it is older than
+DASHBOARD_CONFIG["refresh_interval"] seconds. REFRESH ... CONCURRENTLY keeps the dashboard
+readable during a refresh, and a transaction-scoped advisory lock makes sure only one
+process refreshes at a time; the others see the fresh refreshed_at and skip. To refresh
+from cron instead (with "refresh_in_app" off):
+
+    python summary.py
+"""
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock key held while refreshing (any constant unique to this purpose)
+REFRESH_LOCK_KEY = 0x5d5a0005
+
+SUMMARY_COLUMNS = ["Dnumber", "Dname", "employees", "total_salary", "avg_salary", "projects", "total_hours",
+                   "dependents"]
+
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+
+def refresh_summary(conn, max_age=0):
+    """
+    Refresh department_summary unless it was refreshed less than `max_age` seconds ago or
+    another process is refreshing it right now. Returns True if this call refreshed it.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return False
+        cursor.execute("SELECT max(refreshed_at) < now() - make_interval(secs => %s) "
+                       "OR max(refreshed_at) IS NULL FROM department_summary", (max_age,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return False
+        cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY department_summary")
+        conn.commit()
+        return True
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def start_refresher(dsn_kwargs, interval):
+    """
+    Start this process's refresh thread unless it is already running. Like the pool, a
+    forked worker starts its own.
+    """
+    global _refresher_pid
+    with _refresher_lock:
+        if _refresher_pid == os.getpid():
+            return
+        _refresher_pid = os.getpid()
+    thread = threading.Thread(target=_refresh_loop, args=(dict(dsn_kwargs), interval),
+                              name='department-summary-refresher', daemon=True)
+    thread.start()
+
+
+def _refresh_loop(dsn_kwargs, interval):
+    """
+    Check every `interval` / 4 seconds (so a refresh is never much later than due) on its
+    own connection, outside the pool, and reconnect after errors.
+    """
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**dsn_kwargs)
+            while True:
+                if refresh_summary(conn, max_age=interval):
+                    logger.info("Refreshed department_summary")
+                time.sleep(max(interval / 4, 1))
+        except psycopg2.Error as e:
+            logger.warning("Department summary refresher failed: %s", e)
+        finally:
+            if conn is not None:
+                conn.close()
+        time.sleep(max(interval / 4, 1))
+
+
+if __name__ == '__main__':
+    from config import DATABASE_CONFIG
+
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    started = time.perf_counter()
+    refreshed = refresh_summary(conn)
+    conn.close()
+    print(f"Refreshed department_summary in {time.perf_counter() - started:.2f}s" if refreshed
+          else "Another process is refreshing department_summary")
@@ -0,0 +1,17 @@
+"""
+WSGI entry point for production serving:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the gunicorn master (preload_app) and every template is
+compiled here, before the workers are forked, so workers share the compiled templates
+copy-on-write instead of each loading them on first use.
+"""
+from app import app
+
+# Templates never change under a running production server; skip the per-render mtime check
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.jinja_env.auto_reload = False
+
+for name in app.jinja_env.list_templates(extensions=['html']):
+    app.jinja_env.get_template(name)